@@ -0,0 +1,54 @@
+"""Measure how long it takes to import parts of the measurement package.
+
+Each module is imported in a fresh interpreter with `python -X importtime`
+and the cumulative import time is reported. Run from the repository root:
+
+    python benchmarks/startup.py [module ...]
+"""
+import os
+import subprocess
+import sys
+
+MODULES = [
+    "measurement.instruments.setup",
+    "measurement.instruments.drivers.test_instrument",
+    "measurement.measurements.callables",
+    "measurement.measurements.measurement",
+    "measurement.util.dataset",
+]
+
+
+def import_time(module):
+    """Return the cumulative time (s) to import module in a new process."""
+    env = dict(os.environ)
+    src = os.path.join(os.path.dirname(os.path.dirname(
+        os.path.abspath(__file__))), "src")
+    env["PYTHONPATH"] = os.pathsep.join([src, env.get("PYTHONPATH", "")])
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import " + module],
+        env=env,
+        stderr=subprocess.PIPE,
+        universal_newlines=True,
+        check=True).stderr
+    # Lines look like "import time: self [us] | cumulative | name". Sum
+    # the cumulative time of the top-level imports.
+    total = 0
+    for line in out.splitlines():
+        fields = line.split("|")
+        if len(fields) == 3 and not fields[2].startswith("  "):
+            try:
+                total += int(fields[1])
+            except ValueError:
+                pass
+    return total / 1e6
+
+
+def main(modules):
+    width = max(len(module) for module in modules)
+    for module in modules:
+        print("{:<{w}}  {:8.1f} ms".format(
+            module, import_time(module) * 1e3, w=width))
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:] or MODULES)
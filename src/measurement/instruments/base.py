@@ -1,13 +1,101 @@
 """Define a Loadable object.
 
 A Loadable can be written to and instantiated from config files.
+
+Two formats are supported. JSON is human readable and meant for exporting
+configurations. The binary format is meant for saving the state of a full
+Setup alongside every measurement: classes are interned in a table and the
+state of slotted objects (Validators) is stored as a tuple in slot order.
+
+Only the classes of Loadables, slotted objects, numpy arrays and a few
+builtin containers are loaded from a binary snapshot. Still, loading
+imports the modules named in it, so only load snapshots you trust.
 """
 import importlib
 import inspect
+import io
+import pickle
+
+# Header written at the start of every binary snapshot
+MAGIC = b"LOADABLE"
+VERSION = 1
+
+# (module, classname) -> class. Loadables register themselves when they are
+# defined so resolving a type only imports a driver module the first time.
+_classes = {}
+# class -> names of the arguments of __init__
+_schemas = {}
+# class -> names of the slots of the class and its bases
+_slots = {}
+# Globals a binary snapshot may refer to besides the Loadable classes
+_safe_globals = {
+    "builtins": {"complex", "frozenset", "range", "set", "slice"},
+    "collections": {"OrderedDict"},
+    "numpy": {"dtype", "ndarray"},
+    "numpy.core.multiarray": {"_reconstruct", "scalar"},
+    "numpy.core.numeric": {"_frombuffer"},
+    "numpy._core.multiarray": {"_reconstruct", "scalar"},
+    "numpy._core.numeric": {"_frombuffer"},
+}
+
+
+def find_class(module, classname):
+    """Return a class from its module and name, importing only once."""
+    try:
+        return _classes[(module, classname)]
+    except KeyError:
+        cls = getattr(importlib.import_module(module), classname)
+        _classes[(module, classname)] = cls
+        return cls
+
+
+def get_schema(cls):
+    """Return the names of the arguments of cls.__init__, inspecting once."""
+    try:
+        return _schemas[cls]
+    except KeyError:
+        schema = tuple(inspect.signature(cls).parameters.keys())
+        _schemas[cls] = schema
+        return schema
+
+
+def get_slots(cls):
+    """Return the slots of cls, including those declared on its bases."""
+    try:
+        return _slots[cls]
+    except KeyError:
+        slots = []
+        for klass in reversed(cls.__mro__):
+            names = klass.__dict__.get("__slots__", ())
+            if isinstance(names, str):
+                names = (names,)
+            for key in names:
+                if key not in slots and key not in ("__dict__",
+                                                    "__weakref__"):
+                    slots.append(key)
+        slots = tuple(slots)
+        _slots[cls] = slots
+        return slots
+
+
+class _Unpickler(pickle.Unpickler):
+    """Unpickle the payload of a snapshot, refusing arbitrary globals."""
+
+    def find_class(self, module, name):
+        if name in _safe_globals.get(module, ()):
+            return super(_Unpickler, self).find_class(module, name)
+        raise pickle.UnpicklingError(
+            "{}.{} is not allowed in a snapshot.".format(module, name))
 
 
 class Loadable(object):
     """An object that can be written to and loaded from a config file."""
+    # Attributes that describe runtime state and are never written to file
+    _transient = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super(Loadable, cls).__init_subclass__(**kwargs)
+        _classes[(cls.__module__, cls.__name__)] = cls
 
     def __init__(self, name=None):
         """Create a Loadable.
@@ -32,6 +120,8 @@ class Loadable(object):
             "properties": {}
         }
         for key in self.__dict__.keys():
+            if key in self._transient:
+                continue
             val = getattr(self, key)
             if hasattr(val, "to_json"):
                 json["properties"][key] = val.to_json()
@@ -43,24 +133,107 @@ class Loadable(object):
     def from_json(json):
         """Load a Loadable from file."""
         # Get the class of the object
-        module = importlib.import_module(json["type"]["module"])
-        classname = json["type"]["class"]
-        data = json["properties"]
-        cls = getattr(module, classname)
-        sig = inspect.signature(cls)
+        cls = find_class(json["type"]["module"], json["type"]["class"])
         # Make the object
         data = json["properties"]  # can i do this w/o assuming keys?
-        ba = sig.bind(* [data[key] for key in sig.parameters.keys()])
-        obj = cls(*ba.args, **ba.kwargs)
+        obj = cls(*[data[key] for key in get_schema(cls)])
         # Set parameters not set in init
         for key in data.keys():
             # If it has a "type" key, it's a loadable
             if hasattr(data[key], "keys"):
                 if "type" in data[key].keys():
-                    sub_obj = Loadable.from_json(data[key])
-                    obj.add(sub_obj)
+                    setattr(obj, key, Loadable.from_json(data[key]))
+                elif hasattr(getattr(obj, key, None), "update"):
+                    # Restore the settings of a Validator made in init
+                    getattr(obj, key).update(data[key])
                 else:
                     setattr(obj, key, data[key])
             else:
                 setattr(obj, key, data[key])
         return obj
+
+    def to_bytes(self):
+        """Return a compact binary representation of the object."""
+        classes = []
+        tree = Loadable._encode(self, classes, {})
+        return MAGIC + bytes([VERSION]) + pickle.dumps(
+            (classes, tree), protocol=pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def from_bytes(data):
+        """Load a Loadable from the output of to_bytes.
+
+        Raises:
+            ValueError: If data is not a snapshot or names a class that is
+                neither a Loadable nor slotted.
+            pickle.UnpicklingError: If data refers to any other global.
+        """
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError("Not a Loadable binary snapshot.")
+        if data[len(MAGIC)] != VERSION:
+            raise ValueError("Unsupported snapshot version {}.".format(
+                data[len(MAGIC)]))
+        names, tree = _Unpickler(io.BytesIO(data[len(MAGIC) + 1:])).load()
+        classes = []
+        for module, classname in names:
+            cls = find_class(module, classname)
+            if not (isinstance(cls, type) and (issubclass(cls, Loadable)
+                                               or get_slots(cls))):
+                raise ValueError("{}.{} can't be loaded from a snapshot."
+                                 .format(module, classname))
+            classes.append(cls)
+        return Loadable._decode(tree, classes)
+
+    def save(self, filename):
+        """Write a binary snapshot of the object to filename."""
+        with open(filename, "wb") as f:
+            f.write(self.to_bytes())
+
+    @staticmethod
+    def load(filename):
+        """Load a Loadable from a binary snapshot written with save."""
+        with open(filename, "rb") as f:
+            return Loadable.from_bytes(f.read())
+
+    @staticmethod
+    def _encode(obj, classes, ids):
+        """Encode obj as a (class id, state, children) node.
+
+        Loadables store a dict of plain attributes, slotted objects store a
+        tuple of their slots. Nested objects are stored as child nodes.
+        """
+        cls = obj.__class__
+        try:
+            cid = ids[cls]
+        except KeyError:
+            cid = ids[cls] = len(classes)
+            classes.append((cls.__module__, cls.__name__))
+        children = {}
+        if isinstance(obj, Loadable):
+            state = {}
+            for key, val in obj.__dict__.items():
+                if key in obj._transient:
+                    continue
+                if isinstance(val, Loadable) or hasattr(val, "__slots__"):
+                    children[key] = Loadable._encode(val, classes, ids)
+                else:
+                    state[key] = val
+        else:
+            state = tuple(getattr(obj, key) for key in get_slots(cls))
+        return cid, state, children
+
+    @staticmethod
+    def _decode(node, classes):
+        """Rebuild an object from a node made by _encode."""
+        cid, state, children = node
+        cls = classes[cid]
+        if isinstance(state, dict):
+            obj = cls(*[state[key] for key in get_schema(cls)])
+            obj.__dict__.update(state)
+        else:
+            obj = cls.__new__(cls)
+            for key, val in zip(get_slots(cls), state):
+                setattr(obj, key, val)
+        for key, child in children.items():
+            obj.__dict__[key] = Loadable._decode(child, classes)
+        return obj
@@ -0,0 +1,191 @@
+"""Record the state of a Setup at every point of a Measurement.
+
+Storing a full snapshot of the Setup at every point is too expensive, so a
+ChangeLog only records the Params that were set since the previous point.
+Params report changes to the ChangeLog as they are set, so recording a point
+costs nothing for Params that did not change.
+
+The log can be written to an append-only file next to a DataSet. The file
+holds a header (the names of the Params and their starting values) followed
+by one (point, changes) record per point, where point is the flat index of
+the point in the DataSet. A resumed run appends to the same file.
+"""
+import pickle
+import logging
+
+log = logging.getLogger(__name__)
+
+
+class ChangeLog(object):
+    """Track changes to the Params of a Setup point by point.
+
+    A full copy of the state (a keyframe) is kept in memory every
+    `keyframe` points, so rebuilding the state at any point replays at
+    most `keyframe` records.
+    """
+
+    def __init__(self, setup=None, filename=None, keyframe=100,
+                 append=False):
+        """
+        Args:
+            setup (Setup): Setup to track. The ChangeLog attaches to all of
+                its Instruments.
+            filename (str): If given, records are appended to this file.
+            keyframe (int): Number of points between full copies of the
+                state kept in memory.
+            append (bool): continue the file of an interrupted run instead
+                of starting a new one. The first record then holds every
+                Param, since they may have changed in between.
+        """
+        self.keyframe = keyframe
+        self.names = []
+        self.ids = {}
+        self.changed = set()
+        self.records = []
+        # Point of each record, and the last record of each point
+        self.points = []
+        self.positions = {}
+        self.instruments = []
+        # Trackers replaced by this ChangeLog, restored on close
+        self.previous = []
+        # Params changed at any point, passed on to the previous trackers
+        self.touched = set()
+        self.file = None
+        if setup is not None:
+            for inst in setup.instruments():
+                self.attach(inst)
+        self.current = self.initial()
+        self.keyframes = [list(self.current)]
+        if filename is not None and append:
+            self.file = open(filename, "ab")
+            self.changed.update(self.ids)
+        elif filename is not None:
+            self.file = open(filename, "wb")
+            pickle.dump((self.names, self.current), self.file,
+                        pickle.HIGHEST_PROTOCOL)
+
+    def __len__(self):
+        return len(self.records)
+
+    def __str__(self):
+        return "<{}: {} params, {} points>".format(self.__class__.__name__,
+                                                    len(self.names), len(self))
+
+    def __repr__(self):
+        return str(self)
+
+    def attach(self, inst):
+        """Start tracking the Params of an Instrument.
+
+        An Instrument already tracked by another ChangeLog (that of the
+        Measurement a nested one runs in) is handed back to it on close.
+        """
+        self.previous.append(inst.__dict__.get("_tracker"))
+        inst._tracker = self.changed
+        self.instruments.append(inst)
+        for key in inst.params():
+            self.ids[inst.get_validator(key)] = len(self.names)
+            self.names.append(inst.name + "." + key)
+
+    def initial(self):
+        """Return the current value of every tracked Param."""
+        values = [None] * len(self.names)
+        for validator, i in self.ids.items():
+            values[i] = validator.value
+        return values
+
+    def record(self, point=None):
+        """Record the Params changed since the last point.
+
+        Args:
+            point (int): flat index of the point in the DataSet. Defaults to
+                the number of points recorded so far.
+
+        Returns:
+            int: index of the recorded point
+        """
+        changes = {}
+        for validator in self.changed:
+            i = self.ids[validator]
+            changes[i] = self.current[i] = validator.value
+        self.touched.update(self.changed)
+        self.changed.clear()
+        if point is None:
+            point = len(self.records)
+        self._add(point, changes)
+        if self.file is not None:
+            pickle.dump((point, changes), self.file, pickle.HIGHEST_PROTOCOL)
+        return point
+
+    def _add(self, point, changes):
+        self.positions[point] = len(self.records)
+        self.records.append(changes)
+        self.points.append(point)
+        if len(self.records) % self.keyframe == 0:
+            self.keyframes.append(list(self.current))
+
+    def state(self, index):
+        """Return the value of every tracked Param at a point.
+
+        A point measured again after a resume gives its latest state.
+
+        Args:
+            index (int): flat index of a recorded point. -1 is the last
+                point recorded.
+
+        Returns:
+            dict: values keyed by "instrument.param"
+        """
+        if index < 0:
+            position = index + len(self.records)
+        else:
+            position = self.positions.get(index, -1)
+        if not 0 <= position < len(self.records):
+            raise IndexError("No point {} in {}.".format(index, self))
+        # Replay the records after the last keyframe before the point
+        start = (position + 1) // self.keyframe
+        values = list(self.keyframes[start])
+        for changes in self.records[start * self.keyframe:position + 1]:
+            for i, val in changes.items():
+                values[i] = val
+        return dict(zip(self.names, values))
+
+    def close(self):
+        """Stop tracking the Instruments and close the file.
+
+        Instruments go back to the tracker they had before, which is told
+        about every Param changed in the meantime.
+        """
+        self.touched.update(self.changed)
+        for inst, previous in zip(self.instruments, self.previous):
+            if previous is None:
+                # Fall back to the class default of None
+                inst.__dict__.pop("_tracker", None)
+            else:
+                inst._tracker = previous
+                validators = set(inst.get_validator(key)
+                                 for key in inst.params())
+                previous.update(validators & self.touched)
+        self.instruments = []
+        self.previous = []
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    @classmethod
+    def load(cls, filename, keyframe=100):
+        """Load a ChangeLog from a file written during a Measurement."""
+        changelog = cls(keyframe=keyframe)
+        with open(filename, "rb") as f:
+            changelog.names, changelog.current = pickle.load(f)
+            changelog.keyframes = [list(changelog.current)]
+            while True:
+                try:
+                    point, changes = pickle.load(f)
+                except (EOFError, pickle.UnpicklingError):
+                    # End of file or a record cut short by a crash
+                    break
+                for i, val in changes.items():
+                    changelog.current[i] = val
+                changelog._add(point, changes)
+        return changelog
@@ -5,11 +5,22 @@ implemented to make modifying the Params easier.
 """
 
 import logging
-from measurement.instruments.param import Param
+import math
+import numpy as np
+from measurement.instruments.param import (Param, ContinuousValidator,
+                                           ArrayValidator)
 from measurement.instruments.base import Loadable
 
 log = logging.getLogger(__name__)
 
+SNAPSHOT_FIELDS = ["value", "minimum", "maximum", "rate", "step"]
+
+
+def snapshot_dtype(width):
+    """Return the snapshot dtype for Param names of up to width characters."""
+    return np.dtype([("name", "U{}".format(max(width, 1)))] +
+                    [(field, "f8") for field in SNAPSHOT_FIELDS])
+
 
 class Instrument(Loadable):
     """Generic representation of an instrument.
@@ -18,14 +29,25 @@ class Instrument(Loadable):
     use instance-level data stored in Validators to to check changes to
     the values of a instrument parameter.
     """
+    # Name of the bus (e.g. "GPIB0") shared with other instruments, if any
+    bus = None
+    # Set of changed Validators shared with a ChangeLog, if one is attached
+    _tracker = None
+    # Lock serializing access to a shared bus, set by a Scheduler
+    _lock = None
+    # Recorder logging Param reads and writes, if one is attached
+    _recorder = None
+    # True if readings can be started with trigger() and collected with
+    # fetch(), so a Measure can overlap the integration times of instruments
+    triggered = False
+    _transient = ("_tracker", "_lock", "_recorder")
 
     def __init__(self, name):
         """Create an instrument with validators to class-level descriptors."""
         self.name = name
-        for key, val in self.__class__.__dict__.items():
-            if isinstance(val, Param):
-                # Create a validator for managing the attribute.
-                setattr(self, "_" + key, val._setup())
+        for key, val in self.params().items():
+            # Create a validator for managing the attribute.
+            setattr(self, "_" + key, val._setup())
 
     def __str__(self):
         return "<{}: {}>".format(self.__class__.__name__, self.name)
@@ -34,12 +56,109 @@ class Instrument(Loadable):
         return str(self)
 
     def sweep(self, attr, value, rate=None, step=None):
-        """Smoothly adjust a parameter on the instrument."""
-        pass
+        """Smoothly adjust a parameter on the instrument.
+
+        The Param ramps at the rate and step limits of its Validator, or at
+        rate and step when given. Drivers of instruments that ramp in
+        hardware override this.
+        """
+        if rate is None and step is None:
+            setattr(self, attr, value)
+            return
+        param = self.params()[attr]
+        validator = self.get_validator(attr)
+        param.check_value(value, validator.minimum, validator.maximum)
+        param.sweep(self, value, validator.rate if rate is None else rate,
+                    validator.step if step is None else step)
+
+    def ramp_time(self, attr, value):
+        """Return the seconds a sweep of attr to value takes at its limits."""
+        validator = self.get_validator(attr)
+        if validator.value is None:
+            return 0.0
+        delta = np.abs(np.asarray(value, dtype=float) - validator.value)
+        if isinstance(validator, ArrayValidator):
+            with np.errstate(invalid="ignore", divide="ignore"):
+                times = np.where(validator.rate > 0, delta / validator.rate, 0)
+            return float(times.max()) if times.size else 0.0
+        if getattr(validator, "rate", None) and validator.step:
+            return (math.ceil(delta / validator.step) * validator.step /
+                    validator.rate)
+        return 0.0
 
     def get_descriptor(self, attr):
         return self.__class__.__dict__[attr]
 
+    def get_validator(self, attr):
+        """Return the Validator that manages attr on this instrument."""
+        return self.__dict__["_" + attr]
+
+    def update_validator(self, attr, settings):
+        """Update the value/limits of attr from a dict of settings."""
+        self.get_validator(attr).update(settings)
+
+    @classmethod
+    def params(cls):
+        """Return a dict of all Params on the class, including inherited.
+
+        The dict is built once per class and cached on the class.
+        """
+        if "_param_cache" not in cls.__dict__:
+            params = {}
+            for klass in reversed(cls.__mro__):
+                for key, val in klass.__dict__.items():
+                    if isinstance(val, Param):
+                        params[key] = val
+            cls._param_cache = params
+        return cls._param_cache
+
+    def snapshot(self):
+        """Return the value and limits of every ContinuousParam.
+
+        The Validators are packed into a structured array with one row per
+        Param (one row per channel for a ParamArray). Limits that are not set
+        are stored as nan.
+        """
+        rows = []
+        for key in self.params():
+            val = self.__dict__["_" + key]
+            if isinstance(val, ContinuousValidator):
+                rows.append((key, ) + tuple(
+                    np.nan if getattr(val, field) is None else getattr(
+                        val, field) for field in SNAPSHOT_FIELDS))
+            elif isinstance(val, ArrayValidator):
+                value = (np.full(len(val.minimum), np.nan)
+                         if val.value is None else val.value)
+                for i in range(len(val.minimum)):
+                    rows.append(("{}[{}]".format(key, i), value[i],
+                                 val.minimum[i], val.maximum[i], val.rate[i],
+                                 val.step[i]))
+        # Size the name field so long Param names are not truncated
+        width = max((len(row[0]) for row in rows), default=0)
+        return np.array(rows, dtype=snapshot_dtype(width))
+
+    def read_batch(self, attr, num):
+        """Read a Param num times and return the readings as an array.
+
+        Drivers of instruments that can return several samples in one query
+        (buffered multimeters, digitizers) override this to do so.
+        """
+        return np.array([getattr(self, attr) for _ in range(num)],
+                        dtype=float)
+
+    def trigger(self, attr):
+        """Start a reading of a Param without waiting for it.
+
+        Drivers of instruments that integrate before a reading is ready
+        (lock-ins, multimeters, spectrum analyzers) override this and fetch
+        and set triggered = True.
+        """
+        pass
+
+    def fetch(self, attr):
+        """Wait for the reading started by trigger and return it."""
+        return getattr(self, attr)
+
     def zero(self, attr):
         """Zero an attribute."""
         self.sweep(attr, 0)
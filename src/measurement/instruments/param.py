@@ -5,11 +5,116 @@ import time
 import math
 import logging
 import numpy as np
-from measurement.instruments.base import Loadable
+from measurement.instruments.base import Loadable, get_slots
 
 log = logging.getLogger(__name__)
 
 
+class Validator(object):
+    """Instance-level data used by a Param to manage a value.
+
+    One Validator is made per Param per Instrument, so they are slotted to
+    keep large setups (thousands of DAC channels) small and fast to access.
+    """
+    __slots__ = []
+
+    def __str__(self):
+        return "<{}: {}>".format(self.__class__.__name__, self.to_json())
+
+    def __repr__(self):
+        return str(self)
+
+    def update(self, settings):
+        """Update the Validator from a dict of settings."""
+        for key, val in settings.items():
+            setattr(self, key, val)
+
+    def to_json(self):
+        """Return a dict representation of the Validator."""
+        return {key: getattr(self, key) for key in get_slots(type(self))}
+
+
+class ContinuousValidator(Validator):
+    """Value and limits of a ContinuousParam on a single Instrument."""
+    __slots__ = ["value", "units", "minimum", "maximum", "rate", "step"]
+
+    def __init__(self,
+                 units=None,
+                 minimum=None,
+                 maximum=None,
+                 rate=None,
+                 step=None):
+        self.value = None
+        self.units = units
+        self.minimum = minimum
+        self.maximum = maximum
+        self.rate = rate
+        self.step = step
+
+
+class ArrayValidator(Validator):
+    """Values and per-channel limits of a ParamArray on a single Instrument.
+
+    Each attribute is an array with one entry per channel. Missing limits
+    are stored as -inf/inf (minimum/maximum) or nan (rate/step).
+    """
+    __slots__ = ["value", "units", "minimum", "maximum", "rate", "step"]
+
+    def __init__(self,
+                 num,
+                 units=None,
+                 minimum=None,
+                 maximum=None,
+                 rate=None,
+                 step=None):
+        self.value = None
+        self.units = units
+        self.minimum = ArrayValidator._channels(num, minimum, -np.inf)
+        self.maximum = ArrayValidator._channels(num, maximum, np.inf)
+        self.rate = ArrayValidator._channels(num, rate, np.nan)
+        self.step = ArrayValidator._channels(num, step, np.nan)
+
+    def update(self, settings):
+        """Update the Validator, broadcasting limits to every channel."""
+        defaults = {
+            "minimum": -np.inf,
+            "maximum": np.inf,
+            "rate": np.nan,
+            "step": np.nan
+        }
+        for key, val in settings.items():
+            if key in defaults:
+                val = ArrayValidator._channels(
+                    len(self.minimum), val, defaults[key])
+            elif key == "value" and val is not None:
+                val = np.asarray(val, dtype=float)
+            setattr(self, key, val)
+
+    def to_json(self):
+        """Return a dict representation of the Validator."""
+        return {
+            key: (val.tolist() if isinstance(val, np.ndarray) else val)
+            for key, val in super(ArrayValidator, self).to_json().items()
+        }
+
+    @staticmethod
+    def _channels(num, limit, default):
+        """Broadcast a scalar or per-channel limit to an array of length num.
+        """
+        if limit is None:
+            return np.full(num, default)
+        return np.broadcast_to(np.asarray(limit, dtype=float), (num, )).copy()
+
+
+class DiscreteValidator(Validator):
+    """Value and allowed values of a DiscreteParam on a single Instrument."""
+    __slots__ = ["value", "values"]
+
+    def __init__(self, values):
+        self.value = None
+        self.values = values
+
+
 class Param(Loadable):
     """Describe a single parameter on an Instrument.
     """
@@ -19,7 +124,10 @@ class Param(Loadable):
         """
         if instance is None:
             return self
-        return instance.__dict__[self.key]
+        value = instance.__dict__[self.validator_key].value
+        if instance._recorder is not None:
+            instance._recorder.record("get", instance, self.key, value)
+        return value
 
     def __set__(self, instance, value):
         """Should validate then set."""
@@ -27,6 +135,8 @@ class Param(Loadable):
 
     def __set_name__(self, owner, name):
         self.key = name
+        # Build the lookup key once instead of on every get/set
+        self.validator_key = "_" + name
 
     def __str__(self):
         return "<{}: {}>".format(self.__class__.__name__, self.name)
@@ -34,6 +144,28 @@ class Param(Loadable):
     def __repr__(self):
         return str(self)
 
+    def validator(self, instance):
+        """Return the Validator managing this Param on instance."""
+        return instance.__dict__[self.validator_key]
+
+    def _write(self, instance, validator, value):
+        """Write a value that has already been checked.
+
+        This is the single place a new value reaches the instrument. Access
+        is serialized with the instrument's bus lock when one is set and the
+        change is reported to an attached ChangeLog and Recorder.
+        """
+        lock = instance._lock
+        if lock is None:
+            validator.value = value
+        else:
+            with lock:
+                validator.value = value
+        if instance._tracker is not None:
+            instance._tracker.add(validator)
+        if instance._recorder is not None:
+            instance._recorder.record("set", instance, self.key, value)
+
     def _setup(self):
         """Write instance specific data needed to manage the value.
 
@@ -65,20 +197,22 @@ class ContinuousParam(Param):
         self.step = step
 
     def __set__(self, instance, value):
-        limits = getattr(instance, "_" + self.key)
+        limits = instance.__dict__[self.validator_key]
         # Check that the value does not violate limits
-        self.check_value(value, limits["minimum"], limits["maximum"])
+        self.check_value(value, limits.minimum, limits.maximum)
         # Sweep the parameter in small steps if possible
-        if limits["rate"] and limits["step"]:
-            self.sweep(instance, value, limits["rate"], limits["step"])
+        if limits.rate and limits.step and limits.value is not None:
+            self.sweep(instance, value, limits.rate, limits.step)
         # Directly set the parameter if not
         else:
             self._set(instance, value)
 
     def check_value(self, value, minimum, maximum):
-        if not minimum <= value <= maximum:
-            raise ValueError(
-                "{} violates limits {} on {}".format(value, limits, self.key))
+        """Raise a ValueError if value is outside of [minimum, maximum]."""
+        if ((minimum is not None and value < minimum)
+                or (maximum is not None and value > maximum)):
+            raise ValueError("{} violates limits ({}, {}) on {}".format(
+                value, minimum, maximum, self.key))
 
     def __str__(self):
         return "<{}: {} ({})>".format(self.__class__.__name__, self.key,
@@ -86,20 +220,14 @@ class ContinuousParam(Param):
 
     def _set(self, instance, value):
         """Directly adjust the paramter without checking limits."""
-        instance.__dict__[self.key]["value"] = value
+        self._write(instance, instance.__dict__[self.validator_key], value)
 
     def _setup(self):
-        """Return a dict for managing a ContinuousParam."""
-        return {
-            "value": None,
-            "units": self.units,
-            "minimum": self.minimum,
-            "maximum": self.maximum,
-            "rate": self.rate,
-            "step": self.step
-        }
+        """Return a ContinuousValidator for managing a ContinuousParam."""
+        return ContinuousValidator(self.units, self.minimum, self.maximum,
+                                   self.rate, self.step)
 
-    def sweep(self, instance, value, step, rate):
+    def sweep(self, instance, value, rate, step):
         """Continuously adjust the parameter.
 
         The number of points for the sweep is selected such that the
@@ -118,7 +246,7 @@ class ContinuousParam(Param):
         # Define the values that are swept over
         start = self.__get__(instance, None)
         num = math.ceil(np.abs(start - value) / step)
-        vals = np.linspace(start, value, num)
+        vals = np.linspace(start, value, num + 1)[1:]
         delay = step / rate
         # Run the sweep
         for val in vals:
@@ -141,9 +269,9 @@ class DiscreteParam(Param):
         """If possible sets the range to the nearest value.
 
         If setting is str-like then it require matches."""
-        closest = self.check_value(value,
-                                   instance.__dict__["_" + self.key]["values"])
-        instance.__dict__[self.key] = closest
+        validator = instance.__dict__[self.validator_key]
+        self._write(instance, validator,
+                    self.check_value(value, validator.values))
 
     def check_value(self, value, values):
         """Take a requested value and return the closest match for setting."""
@@ -152,14 +280,109 @@ class DiscreteParam(Param):
             return value
         else:
             try:
-                closest = min(self.values, key=lambda x: abs(x - value))
+                closest = min(values, key=lambda x: abs(x - value))
             except TypeError:
                 # Then it's not a numeric paramter. Raise a value error.
                 raise ValueError(
-                    "{} cannot be set to {}".format(self.name, value))
+                    "{} cannot be set to {}".format(self.key, value))
             else:
                 return closest
 
     def _setup(self):
-        """Return a dict that manages a DiscreteParam."""
-        return {"value": None, "values": self.values}
+        """Return a DiscreteValidator that manages a DiscreteParam."""
+        return DiscreteValidator(self.values)
+
+
+class ParamArray(Param):
+    """A vector of identical channels, e.g. the outputs of a multi-channel DAC.
+
+    Setting the Param checks every channel against its own limits at once
+    and ramps all channels together. The whole vector is written in a
+    single call to _set at each step of the ramp.
+    """
+
+    def __init__(self,
+                 num,
+                 units=None,
+                 minimum=None,
+                 maximum=None,
+                 rate=None,
+                 step=None):
+        """
+        Args:
+            num (int): number of channels
+            units (str): units shared by all channels
+            minimum (float or array): minimum value of each channel
+            maximum (float or array): maximum value of each channel
+            rate (float or array): maximum sweep rate (unit/s) of each channel
+            step (float or array): maximum step size of each channel
+        """
+        super(ParamArray, self).__init__()
+        self.num = num
+        self.units = units
+        self.minimum = minimum
+        self.maximum = maximum
+        self.rate = rate
+        self.step = step
+
+    def __set__(self, instance, value):
+        limits = instance.__dict__[self.validator_key]
+        value = np.broadcast_to(np.asarray(value, dtype=float),
+                                (self.num, )).copy()
+        self.check_value(value, limits.minimum, limits.maximum)
+        if limits.value is None:
+            self._set(instance, value)
+        else:
+            self.sweep(instance, value, limits.rate, limits.step)
+
+    def __str__(self):
+        return "<{}: {} ({} x {})>".format(self.__class__.__name__, self.key,
+                                           self.num, self.units)
+
+    def check_value(self, value, minimum, maximum):
+        """Raise a ValueError if any channel is outside of its limits."""
+        bad = np.flatnonzero((value < minimum) | (value > maximum))
+        if bad.size:
+            raise ValueError("{} violates limits on channels {} of {}".format(
+                value[bad], bad.tolist(), self.key))
+
+    def _set(self, instance, value):
+        """Directly write every channel without checking limits."""
+        self._write(instance, instance.__dict__[self.validator_key], value)
+
+    def _setup(self):
+        """Return an ArrayValidator for managing a ParamArray."""
+        return ArrayValidator(self.num, self.units, self.minimum,
+                              self.maximum, self.rate, self.step)
+
+    def sweep(self, instance, value, rate, step):
+        """Ramp all channels together.
+
+        The number of steps is set by the channel that needs the most steps
+        and the duration by the channel that takes the longest at its own
+        rate. Every channel then moves linearly over the same steps, so no
+        channel exceeds its own rate or step limit. Channels without a
+        rate/step limit do not constrain the ramp.
+
+        Args:
+            value (array): values of the channels to sweep to
+            rate (array): rate (unit/s) limit of each channel
+            step (array): maximum step size of each channel
+        """
+        start = self.__get__(instance, None)
+        delta = np.abs(value - start)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            steps = np.where(step > 0, np.ceil(delta / step), 0)
+            times = np.where(rate > 0, delta / rate, 0)
+        num = int(steps.max()) if steps.size else 0
+        duration = float(times.max()) if times.size else 0.0
+        if num == 0 and duration == 0:
+            self._set(instance, value)
+            return
+        num = max(num, 1)
+        vals = start + np.outer(np.arange(1, num + 1) / num, value - start)
+        vals[-1] = value
+        delay = duration / num
+        for val in vals:
+            self._set(instance, val)
+            time.sleep(delay)
@@ -0,0 +1,401 @@
+"""Control the instruments of a Setup on another computer.
+
+An InstrumentServer exposes the Instruments of a Setup on a TCP or Unix
+socket. A Client connects to it and makes a RemoteInstrument for each of
+them, with the same Params as the original, so Getters, Setters and Sweeps
+work on it unchanged.
+
+Requests are pipelined: Client.submit queues a request and returns a Reply
+at once, and the queued requests are sent together when a result is needed.
+RemoteInstruments are triggered (see Instrument.trigger), so a Measure
+reading several remote Getters costs a single round trip per point. The
+server in turn triggers a run of reads together, overlapping the integration
+times of the served instruments.
+
+Messages are pickled, so only serve on networks where every client is
+trusted (e.g. localhost or a lab network).
+"""
+import collections
+import itertools
+import pickle
+import socket
+import socketserver
+import struct
+import threading
+from concurrent.futures import Future
+from measurement.instruments.instrument import Instrument
+from measurement.instruments.param import Param
+
+import logging
+log = logging.getLogger(__name__)
+
+# Messages are sent as a 4 byte length followed by a pickle
+_HEADER = struct.Struct("!I")
+
+
+def send(sock, obj):
+    """Send a pickled message on a socket."""
+    data = pickle.dumps(obj, pickle.HIGHEST_PROTOCOL)
+    sock.sendall(_HEADER.pack(len(data)) + data)
+
+
+def receive(stream):
+    """Read a message from a file made by socket.makefile.
+
+    Raises:
+        EOFError: if the connection was closed.
+    """
+    header = stream.read(_HEADER.size)
+    if len(header) < _HEADER.size:
+        raise EOFError("Connection closed.")
+    size, = _HEADER.unpack(header)
+    return pickle.loads(stream.read(size))
+
+
+def _nodelay(sock):
+    """Send small messages at once instead of waiting to fill a packet."""
+    if sock.family in (socket.AF_INET, socket.AF_INET6):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    """Answer the requests of one client in the order they arrive."""
+
+    def handle(self):
+        _nodelay(self.request)
+        server = self.server.instrument_server
+        while True:
+            try:
+                requests = receive(self.rfile)
+            except EOFError:
+                return
+            server.batches += 1
+            send(self.request, server.execute_all(requests))
+
+
+class _TCPServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+    daemon_threads = True
+
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+
+    class _UnixServer(socketserver.ThreadingUnixStreamServer):
+        allow_reuse_address = True
+        daemon_threads = True
+
+
+class InstrumentServer(object):
+    """Serve the Instruments of a Setup to Clients."""
+
+    def __init__(self, setup, address):
+        """
+        Args:
+            setup (Setup): Setup with the Instruments to serve
+            address: (host, port) to serve on TCP, or the path of a Unix
+                socket. Port 0 picks a free port, see self.address.
+        """
+        self.setup = setup
+        self.instruments = {inst.name: inst for inst in setup.instruments()}
+        # Instruments are not thread safe: clients take turns
+        self.lock = threading.RLock()
+        # Number of messages received, one per round trip
+        self.batches = 0
+        if isinstance(address, str):
+            self.server = _UnixServer(address, _Handler)
+        else:
+            self.server = _TCPServer(address, _Handler)
+        self.server.instrument_server = self
+        self.address = self.server.server_address
+        self.thread = None
+
+    def __str__(self):
+        return "<{}: {} on {}>".format(self.__class__.__name__,
+                                       self.setup.name, self.address)
+
+    def __repr__(self):
+        return str(self)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def execute_all(self, requests):
+        """Execute the requests of a message in order.
+
+        Returns:
+            list: a reply per request, see execute
+        """
+        replies = []
+        for is_get, group in itertools.groupby(requests,
+                                               lambda req: req[1] == "get"):
+            if is_get:
+                replies.extend(self.read(list(group)))
+            else:
+                replies.extend(self.execute(*req) for req in group)
+        return replies
+
+    def read(self, requests):
+        """Read a run of "get" requests, triggering all of them first."""
+        errors = {}
+        replies = []
+        with self.lock:
+            for id, _, name, attr in requests:
+                inst = self.instruments.get(name)
+                if inst is not None and inst.triggered:
+                    try:
+                        inst.trigger(attr)
+                    except Exception as err:
+                        errors[id] = err
+            for id, _, name, attr in requests:
+                if id in errors:
+                    replies.append((id, False, errors[id]))
+                    continue
+                try:
+                    inst = self.instruments[name]
+                    if inst.triggered:
+                        value = inst.fetch(attr)
+                    else:
+                        value = getattr(inst, attr)
+                    replies.append((id, True, value))
+                except Exception as err:
+                    replies.append((id, False, err))
+        return replies
+
+    def execute(self, id, op, name, *args):
+        """Execute a single request other than "get".
+
+        Args:
+            id (int): number of the request, returned with the reply
+            op (str): "set", "call" or "describe"
+            name (str): name of the Instrument
+            args: attribute, then the value (set) or the arguments (call)
+
+        Returns:
+            tuple: (id, True, result) or (id, False, exception)
+        """
+        try:
+            with self.lock:
+                if op == "describe":
+                    result = self.describe()
+                else:
+                    inst = self.instruments[name]
+                    if op == "set":
+                        setattr(inst, args[0], args[1])
+                        # The Param may round the value, e.g. a DiscreteParam
+                        result = getattr(inst, args[0])
+                    elif op == "call":
+                        result = getattr(inst, args[0])(*args[1])
+                    else:
+                        raise ValueError("Unknown request {}.".format(op))
+            return id, True, result
+        except Exception as err:
+            return id, False, err
+
+    def describe(self):
+        """Return the Param Validators of each Instrument, keyed by name."""
+        return {
+            name: {key: inst.get_validator(key)
+                   for key in inst.params()}
+            for name, inst in self.instruments.items()
+        }
+
+    def start(self):
+        """Serve from a background thread."""
+        # Poll often so close() returns quickly
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       kwargs={"poll_interval": 0.05},
+                                       name=str(self),
+                                       daemon=True)
+        self.thread.start()
+
+    def serve_forever(self):
+        self.server.serve_forever()
+
+    def close(self):
+        if self.thread is not None:
+            self.server.shutdown()
+            self.thread.join()
+            self.thread = None
+        self.server.server_close()
+
+
+class Reply(Future):
+    """The result of a request, sending the queued requests when needed."""
+
+    def __init__(self, client):
+        super(Reply, self).__init__()
+        self.client = client
+
+    def result(self, timeout=None):
+        self.client.flush()
+        return super(Reply, self).result(timeout)
+
+
+class Client(object):
+    """A connection to an InstrumentServer."""
+
+    def __init__(self, address, timeout=10):
+        """
+        Args:
+            address: (host, port) or path of the Unix socket of the server
+            timeout (float): seconds to wait for a reply
+        """
+        if isinstance(address, str):
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        else:
+            self.socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.socket.connect(address)
+        _nodelay(self.socket)
+        self.address = address
+        self.timeout = timeout
+        self.lock = threading.Lock()
+        self.ids = itertools.count()
+        # Requests not sent yet and replies not received yet
+        self.outbox = []
+        self.pending = {}
+        self.thread = threading.Thread(
+            target=self._receive, name=str(self), daemon=True)
+        self.thread.start()
+
+    def __str__(self):
+        return "<{}: {}>".format(self.__class__.__name__, self.address)
+
+    def __repr__(self):
+        return str(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def submit(self, op, name=None, *args):
+        """Queue a request without waiting for it.
+
+        Returns:
+            Reply: call result() for the value. This sends the queued
+                requests if they were not sent yet.
+        """
+        reply = Reply(self)
+        with self.lock:
+            id = next(self.ids)
+            self.pending[id] = reply
+            self.outbox.append((id, op, name) + args)
+        return reply
+
+    def flush(self):
+        """Send all queued requests in a single message."""
+        with self.lock:
+            if not self.outbox:
+                return
+            requests, self.outbox = self.outbox, []
+            send(self.socket, requests)
+
+    def call(self, op, name=None, *args):
+        """Make a request and wait for the result."""
+        return self.submit(op, name, *args).result(self.timeout)
+
+    def _receive(self):
+        stream = self.socket.makefile("rb")
+        try:
+            while True:
+                for id, ok, value in receive(stream):
+                    reply = self.pending.pop(id)
+                    if ok:
+                        reply.set_result(value)
+                    else:
+                        reply.set_exception(value)
+        except (EOFError, OSError) as err:
+            # Fail the requests that will never be answered
+            for id in list(self.pending):
+                self.pending.pop(id).set_exception(
+                    ConnectionError("Lost {}: {}".format(self, err)))
+
+    def instruments(self):
+        """Return a RemoteInstrument for each served Instrument.
+
+        Returns:
+            dict: RemoteInstruments keyed by name
+        """
+        return {
+            name: RemoteInstrument.make(name, self, validators)
+            for name, validators in self.call("describe").items()
+        }
+
+    def close(self):
+        try:
+            self.socket.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.socket.close()
+        self.thread.join()
+
+
+class RemoteParam(Param):
+    """A Param read and set through a Client.
+
+    A copy of the remote Validator is kept locally for the units and limits.
+    Its value is updated on every get and set, and sets are reported to an
+    attached ChangeLog.
+    """
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        value = instance.client.call("get", instance.name, self.key)
+        instance.__dict__[self.validator_key].value = value
+        if instance._recorder is not None:
+            instance._recorder.record("get", instance, self.key, value)
+        return value
+
+    def __set__(self, instance, value):
+        value = instance.client.call("set", instance.name, self.key, value)
+        self._write(instance, instance.__dict__[self.validator_key], value)
+
+
+class RemoteInstrument(Instrument):
+    """Stand-in for an Instrument served by an InstrumentServer.
+
+    Make them with Client.instruments rather than directly.
+    """
+    triggered = True
+    _transient = Instrument._transient + ("client", "_replies")
+
+    def __init__(self, name, client, validators):
+        """
+        Args:
+            name (str): name of the served Instrument
+            client (Client): connection to the server
+            validators (dict): copies of the Validators of the Params
+        """
+        self.name = name
+        self.client = client
+        # Replies to triggered reads, oldest first, by Param
+        self._replies = collections.defaultdict(collections.deque)
+        for key, validator in validators.items():
+            setattr(self, "_" + key, validator)
+
+    @staticmethod
+    def make(name, client, validators):
+        """Make a RemoteInstrument with a RemoteParam per Validator."""
+        cls = type("Remote_" + name, (RemoteInstrument, ),
+                   {key: RemoteParam()
+                    for key in validators})
+        return cls(name, client, validators)
+
+    def trigger(self, attr):
+        """Queue a read of attr, sent with the next request that waits."""
+        self._replies[attr].append(self.client.submit("get", self.name, attr))
+
+    def fetch(self, attr):
+        value = self._replies[attr].popleft().result(self.client.timeout)
+        self.get_validator(attr).value = value
+        return value
+
+    def read_batch(self, attr, num):
+        """Read attr num times on the server in a single round trip."""
+        return self.client.call("call", self.name, "read_batch", (attr, num))
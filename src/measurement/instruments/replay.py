@@ -0,0 +1,232 @@
+"""Record the instrument traffic of a run and play it back without hardware.
+
+A Recorder attached to a Setup logs every Param read and write with its time
+and value. Replay turns the recording into a Setup of ReplayInstruments with
+the same Params. Reads return the recorded values, either as fast as
+possible or with the original timing. The same measurement script can then
+be profiled or debugged on a computer without the instruments.
+
+A recording is a file of pickles: a header with the Validators of every
+instrument, followed by lists of events (time, op, instrument, param, value).
+"""
+import collections
+import pickle
+import threading
+import time
+import numpy as np
+from measurement.instruments.instrument import Instrument
+from measurement.instruments.param import (Param, DiscreteParam,
+                                           DiscreteValidator, ArrayValidator)
+from measurement.instruments.setup import Setup
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class Recorder(object):
+    """Log the Param reads and writes of the Instruments of a Setup."""
+
+    def __init__(self, setup, filename, chunk=10000):
+        """
+        Args:
+            setup (Setup): Setup to record. Recording stops on close.
+            filename (str): file to write the recording to
+            chunk (int): number of events kept in memory between writes
+        """
+        self.setup = setup
+        self.filename = filename
+        self.chunk = chunk
+        self.events = []
+        self.count = 0
+        self.lock = threading.Lock()
+        self.file = open(filename, "wb")
+        pickle.dump(
+            {
+                "setup": setup.name,
+                "instruments": {
+                    inst.name: {key: inst.get_validator(key)
+                                for key in inst.params()}
+                    for inst in setup.instruments()
+                }
+            }, self.file, pickle.HIGHEST_PROTOCOL)
+        self.start = time.perf_counter()
+        for inst in setup.instruments():
+            inst._recorder = self
+
+    def __str__(self):
+        return "<{}: {} ({} events)>".format(self.__class__.__name__,
+                                             self.filename, self.count)
+
+    def __repr__(self):
+        return str(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record(self, op, inst, attr, value):
+        """Log a "get" or "set" of inst.attr."""
+        event = (time.perf_counter() - self.start, op, inst.name, attr, value)
+        # Instruments may be used from several threads, e.g. by a Scheduler
+        with self.lock:
+            self.events.append(event)
+            if len(self.events) >= self.chunk:
+                self._write()
+
+    def flush(self):
+        """Write the events logged so far."""
+        with self.lock:
+            self._write()
+
+    def _write(self):
+        if self.events:
+            self.count += len(self.events)
+            pickle.dump(self.events, self.file, pickle.HIGHEST_PROTOCOL)
+            self.events = []
+
+    def close(self):
+        for inst in self.setup.instruments():
+            # Fall back to the class default of None
+            inst.__dict__.pop("_recorder", None)
+        self.flush()
+        self.file.close()
+
+
+def read(filename):
+    """Read a recording.
+
+    Returns:
+        tuple: (header, events) with the events as a list of
+            (time, op, instrument, param, value)
+    """
+    events = []
+    with open(filename, "rb") as f:
+        header = pickle.load(f)
+        while True:
+            try:
+                events.extend(pickle.load(f))
+            except EOFError:
+                break
+    return header, events
+
+
+class Replay(object):
+    """Play back a recording through ReplayInstruments."""
+
+    def __init__(self, filename, realtime=False):
+        """
+        Args:
+            filename (str): recording written by a Recorder
+            realtime (bool): if True, each event waits until its time in
+                the recording, counted from the first event played.
+                Otherwise events are played as fast as possible.
+        """
+        self.filename = filename
+        self.realtime = realtime
+        self.header, events = read(filename)
+        # (instrument, param) -> [(time, op, value)] not played yet
+        self.events = collections.defaultdict(collections.deque)
+        for t, op, name, attr, value in events:
+            self.events[(name, attr)].append((t, op, value))
+        self.offset = None
+
+    def __str__(self):
+        return "<{}: {}>".format(self.__class__.__name__, self.filename)
+
+    def __repr__(self):
+        return str(self)
+
+    def setup(self):
+        """Return a Setup of ReplayInstruments, one per recorded one."""
+        setup = Setup(self.header["setup"])
+        for name, validators in self.header["instruments"].items():
+            setup.add(ReplayInstrument.make(name, self, validators))
+        return setup
+
+    def play(self, op, name, attr, value=None):
+        """Play the events of name.attr up to the next matching one.
+
+        A "get" plays up to the next recorded read. A "set" plays up to the
+        recorded write of the same value, so the steps of a recorded ramp
+        are passed over.
+
+        Returns:
+            the recorded value
+
+        Raises:
+            LookupError: if no matching event is left.
+        """
+        events = self.events[(name, attr)]
+        while events:
+            t, recorded_op, recorded = events.popleft()
+            if recorded_op != op:
+                continue
+            if op == "set" and not np.array_equal(recorded, value):
+                continue
+            if self.realtime:
+                self._wait(t)
+            return recorded
+        raise LookupError("No recorded {} of {}.{} left{}.".format(
+            op, name, attr, "" if value is None else " to " + str(value)))
+
+    def _wait(self, t):
+        now = time.perf_counter()
+        if self.offset is None:
+            self.offset = now - t
+        delay = self.offset + t - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class ReplayParam(Param):
+    """A Param that plays back recorded reads and checks recorded writes."""
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        value = instance.replay.play("get", instance.name, self.key)
+        instance.__dict__[self.validator_key].value = value
+        return value
+
+    def __set__(self, instance, value):
+        validator = instance.__dict__[self.validator_key]
+        # Write the value the recorded Param wrote
+        if isinstance(validator, DiscreteValidator):
+            value = DiscreteParam.check_value(self, value, validator.values)
+        elif isinstance(validator, ArrayValidator):
+            value = np.broadcast_to(np.asarray(value, dtype=float),
+                                    (len(validator.minimum), )).copy()
+        # A ramp to the current value writes nothing, so nothing is recorded
+        if not np.array_equal(validator.value, value):
+            instance.replay.play("set", instance.name, self.key, value)
+        self._write(instance, validator, value)
+
+
+class ReplayInstrument(Instrument):
+    """Stand-in for a recorded Instrument.
+
+    Make them with Replay.setup rather than directly.
+    """
+    _transient = Instrument._transient + ("replay", )
+
+    def __init__(self, name, replay, validators):
+        """
+        Args:
+            name (str): name of the recorded Instrument
+            replay (Replay): recording to play
+            validators (dict): Validators of the Params when recording began
+        """
+        self.name = name
+        self.replay = replay
+        for key, validator in validators.items():
+            setattr(self, "_" + key, validator)
+
+    @staticmethod
+    def make(name, replay, validators):
+        """Make a ReplayInstrument with a ReplayParam per Validator."""
+        cls = type("Replay_" + name, (ReplayInstrument, ),
+                   {key: ReplayParam()
+                    for key in validators})
+        return cls(name, replay, validators)
@@ -1,9 +1,14 @@
 """Record the configuration of a collection of instruments."""
 
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
 log = logging.getLogger(__name__)
 
 from .base import Loadable
+from .instrument import Instrument
+from .param import ContinuousValidator, ArrayValidator
 
 
 class Setup(Loadable):
@@ -19,6 +24,125 @@ class Setup(Loadable):
         """Add an intsrument to the Setup"""
         setattr(self, inst.name, inst)
 
-    def close(self):
-        """Close the instruments"""
-        pass
+    def instruments(self):
+        """Return a list of the Instruments in the Setup."""
+        return [val for val in self.__dict__.values()
+                if isinstance(val, Instrument)]
+
+    def zero_all(self, order=(), names=None, workers=32):
+        """Bring every continuous Param to zero, ramping them together.
+
+        Params ramp in a pool of threads at their own rate and step limits,
+        so the time to a safe state is set by the slowest ramp rather than
+        the sum of all of them. Params on a shared bus take turns per step
+        through the bus lock. Params whose limits exclude zero (e.g. a
+        frequency) ramp to the allowed value nearest to it.
+
+        Args:
+            order (list): (first, then) pairs. The Params of then start to
+                ramp once those of first are at zero. Each is an
+                "instrument.param" name or an instrument name for all of its
+                Params, e.g. [("magnet", "gates")] brings the field down
+                before the gates.
+            names (list): "instrument.param" or instrument names to zero.
+                Every ContinuousParam and ParamArray with a value if None.
+            workers (int): largest number of Params ramping at once
+
+        Raises:
+            ValueError: if order has a cycle.
+        """
+        ramps = {}
+        for inst in self.instruments():
+            for attr in inst.params():
+                key = "{}.{}".format(inst.name, attr)
+                if names is not None and not (key in names
+                                              or inst.name in names):
+                    continue
+                validator = inst.get_validator(attr)
+                if (isinstance(validator, (ContinuousValidator,
+                                           ArrayValidator))
+                        and validator.value is not None):
+                    value = _safe_value(validator)
+                    if np.any(value != 0):
+                        log.warning("%s can't be zero, ramping it to %s",
+                                    key, value)
+                    ramps[key] = (inst, attr, value)
+        after = {key: set() for key in ramps}
+        for first, then in order:
+            for key in _matches(then, ramps):
+                after[key].update(_matches(first, ramps))
+        # Time until each ramp is done, following the order
+        finish = {}
+        # Keys in the order they can start
+        sequence = []
+        pending = dict(after)
+        while pending:
+            ready = [key for key, keys in pending.items()
+                     if not keys - set(finish)]
+            if not ready:
+                raise ValueError("Cycle in the order of {}.".format(
+                    sorted(pending)))
+            for key in ready:
+                inst, attr, value = ramps[key]
+                finish[key] = inst.ramp_time(attr, value) + max(
+                    (finish[first] for first in after[key]), default=0)
+                sequence.append(key)
+                del pending[key]
+        log.info("zeroing %d params of %s in %.1f s", len(ramps), self,
+                 max(finish.values(), default=0))
+        done = {key: threading.Event() for key in ramps}
+        failed = set()
+        errors = []
+
+        def target(key):
+            try:
+                for first in after[key]:
+                    done[first].wait()
+                if after[key] & failed:
+                    raise RuntimeError("Not zeroing {} as {} failed.".format(
+                        key, sorted(after[key] & failed)))
+                inst, attr, value = ramps[key]
+                if np.any(value != 0):
+                    inst.sweep(attr, value)
+                else:
+                    inst.zero(attr)
+            except BaseException as err:
+                log.exception("zeroing %s failed", key)
+                failed.add(key)
+                errors.append(err)
+            finally:
+                done[key].set()
+
+        # The pool starts ramps in the order they were submitted, so a ramp
+        # waiting for others only holds a thread once they have one too
+        with ThreadPoolExecutor(max(1, min(workers, len(ramps)))) as pool:
+            for key in sequence:
+                pool.submit(target, key)
+        if errors:
+            raise errors[0]
+
+    def close(self, order=()):
+        """Bring the Setup to a safe state before it is released.
+
+        Args:
+            order (list): (first, then) pairs, see zero_all
+        """
+        self.zero_all(order)
+
+
+def _safe_value(validator):
+    """Return the value nearest to zero that the limits of a Validator allow."""
+    if isinstance(validator, ArrayValidator):
+        return np.clip(0, validator.minimum, validator.maximum)
+    value = 0.0
+    if validator.minimum is not None:
+        value = max(value, validator.minimum)
+    if validator.maximum is not None:
+        value = min(value, validator.maximum)
+    return value
+
+
+def _matches(name, ramps):
+    """Return the keys of ramps named by an "instrument.param" or instrument."""
+    return [key for key in ramps
+            if key == name or key.split(".", 1)[0] == name]
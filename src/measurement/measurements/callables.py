@@ -8,7 +8,10 @@ import time
 from collections import OrderedDict
 from typing import Sequence, Callable, List
 from measurement.instruments.instrument import Instrument
-from measurement.measurements.measurement import Measurement
+from measurement.instruments.param import ArrayValidator
+from measurement.measurements.setpoints import (Linspace, Logspace, Concat,
+                                                Reversed, loop)
+from measurement.util.stats import RunningStats
 
 import logging
 log = logging.getLogger(__name__)
@@ -22,22 +25,27 @@ class Setter(object):
     __slots__ = ["inst", "attr", "val"]
 
     def __init__(self, inst: Instrument, attr: str, val) -> None:
-        self.isnt = inst
+        self.inst = inst
         self.attr = attr
         self.val = val
 
     def __call__(self):
         """Get the attribute and sweep it to val"""
-        logging.info(str(self))
+        # Formatted only if debug logging is on for this module
+        log.debug("setting %s", self)
         setattr(self.inst, self.attr, self.val)
-        logging.info("done")
 
     def __repr__(self):
         return str(self)
 
     def __str__(self):
-        return "<{}: {} on {} -> {:.3f}>".format(
-            self.__class__.__name__, self.attr, self.instr, self.val)
+        if np.isscalar(self.val):
+            val = "{:.3f}".format(self.val)
+        else:
+            # Vector-valued setpoint for a ParamArray
+            val = np.array2string(np.asarray(self.val), precision=3)
+        return "<{}: {} on {} -> {}>".format(self.__class__.__name__,
+                                             self.attr, self.inst, val)
 
     def validate(self):
         """Check if the setter violates limits on paramter."""
@@ -45,14 +53,52 @@ class Setter(object):
 
 
 class Getter(object):
-    __slots__ = ["inst", "attr"]
+    __slots__ = ["inst", "attr", "dtype", "shape"]
 
-    def __init__(self, inst: Instrument, attr: str) -> None:
+    def __init__(self, inst: Instrument, attr: str, dtype=None,
+                 shape=None) -> None:
+        """
+        Args:
+            inst (Instrument): Instrument to read from
+            attr (str): name of the Param to read
+            dtype (numpy.dtype): type used to store the values. Defaults to
+                float. Use e.g. int16 for ADC counts or bool for flags.
+            shape (tuple): shape of each reading, e.g. (1024, ) for a trace
+                of 1024 points. The DataArray gets these trailing axes and
+                each reading is stored with a single copy. Defaults to one
+                value per channel for a ParamArray and a scalar otherwise.
+        """
         self.inst = inst
         self.attr = attr
+        self.dtype = dtype
+        if shape is None:
+            validator = inst.__dict__.get("_" + attr)
+            shape = ((len(validator.minimum), ) if isinstance(
+                validator, ArrayValidator) else ())
+        self.shape = tuple(shape)
 
     def __call__(self):
-        return getattr(self.inst, self.attr)
+        lock = self.inst._lock
+        if lock is None:
+            return getattr(self.inst, self.attr)
+        with lock:
+            return getattr(self.inst, self.attr)
+
+    def trigger(self):
+        """Start the reading without waiting for it, see Instrument.trigger."""
+        lock = self.inst._lock
+        if lock is None:
+            return self.inst.trigger(self.attr)
+        with lock:
+            return self.inst.trigger(self.attr)
+
+    def fetch(self):
+        """Return the reading started by trigger."""
+        lock = self.inst._lock
+        if lock is None:
+            return self.inst.fetch(self.attr)
+        with lock:
+            return self.inst.fetch(self.attr)
 
     def __str__(self):
         return "<{}: {} from {}>".format(self.__class__.__name__, self.attr,
@@ -63,7 +109,7 @@ class Getter(object):
 
     @property
     def units(self):
-        return self.inst.get_validator(self.attr)['units']
+        return self.inst.get_validator(self.attr).units
 
     @property
     def name(self):
@@ -79,6 +125,84 @@ class Getter(object):
         return getters
 
 
+# Fields stored for each point by an AverageGetter
+AVERAGE_DTYPE = np.dtype([("mean", "f8"), ("std", "f8"), ("count", "i8")])
+
+
+class AverageGetter(Getter):
+    """Average many reads of a Param into one point.
+
+    The reads are combined into a running mean and variance as they arrive,
+    so the samples are never stored. Each point of the DataSet holds the
+    mean, the standard deviation of the samples and their count (see
+    AVERAGE_DTYPE), e.g. data.key["mean"].
+
+    Reads are made in batches with Instrument.read_batch, which drivers can
+    implement with a single query.
+    """
+    __slots__ = ["num", "error", "batch", "max_num"]
+
+    def __init__(self,
+                 inst: Instrument,
+                 attr: str,
+                 num=None,
+                 error=None,
+                 batch=None,
+                 max_num=10000) -> None:
+        """
+        Args:
+            inst (Instrument): Instrument to read from
+            attr (str): name of the Param to read
+            num (int): number of reads to average
+            error (float): read until the standard error of the mean is
+                below error instead of a fixed number of times
+            batch (int): reads per call to read_batch. Defaults to num, or
+                10 when reading to a target error.
+            max_num (int): most reads made when reading to a target error
+
+        Raises:
+            ValueError: if neither or both of num and error are given.
+        """
+        if (num is None) == (error is None):
+            raise ValueError("Give one of num or error.")
+        super(AverageGetter, self).__init__(inst, attr, AVERAGE_DTYPE, ())
+        self.num = num
+        self.error = error
+        self.batch = batch or num or 10
+        self.max_num = max_num
+
+    def __call__(self):
+        stats = RunningStats()
+        target = self.num or self.max_num
+        while stats.count < target:
+            size = min(self.batch, target - stats.count)
+            lock = self.inst._lock
+            if lock is None:
+                stats.extend(self.inst.read_batch(self.attr, size))
+            else:
+                with lock:
+                    stats.extend(self.inst.read_batch(self.attr, size))
+            if self.error is not None and stats.sem <= self.error:
+                break
+        return np.array((stats.mean, stats.std, stats.count),
+                        dtype=AVERAGE_DTYPE)[()]
+
+    def trigger(self):
+        # Batches are read one after the other, so there is nothing to start
+        pass
+
+    def fetch(self):
+        return self()
+
+    def __str__(self):
+        if self.num is None:
+            until = "to {:.3g}".format(self.error)
+        else:
+            until = "x {}".format(self.num)
+        return "<{}: {} from {} {}>".format(self.__class__.__name__,
+                                            self.attr, self.inst, until)
+
+
 class Wait(object):
     """Callable waiting."""
     __slots__ = ["time"]
@@ -103,6 +227,9 @@ class TaskList(object):
     def __iter__(self):
         return iter(self.callables)
 
+    def __len__(self):
+        return len(self.callables)
+
     def __add__(self, other):
         return self.callables + other.callables
 
@@ -151,8 +278,40 @@ class TaskList(object):
         return cls(callables)
 
 
+class Setters(object):
+    """The Setters of a Sweep, made one at a time as they are needed."""
+    __slots__ = ["inst", "attr", "vals"]
+
+    def __init__(self, inst, attr, vals):
+        self.inst = inst
+        self.attr = attr
+        self.vals = vals
+
+    def __len__(self):
+        return len(self.vals)
+
+    def __getitem__(self, i):
+        return Setter(self.inst, self.attr, self.vals[i])
+
+    def __iter__(self):
+        inst, attr = self.inst, self.attr
+        for val in self.vals:
+            yield Setter(inst, attr, val)
+
+    def __str__(self):
+        return "<{}: {} on {} ({} points)>".format(self.__class__.__name__,
+                                                   self.attr, self.inst,
+                                                   len(self))
+
+    def __repr__(self):
+        return str(self)
+
+
 class Sweep(TaskList):
     """Describes the adjustment of a single instrument parameter.
+
+    Setters are made as the Sweep is iterated, so with lazy Setpoints
+    (see Sweep.linspace) a Sweep uses the same memory whatever its length.
     """
 
     def __init__(self,
@@ -161,16 +320,31 @@ class Sweep(TaskList):
                  vals,
                  before=None,
                  after=None,
-                 during=None) -> None:
+                 during=None,
+                 stop=None,
+                 skip=None) -> None:
         """
+        Args:
+            inst (Instrument): Instrument with the swept Param
+            attr (str): name of the swept Param
+            vals (array): setpoints. For a ParamArray each row of a 2D
+                array is the vector of channel values at one point. Any
+                sequence works, including lazy Setpoints.
+            stop (callable): called with a dict of the values measured at
+                each point below this Sweep. If it returns True the rest of
+                this Sweep is not visited, e.g. after a touchdown.
+            skip (callable): like stop, but moves on to the next setpoint
+                of this Sweep, skipping the rest of the Sweeps inside it.
         """
-        super(Sweep, self).__init__([Setter(attr, val) for val in vals])
+        super(Sweep, self).__init__(Setters(inst, attr, vals))
         self.inst = inst
         self.attr = attr
         self.vals = vals
         self.before = before
         self.during = during
         self.after = after
+        self.stop = stop
+        self.skip = skip
 
     def __add__(self, other):
         if isinstance(other, Sweep):
@@ -179,9 +353,15 @@ class Sweep(TaskList):
                 before = TaskList.parse(self.before, other.before)
                 during = TaskList.parse(self.during, other.during)
                 after = TaskList.parse(self.after, other.after)
-                return Sweep(self.attr,
-                             np.append(self.vals, other.vals), before, during,
-                             after)
+                return Sweep(
+                    self.inst,
+                    self.attr,
+                    Concat(self.vals, other.vals),
+                    before=before,
+                    during=during,
+                    after=after,
+                    stop=self.stop,
+                    skip=self.skip)
             else:
                 raise ValueError("Cannot add Sweeps of different attributes.")
         else:
@@ -195,6 +375,35 @@ class Sweep(TaskList):
     def __repr__(self):
         return str(self)
 
+    @classmethod
+    def linspace(cls, inst, attr, start, stop, num, **kwargs):
+        """Sweep evenly from start to stop without storing the setpoints."""
+        return cls(inst, attr, Linspace(start, stop, num), **kwargs)
+
+    @classmethod
+    def logspace(cls, inst, attr, start, stop, num, **kwargs):
+        """Sweep from start to stop in even steps on a log scale."""
+        return cls(inst, attr, Logspace(start, stop, num), **kwargs)
+
+    def _replace(self, vals):
+        return Sweep(
+            self.inst,
+            self.attr,
+            vals,
+            before=self.before,
+            during=self.during,
+            after=self.after,
+            stop=self.stop,
+            skip=self.skip)
+
+    def reverse(self):
+        """Return the Sweep in the opposite direction."""
+        return self._replace(Reversed(self.vals))
+
+    def loop(self):
+        """Return the Sweep out and back, e.g. to measure hysteresis."""
+        return self._replace(loop(self.vals))
+
     def insert(self, other):
         """Nest one sequence of callables inside another.
 
@@ -223,6 +432,19 @@ class Sweep(TaskList):
         return TaskList(callables)
 
 
+def _two_phase(call):
+    """Return True if a Measure reads call with trigger and fetch.
+
+    Only Getters of triggered instruments are split. A subclass overriding
+    __call__ computes its reading there, so it is split only if it also
+    says how to fetch it.
+    """
+    if not (isinstance(call, Getter) and call.inst.triggered):
+        return False
+    cls = type(call)
+    return cls.__call__ is Getter.__call__ or cls.fetch is not Getter.fetch
+
+
 class Measure(OrderedDict):
     """A set of tasks executed at each point in a Measurement's parameter space.
 
@@ -234,9 +456,39 @@ class Measure(OrderedDict):
         super(Measure, self).__init__(*args, **kwargs)
 
     def __call__(self):
-        return [call() for call in self.values()]
+        calls = list(self.values())
+        triggered = [_two_phase(call) for call in calls]
+        if not any(triggered):
+            return [call() for call in calls]
+        # Start every reading first, so the wait for the point is the longest
+        # integration time rather than the sum of them
+        started = set()
+        error = None
+        for i, call in enumerate(calls):
+            if triggered[i]:
+                try:
+                    call.trigger()
+                except Exception as err:
+                    error = err
+                    break
+                started.add(i)
+        values = []
+        for i, call in enumerate(calls):
+            # After an error only the started readings are collected, so
+            # none of them is left to be returned at the next point
+            if error is not None and i not in started:
+                continue
+            try:
+                values.append(call.fetch() if i in started else call())
+            except Exception as err:
+                if error is None:
+                    error = err
+        if error is not None:
+            raise error
+        return values
 
     def validate(self):
+        from measurement.measurements.measurement import Measurement
         for call in self.tasks:
             if isinstance(call, (Getter, Measurement)):
                 pass
@@ -249,5 +501,5 @@ class Measure(OrderedDict):
         """Create a Measure from a list of callables."""
         ret = cls()
         for call in callables:
-            ret.update({call.name, call})
+            ret.update({call.name: call})
         return ret
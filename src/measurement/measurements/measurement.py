@@ -12,10 +12,24 @@ Make Sweep accept lists of before/during/after
 
 Write "validators" for measurements/Sweeps/etc.
 """
+import itertools
+import json
+import os
+import pickle
+import time
+from collections import OrderedDict
 from typing import Sequence
+import numpy as np
 from measurement.measurements.callables import (Setter, Getter, Wait, TaskList,
                                                 Sweep, Measure)
-from measurement.util.dataset import DataSet
+from measurement.util.dataset import DataSet, RingDataSet
+from measurement.util.writer import Writer
+from measurement.util.publish import Publisher
+from measurement.instruments.setup import Setup
+from measurement.instruments.changelog import ChangeLog
+from measurement.instruments.replay import Recorder
+from measurement.measurements.reduce import Reductions
+from measurement.util.catalog import Catalog
 
 import logging
 log = logging.getLogger(__name__)
@@ -27,8 +41,24 @@ class Measurement(object):
     Should describe the parameter space that is explored as well as the
     parameters that are recorded during the measurement.
     """
+    # DataSet type created by run. Set to e.g. Hdf5DataSet to write to disk.
+    data_class = DataSet
+    # Options passed to the DataSet, e.g. {"compression": "gzip"}
+    data_options = {}
+    # Seconds between checkpoints when checkpoint_path is set
+    checkpoint_interval = 60
+    # Name the data is published under in shared memory, if any
+    publish = None
+    # Catalog file the run is registered in when saved, if any
+    catalog = None
+    # File the Param reads and writes of the setup are recorded to, if any
+    record = None
+    # Worker processes running the reducers: one per CPU if None, or 0 to
+    # run them in the acquisition loop
+    processes = None
 
-    def __init__(self, sweeps: Sequence[Sweep], measure: Measure) -> None:
+    def __init__(self, sweeps: Sequence[Sweep], measure: Measure,
+                 setup: Setup = None) -> None:
         """Create a new measurement from sweeps.
 
         Describe a parameter space to explore with sweeps. Describe what
@@ -40,16 +70,31 @@ class Measurement(object):
                 n-dimensional parameter space to explore.
             measure (iterable): A set of callable that specifies what is
                 recorded or what is measured @ each point in sweeps.
+            setup (Setup): If given, the changes to the state of the Setup
+                are recorded at each point in a ChangeLog.
 
         TODO: if you have a Measurement that will run other Measurements,
         how do you make saving work in a reasonable way?
         """
         self.sweeps = sweeps
         self.measure = measure
-        self.callables = TaskList.gen_callables(*self.sweeps, measure)
+        self.setup = setup
+        self.changes = None
+        # (Measurement, key) of the Measurement running this one, if nested
+        self.parent = None
+        # File the progress of run is saved to so it can be resumed
+        self.checkpoint_path = None
+        # Name of a derived DataArray -> Reducer filling it during run
+        self.reducers = OrderedDict()
+        # (Sweep, "stop" or "skip") of the predicate that fired at the last
+        # point measured, saved in checkpoints
+        self._fired = None
+        # Writer of the running DataSet, flushed by checkpoint
+        self._writer = None
+        self.shape = tuple(len(sweep) for sweep in sweeps)
 
     def __str__(self):
-        return "<{} @ {}>".format(self.__class__.name, self.timestamp)
+        return "<{}: {}>".format(self.__class__.__name__, self.shape)
 
     def __repr__(self):
         return str(self)
@@ -58,40 +103,336 @@ class Measurement(object):
         self.run()
 
     def __iter__(self):
-        yield from Measurement._iter_helper(self.sweeps[0], self.sweeps[1:],
-                                            self.measure)
+        # Flat index of the point each Measure is yielded for
+        self._index = 0
+        # (Sweep, "stop" or "skip") set by run when a predicate fires
+        self._jump = None
+        strides = [
+            int(np.prod(self.shape[i + 1:])) for i in range(len(self.shape))
+        ]
+        yield from self._iter_helper(self.sweeps, strides, 0)
 
-    @staticmethod
-    def _iter_helper(first, *rest, measure):
-        """Recursive helper method to make Measurements iterable."""
+    def _iter_helper(self, sweeps, strides, offset):
+        """Recursive helper method to make Measurements iterable.
+
+        After each point, a jump set by run stops or skips ahead in the
+        Sweep it names. Inner Sweeps end early (running their after) until
+        the jump reaches that Sweep.
+        """
+        first = sweeps[0]
         if first.before:
             yield first.before
-        for value in first:
+        for i, value in enumerate(first):
             if first.during:
                 yield first.during
             yield value
-            if rest:
-                yield from Measurement._iter_helper(rest[0], *rest[1:])
+            index = offset + i * strides[0]
+            if len(sweeps) > 1:
+                yield from self._iter_helper(sweeps[1:], strides[1:], index)
             else:
-                yield measure
+                self._index = index
+                yield self.measure
+            if self._jump is not None:
+                sweep, action = self._jump
+                if sweep is first:
+                    self._jump = None
+                    if action == "skip":
+                        continue
+                break
         if first.after:
             yield first.after
 
-    def run(self):
+    def run(self, state=None):
+        """Execute the Measurement.
+
+        Args:
+            state (dict): checkpoint of an interrupted run to continue from.
+                Use resume rather than passing this directly.
+        """
         # Attach an empty, timestamped dataset
-        self.data = DataSet.from_measure(self.measure)
-        # Collect data
-        for call in self:
-            if isinstance(call, Measure):
-                # Get the data from the callable
-                self.data.append(call())
-            else:
-                call()
+        start = 0
+        if state is not None:
+            # Continue in the DataSet (and file) of the interrupted run
+            self.data = self.data_class.from_measure(
+                self.measure,
+                self.shape,
+                filename=state["filename"],
+                **self.data_options)
+            self._add_derived()
+            self._restore(state)
+            start = state["index"]
+        elif self.parent is None:
+            self.data = self.data_class.from_measure(
+                self.measure, self.shape, **self.data_options)
+        else:
+            # Store the data in the DataSet of the parent Measurement
+            parent, key = self.parent
+            self.data = parent.data.child(key, self.measure, self.shape)
+        if state is None:
+            self._add_derived()
+        coords = self.coords()
+        if coords:
+            self.data.set_coords(coords)
+        for key, call in self.measure.items():
+            if isinstance(call, Measurement):
+                call.parent = (self, key)
+        # Track the state of the Setup at each point, in a file next to the
+        # DataSet if it is written to disk
+        if self.setup is not None:
+            filename = None
+            if self.data.extension and self.parent is None:
+                filename = os.path.splitext(self.data.filename)[0] + ".changes"
+            self.changes = ChangeLog(self.setup, filename,
+                                     append=state is not None)
+        writer = publisher = recorder = reductions = None
+        self._fired = None
+        self._writer = None
+        try:
+            if self.parent is None:
+                self.describe()
+            # Write points to disk in the background
+            self.data.open()
+            writer = self._writer = Writer(self.data)
+            # Share the data with live plotters
+            if self.publish is not None:
+                publisher = Publisher(self.data, self.publish)
+            # Log the instrument traffic so the run can be replayed offline
+            if (self.record is not None and self.setup is not None
+                    and self.parent is None):
+                recorder = Recorder(self.setup, self.record)
+            # Analyse finished points and lines while measuring the next ones
+            if self.reducers:
+                reductions = Reductions(self.data, self.reducers,
+                                        self.processes, start)
+            last_checkpoint = time.time()
+            rules = self.rules()
+            keys = list(self.measure.keys())
+            # Collect data
+            calls = iter(self)
+            # Skip the points measured before a checkpoint, including all
+            # callables up to the last measured point
+            if start:
+                for call in calls:
+                    if isinstance(call, Measure) and self._index == start - 1:
+                        break
+                # Stop or skip as the interrupted run did after that point
+                if state.get("jump") is not None:
+                    position, action = state["jump"]
+                    self._jump = self._fired = (self.sweeps[position], action)
+            for call in calls:
+                if isinstance(call, Measure):
+                    # Points skipped by a jump are left unmeasured
+                    self.data.index = self._index
+                    # Get the data from the callable
+                    values = call()
+                    writer.put(self.data.append(values), values)
+                    if reductions is not None:
+                        reductions.update(self._index)
+                    self._fired = None
+                    if rules:
+                        point = dict(zip(keys, values))
+                        for sweep, action, predicate in rules:
+                            if predicate(point):
+                                self._jump = self._fired = (sweep, action)
+                                break
+                    if publisher is not None:
+                        publisher.update()
+                    if self.changes is not None:
+                        self.changes.record(self._index)
+                    if (self.checkpoint_path is not None and time.time() -
+                            last_checkpoint >= self.checkpoint_interval):
+                        self.checkpoint()
+                        last_checkpoint = time.time()
+                else:
+                    call()
+        except BaseException:
+            if reductions is not None:
+                reductions.cancel()
+                reductions = None
+            raise
+        finally:
+            # Flush even on errors or KeyboardInterrupt
+            self._close(writer, reductions, publisher, recorder)
         # Save
         self.save()
 
+    def _close(self, writer, reductions=None, publisher=None, recorder=None):
+        """Release what run opened and save the last checkpoint.
+
+        Every step runs even if an earlier one fails, so a failed write
+        still frees the shared memory and detaches the Recorder and
+        ChangeLog. The error of the writer is raised after all of them;
+        other errors are logged, and the first one raised if the writer
+        succeeded.
+        """
+        steps = []
+        if reductions is not None:
+            steps.append(reductions.close)
+        if writer is not None:
+            steps.append(writer.close)
+        if publisher is not None:
+            steps.append(publisher.close)
+        if recorder is not None:
+            steps.append(recorder.close)
+        if self.changes is not None:
+            steps.append(self.changes.close)
+        if self.checkpoint_path is not None:
+            steps.append(self.checkpoint)
+        error = None
+        for step in steps:
+            try:
+                step()
+            except Exception as err:
+                if writer is not None and step == writer.close:
+                    error = err
+                else:
+                    log.exception("%s failed while closing %s", step, self)
+                    if error is None:
+                        error = err
+        if error is not None:
+            raise error
+
+    def _add_derived(self):
+        """Add a DataArray to the DataSet for each Reducer."""
+        for name, reducer in self.reducers.items():
+            self.data.add_derived(name, reducer.outer_shape(self.shape),
+                                  reducer.units, reducer.dtype, reducer.shape)
+
     def save(self):
-        pass
+        """Register the data of the run in the catalog, if one is set."""
+        if self.catalog is not None and self.parent is None:
+            with Catalog(self.catalog) as catalog:
+                catalog.add(self.data)
+
+    def describe(self):
+        """Add what the run is and the starting Setup to the metadata.
+
+        Written to the file so the catalog can be rebuilt from it.
+        """
+        metadata = self.data.metadata
+        metadata["measurement"] = self.__class__.__name__
+        metadata["timestamp"] = self.data.timestamp.isoformat()
+        if self.changes is not None:
+            metadata["setup"] = json.dumps(
+                dict(zip(self.changes.names, self.changes.current)),
+                default=lambda val: np.asarray(val).tolist())
+
+    def checkpoint(self):
+        """Save the progress of run to checkpoint_path.
+
+        The checkpoint holds the number of measured points, the last
+        commanded value of each swept Param, the stop or skip of a predicate
+        that fired at the last point and, for a DataSet kept in memory, a
+        copy of the data. A DataSet written to file is flushed instead and
+        read back on resume. The checkpoint is written to a temporary file
+        first so a crash while writing leaves the previous one intact.
+        """
+        if self.data.extension:
+            if self._writer is not None:
+                self._writer.flush()
+            state = {"index": self.data.index}
+        else:
+            state = self._state(self.data)
+        state["filename"] = self.data.filename
+        state["setpoints"] = self.setpoints()
+        # Position of the Sweep in self.sweeps and "stop" or "skip"
+        state["jump"] = None
+        if self._fired is not None:
+            sweep, action = self._fired
+            state["jump"] = (self.sweeps.index(sweep), action)
+        tmp = self.checkpoint_path + ".tmp"
+        with open(tmp, "wb") as f:
+            pickle.dump(state, f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self.checkpoint_path)
+
+    @classmethod
+    def _state(cls, data):
+        """Return a copy of the contents of a DataSet and its children.
+
+        The DataSets of nested Measurements are saved too, since a DataSet
+        in memory has no other copy of them.
+        """
+        return {
+            "index": data.index,
+            "data": {
+                key: np.array(array)
+                for key, array in data.arrays().items()
+            },
+            "lookup": {
+                key: np.array(lookup)
+                for key, lookup in data.lookup.items()
+            },
+            "sampled": np.array(data.sampled),
+            "children": {
+                key: [None if child is None else cls._state(child)
+                      for child in getattr(data, key)]
+                for key in data.lookup
+            }
+        }
+
+    def _restore(self, state):
+        """Fill self.data and the DataSets of nested Measurements from a
+        checkpoint."""
+        if "data" not in state:
+            self.data.reload(state["index"])
+            return
+        self.data.restore(state["data"], state["index"], state["lookup"],
+                          state.get("sampled"))
+        for key, children in state.get("children", {}).items():
+            nested = self.measure[key]
+            restored = []
+            for number, child in enumerate(children):
+                if child is not None:
+                    nested.data = self.data._new_child(
+                        key, number, nested.measure, nested.shape)
+                    nested._add_derived()
+                    nested._restore(child)
+                    child = nested.data
+                restored.append(child)
+            setattr(self.data, key, restored)
+
+    def rules(self):
+        """Return the stop/skip predicates of the Sweeps, outermost first.
+
+        Returns:
+            list: (Sweep, "stop" or "skip", predicate) tuples
+        """
+        rules = []
+        for sweep in self.sweeps:
+            if sweep.stop is not None:
+                rules.append((sweep, "stop", sweep.stop))
+            if sweep.skip is not None:
+                rules.append((sweep, "skip", sweep.skip))
+        return rules
+
+    def coords(self):
+        """Return the setpoints of each sweep keyed by the swept Param."""
+        return OrderedDict((sweep.inst.name + "_" + sweep.attr,
+                            np.asarray(sweep.vals)) for sweep in self.sweeps)
+
+    def setpoints(self):
+        """Return the current value of each swept Param keyed by sweep."""
+        return [getattr(sweep.inst, sweep.attr) for sweep in self.sweeps]
+
+    def resume(self, path):
+        """Continue an interrupted run from its checkpoint.
+
+        The Measurement must be defined the same way as the one that was
+        interrupted. The swept Params are first set (and so ramped, within
+        their limits) back to their last commanded values, then the run
+        continues at the first point that was not measured.
+
+        Args:
+            path (str): checkpoint file written by the interrupted run
+        """
+        with open(path, "rb") as f:
+            state = pickle.load(f)
+        for sweep, value in zip(self.sweeps, state["setpoints"]):
+            log.info("ramping %s.%s back to %s", sweep.inst.name, sweep.attr,
+                     value)
+            setattr(sweep.inst, sweep.attr, value)
+        self.checkpoint_path = path
+        self.run(state)
 
     def duplicate(self):
         pass
@@ -120,20 +461,52 @@ class Measurement(object):
 class MeasureTime(Measurement):
     """Record a set of parameters periodically over a period of time.
 
-    Possible that this is not needed at all"""
+    Long or open-ended series can be recorded in constant memory by giving
+    a buffer size: only the most recent points are kept in memory and the
+    rest are streamed to file (see RingDataSet).
+    """
 
-    def __init__(self, period, time, measure):
+    def __init__(self, period, time, measure, setup=None, buffer=None,
+                 chunk=1024):
         """
+        Args:
+            period (float): time (s) to wait between points
+            time (float): total duration (s) of the measurement. None to
+                run until interrupted.
+            measure (Measure): what is recorded at each point
+            setup (Setup): If given, changes to the Setup are recorded.
+            buffer (int): number of points kept in memory. If given, the
+                data is stored in a RingDataSet.
+            chunk (int): number of points written to file at once when
+                buffer is given.
+
+        Raises:
+            ValueError: if time is None and no buffer is given.
         """
+        super(MeasureTime, self).__init__([], measure, setup)
         self.period = period
-        self.measure = measure
         self.time = time
+        self.num = None if time is None else int(time / period)
+        if buffer is None:
+            if self.num is None:
+                raise ValueError(
+                    "An open-ended MeasureTime needs a buffer size.")
+            self.shape = (self.num, )
+        else:
+            self.shape = (buffer, )
+            self.data_class = RingDataSet
+            self.data_options = {"chunk": chunk}
 
-    def setup(self):
-        """Generate a list of callables to execute the measurement."""
-        num = int(self.time / self.period)
-        self.shape = num
-        self.callables = []
-        for i in range(num):
-            self.callables.append(measure)
-            self.callables.append(Wait(self.period))
+    def coords(self):
+        """Return the nominal time of each point, unless streaming."""
+        if self.num is None or self.data_class is RingDataSet:
+            return OrderedDict()
+        return OrderedDict([("time", self.period * np.arange(self.num))])
+
+    def __iter__(self):
+        wait = Wait(self.period)
+        points = itertools.count() if self.num is None else range(self.num)
+        for i in points:
+            self._index = i
+            yield self.measure
+            yield wait
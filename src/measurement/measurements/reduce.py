@@ -0,0 +1,189 @@
+"""Analyse the points of a Measurement while it runs.
+
+A Reducer is a function applied to each finished block of points: a single
+point, a line of the innermost Sweep, a plane of the two innermost Sweeps,
+and so on. Examples are the FFT of a spectrum, a fit to an IV curve or a
+demodulation. Each result goes into a derived DataArray of the same DataSet.
+
+Blocks are sent to a pool of worker processes as soon as the Measurement
+moves past them, so analysis overlaps with acquisition and the results are
+ready when the scan ends:
+
+    meas.reducers["resistance"] = Reducer(fit_slope, ["current"], axes=1)
+"""
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import numpy as np
+from measurement.util.dataset import is_fill
+
+import logging
+log = logging.getLogger(__name__)
+
+
+def _pool(processes):
+    """Return a pool of worker processes that do not fork the caller.
+
+    A Measurement runs other threads (the Writer, instrument clients), and
+    a forked worker could inherit a lock one of them holds. Workers are
+    started by a forkserver, or spawned where there is none. Before python
+    3.7 the pool can only use the default start method.
+    """
+    methods = multiprocessing.get_all_start_methods()
+    context = multiprocessing.get_context(
+        "forkserver" if "forkserver" in methods else "spawn")
+    try:
+        return ProcessPoolExecutor(processes, mp_context=context)
+    except TypeError:
+        return ProcessPoolExecutor(processes)
+
+
+class Reducer(object):
+    """A function of the finished blocks of points of a Measurement."""
+
+    def __init__(self,
+                 func,
+                 inputs,
+                 axes=0,
+                 units=None,
+                 dtype=None,
+                 shape=()):
+        """
+        Args:
+            func (callable): called with one array per input holding the
+                block of points, returns the derived value. Runs in another
+                process, so it must be picklable, e.g. a function defined at
+                module level.
+            inputs (list): keys of the Measure whose data func gets
+            axes (int): number of inner Sweeps a block spans. 0 reduces each
+                point, 1 each line of the innermost Sweep, and so on.
+            units (str): units of the derived DataArray
+            dtype (numpy.dtype): type of the derived values. Defaults to
+                float.
+            shape (tuple): shape of the value derived from each block, e.g.
+                (n, ) for the spectrum of a trace
+        """
+        self.func = func
+        self.inputs = list(inputs)
+        self.axes = axes
+        self.units = units
+        self.dtype = dtype
+        self.shape = tuple(shape)
+
+    def __str__(self):
+        return "<{}: {} of {} over {} axes>".format(
+            self.__class__.__name__, getattr(self.func, "__name__", self.func),
+            self.inputs, self.axes)
+
+    def __repr__(self):
+        return str(self)
+
+    def outer_shape(self, shape):
+        """Return the sweep axes of a Measurement the Reducer keeps."""
+        return tuple(shape[:len(shape) - self.axes])
+
+
+class Reductions(object):
+    """Run the Reducers of a Measurement as its points are measured."""
+
+    def __init__(self, data, reducers, processes=None, start=0):
+        """
+        Args:
+            data (DataSet): DataSet with the derived DataArrays, see
+                DataSet.add_derived
+            reducers (dict): Reducers keyed by derived DataArray
+            processes (int): number of worker processes. One per CPU if
+                None; 0 runs the Reducers in the calling thread.
+            start (int): flat index of the first point to be measured.
+                Finished blocks before it without a result are reduced
+                again, e.g. when a run is resumed.
+        """
+        self.data = data
+        self.reducers = reducers
+        self.pool = None if processes == 0 else _pool(processes)
+        # (name, point, Future) of the blocks being reduced
+        self.pending = []
+        # Points per block and the block being measured, by Reducer
+        self.sizes = {}
+        self.blocks = {}
+        for name, reducer in reducers.items():
+            size = int(np.prod(data.shape[len(data.shape) - reducer.axes:]))
+            self.sizes[name] = size
+            self.blocks[name] = start // size
+            derived = getattr(data, name)
+            outer = reducer.outer_shape(data.shape)
+            for block in range(start // size):
+                if np.all(is_fill(derived[np.unravel_index(block, outer)])):
+                    self.submit(name, block)
+
+    def __str__(self):
+        return "<{}: {} ({} pending)>".format(self.__class__.__name__,
+                                              list(self.reducers),
+                                              len(self.pending))
+
+    def __repr__(self):
+        return str(self)
+
+    def update(self, index):
+        """Reduce the blocks finished before the point at index.
+
+        Called after each point. Results that are ready are stored.
+        """
+        for name, size in self.sizes.items():
+            block = index // size
+            if block != self.blocks[name]:
+                self.submit(name, self.blocks[name])
+                self.blocks[name] = block
+        if self.pending:
+            self.collect()
+
+    def submit(self, name, block):
+        """Start reducing a block unless none of its points were measured."""
+        reducer = self.reducers[name]
+        point = np.unravel_index(block, reducer.outer_shape(self.data.shape))
+        if not self.data.sampled[point].any():
+            return
+        # Copy the block so later points are not sent to the worker
+        args = [np.array(getattr(self.data, key)[point])
+                for key in reducer.inputs]
+        if self.pool is None:
+            try:
+                self.store(name, point, reducer.func(*args))
+            except Exception:
+                log.exception("reducing %s at %s failed", name, point)
+        else:
+            self.pending.append(
+                (name, point, self.pool.submit(reducer.func, *args)))
+
+    def collect(self, wait=False):
+        """Store the results that are ready, or all of them if wait."""
+        pending = []
+        for name, point, future in self.pending:
+            if not (wait or future.done()):
+                pending.append((name, point, future))
+                continue
+            try:
+                self.store(name, point, future.result())
+            except Exception:
+                log.exception("reducing %s at %s failed", name, point)
+        self.pending = pending
+
+    def store(self, name, point, value):
+        # Look the array up each time: a Publisher may have replaced it
+        getattr(self.data, name)[point] = value
+
+    def close(self):
+        """Reduce the last blocks and wait for all results."""
+        for name in self.reducers:
+            self.submit(name, self.blocks[name])
+        self.collect(wait=True)
+        if self.pool is not None:
+            self.pool.shutdown()
+
+    def cancel(self):
+        """Drop the blocks that are not reduced yet, e.g. on an error."""
+        for _, _, future in self.pending:
+            future.cancel()
+        self.pending = []
+        if self.pool is not None:
+            self.pool.shutdown(wait=False)
+            self.pool = None
@@ -0,0 +1,161 @@
+"""Run independent Measurements at the same time.
+
+A Scheduler works out which instrument Params each Measurement sets and
+reads from its Sweeps and Measure. Measurements that set a Param another
+Measurement sets or reads cannot run together. Otherwise each Measurement
+runs in its own thread and only access to instruments that are shared
+(the same instrument, or instruments on the same bus) is serialized.
+
+Threads are used rather than processes because the Measurements share the
+Instrument objects of a single Setup.
+"""
+import os
+import threading
+from typing import Sequence
+from measurement.measurements.callables import Setter, Getter, Measure
+from measurement.measurements.measurement import Measurement
+
+import logging
+log = logging.getLogger(__name__)
+
+
+class Scheduler(object):
+    """Run a set of Measurements concurrently."""
+
+    def __init__(self, measurements: Sequence[Measurement]) -> None:
+        """
+        Args:
+            measurements (list): Measurements to run together.
+
+        Raises:
+            ValueError: if two Measurements conflict over a Param.
+        """
+        self.measurements = list(measurements)
+        self.resources = [
+            Scheduler.get_resources(meas) for meas in self.measurements
+        ]
+        self.check()
+
+    def __str__(self):
+        return "<{}: {} measurements>".format(self.__class__.__name__,
+                                              len(self.measurements))
+
+    def __repr__(self):
+        return str(self)
+
+    def __call__(self):
+        self.run()
+
+    @staticmethod
+    def get_resources(meas):
+        """Return the Params set and read by a Measurement.
+
+        Returns:
+            tuple: (sets, gets), sets of (Instrument, attr) pairs
+        """
+        sets, gets = set(), set()
+        for sweep in meas.sweeps:
+            sets.add((sweep.inst, sweep.attr))
+            for call in (sweep.before, sweep.during, sweep.after):
+                Scheduler._add_resources(call, sets, gets)
+        Scheduler._add_resources(meas.measure, sets, gets)
+        return sets, gets
+
+    @staticmethod
+    def _add_resources(call, sets, gets):
+        """Add the Params used by a callable (or list of them) to sets/gets."""
+        if isinstance(call, Setter):
+            sets.add((call.inst, call.attr))
+        elif isinstance(call, Getter):
+            gets.add((call.inst, call.attr))
+        elif isinstance(call, Measurement):
+            sub_sets, sub_gets = Scheduler.get_resources(call)
+            sets |= sub_sets
+            gets |= sub_gets
+        elif isinstance(call, Measure):
+            for sub_call in call.values():
+                Scheduler._add_resources(sub_call, sets, gets)
+        elif isinstance(call, (list, tuple)):
+            for sub_call in call:
+                Scheduler._add_resources(sub_call, sets, gets)
+
+    def check(self):
+        """Raise a ValueError if two Measurements conflict.
+
+        Measurements conflict if one sets a Param the other sets or reads,
+        or if they write to the same file. Reading the same Param from
+        several Measurements is allowed.
+        """
+        filenames = {}
+        for meas in self.measurements:
+            filename = meas.data_options.get("filename")
+            if filename is None:
+                # Default filenames are unique, see default_filename
+                continue
+            filename = os.path.abspath(filename)
+            if filename in filenames:
+                raise ValueError("{} and {} both write to {}.".format(
+                    filenames[filename], meas, filename))
+            filenames[filename] = meas
+        for i, (sets, gets) in enumerate(self.resources):
+            for j in range(i + 1, len(self.resources)):
+                other_sets, other_gets = self.resources[j]
+                shared = (sets & (other_sets | other_gets)) | (
+                    gets & other_sets)
+                if shared:
+                    raise ValueError("{} and {} both use {}.".format(
+                        self.measurements[i], self.measurements[j],
+                        sorted("{}.{}".format(inst.name, attr)
+                               for inst, attr in shared)))
+
+    def shared_buses(self):
+        """Return the instruments that need a lock, grouped by bus.
+
+        Instruments without a bus are their own bus. Only buses used by more
+        than one Measurement are returned.
+        """
+        users = {}
+        insts = {}
+        for i, (sets, gets) in enumerate(self.resources):
+            for inst, _ in sets | gets:
+                bus = inst if inst.bus is None else inst.bus
+                users.setdefault(bus, set()).add(i)
+                insts.setdefault(bus, set()).add(inst)
+        return [insts[bus] for bus in users if len(users[bus]) > 1]
+
+    def run(self):
+        """Run all the Measurements and wait for them to finish.
+
+        The first exception raised by a Measurement is raised again once all
+        threads are done.
+        """
+        locked = []
+        for bus in self.shared_buses():
+            lock = threading.RLock()
+            for inst in bus:
+                inst._lock = lock
+                locked.append(inst)
+        errors = []
+
+        def target(meas):
+            try:
+                meas.run()
+            except BaseException as err:
+                log.exception("%s failed", meas)
+                errors.append(err)
+
+        threads = [
+            threading.Thread(target=target, args=(meas, ), name=str(meas))
+            for meas in self.measurements
+        ]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        finally:
+            for inst in locked:
+                # Fall back to the class default of None
+                inst.__dict__.pop("_lock", None)
+        if errors:
+            raise errors[0]
@@ -0,0 +1,253 @@
+"""Describe the setpoints of a Sweep without storing them.
+
+A fine sweep can have millions of points. Setpoints compute each value from
+its index when it is needed, so a Sweep takes the same memory whatever its
+length. Joining, reversing or looping Setpoints makes a view of the
+original points rather than a copy.
+
+Setpoints behave like read-only sequences (len, indexing, iteration) and
+convert to numpy arrays with np.asarray when all values are needed at once.
+"""
+import bisect
+import itertools
+import numpy as np
+
+
+class Setpoints(object):
+    """A lazily computed sequence of setpoints."""
+    __slots__ = []
+
+    def __len__(self):
+        raise NotImplementedError
+
+    def _get(self, i):
+        """Return the value at index 0 <= i < len(self)."""
+        raise NotImplementedError
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return Sliced(self, range(len(self))[i])
+        num = len(self)
+        if i < 0:
+            i += num
+        if not 0 <= i < num:
+            raise IndexError("{} has no point {}.".format(self, i))
+        return self._get(i)
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self._get(i)
+
+    def __reversed__(self):
+        return Reversed(self)
+
+    def __add__(self, other):
+        return Concat(self, other)
+
+    def __radd__(self, other):
+        return Concat(other, self)
+
+    def __array__(self, dtype=None, copy=None):
+        if len(self) and np.ndim(self._get(0)) == 0:
+            return np.fromiter(self, dtype or float, len(self))
+        return np.array(list(self), dtype=dtype)
+
+    def __str__(self):
+        return "<{}: {} points>".format(self.__class__.__name__, len(self))
+
+    def __repr__(self):
+        return str(self)
+
+
+class Linspace(Setpoints):
+    """num evenly spaced points from start to stop, both included."""
+    __slots__ = ["start", "stop", "num"]
+
+    def __init__(self, start, stop, num):
+        """
+        Args:
+            start (float or array): first setpoint. Arrays give a vector
+                setpoint for a ParamArray.
+            stop (float or array): last setpoint
+            num (int): number of points
+        """
+        self.start = start
+        self.stop = stop
+        self.num = num
+
+    def __len__(self):
+        return self.num
+
+    def _get(self, i):
+        # A single point is start, as in np.linspace
+        if i == 0:
+            return self.start
+        if i == self.num - 1:
+            return self.stop
+        return self.start + (self.stop - self.start) * (i / (self.num - 1))
+
+    def __array__(self, dtype=None, copy=None):
+        return np.linspace(self.start, self.stop, self.num, dtype=dtype)
+
+
+class Logspace(Setpoints):
+    """num points from start to stop, evenly spaced on a log scale."""
+    __slots__ = ["start", "stop", "num"]
+
+    def __init__(self, start, stop, num):
+        """
+        Args:
+            start (float): first setpoint, not 0
+            stop (float): last setpoint, with the same sign as start
+            num (int): number of points
+        """
+        self.start = start
+        self.stop = stop
+        self.num = num
+
+    def __len__(self):
+        return self.num
+
+    def _get(self, i):
+        if i == 0:
+            return self.start
+        if i == self.num - 1:
+            return self.stop
+        return self.start * (self.stop / self.start)**(i / (self.num - 1))
+
+    def __array__(self, dtype=None, copy=None):
+        return np.geomspace(self.start, self.stop, self.num, dtype=dtype)
+
+
+class Function(Setpoints):
+    """num points computed from their index by a function."""
+    __slots__ = ["func", "num"]
+
+    def __init__(self, func, num):
+        """
+        Args:
+            func (callable): returns the setpoint at an index
+            num (int): number of points
+        """
+        self.func = func
+        self.num = num
+
+    def __len__(self):
+        return self.num
+
+    def _get(self, i):
+        return self.func(i)
+
+
+class Generated(Setpoints):
+    """num points produced in order by a generator.
+
+    Iterating is O(1) per point. Indexing runs the generator up to the
+    point, so prefer Function when points are needed out of order.
+    """
+    __slots__ = ["factory", "num"]
+
+    def __init__(self, factory, num):
+        """
+        Args:
+            factory (callable): returns a new iterator over the setpoints
+            num (int): number of points
+        """
+        self.factory = factory
+        self.num = num
+
+    def __len__(self):
+        return self.num
+
+    def _get(self, i):
+        return next(itertools.islice(self.factory(), i, None))
+
+    def __iter__(self):
+        return itertools.islice(self.factory(), self.num)
+
+
+class Concat(Setpoints):
+    """The points of several sequences one after the other."""
+    __slots__ = ["parts", "ends"]
+
+    def __init__(self, *parts):
+        """
+        Args:
+            parts: Setpoints, arrays or lists
+        """
+        self.parts = []
+        for part in parts:
+            # Flatten so lookups stay a single bisect
+            if isinstance(part, Concat):
+                self.parts.extend(part.parts)
+            else:
+                self.parts.append(part)
+        self.ends = list(itertools.accumulate(len(part)
+                                              for part in self.parts))
+
+    def __len__(self):
+        return self.ends[-1] if self.ends else 0
+
+    def _get(self, i):
+        j = bisect.bisect_right(self.ends, i)
+        start = self.ends[j - 1] if j else 0
+        return self.parts[j][i - start]
+
+    def __iter__(self):
+        return itertools.chain.from_iterable(self.parts)
+
+    def __array__(self, dtype=None, copy=None):
+        if not self.parts:
+            return np.empty(0, dtype=dtype)
+        return np.concatenate([np.asarray(part, dtype=dtype)
+                               for part in self.parts])
+
+
+class Reversed(Setpoints):
+    """The points of a sequence in reverse order."""
+    __slots__ = ["base"]
+
+    def __init__(self, base):
+        self.base = base
+
+    def __len__(self):
+        return len(self.base)
+
+    def _get(self, i):
+        return self.base[len(self.base) - 1 - i]
+
+    def __reversed__(self):
+        if isinstance(self.base, Setpoints):
+            return self.base
+        return super(Reversed, self).__reversed__()
+
+    def __array__(self, dtype=None, copy=None):
+        return np.asarray(self.base, dtype=dtype)[::-1]
+
+
+class Sliced(Setpoints):
+    """The points of a sequence at a range of indices."""
+    __slots__ = ["base", "indices"]
+
+    def __init__(self, base, indices):
+        """
+        Args:
+            base: Setpoints, array or list
+            indices (range): indices of the points in base
+        """
+        self.base = base
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def _get(self, i):
+        return self.base[self.indices[i]]
+
+
+def loop(points):
+    """Return the points followed by the same points in reverse.
+
+    The turning point is not repeated, e.g. for a hysteresis loop.
+    """
+    return Concat(points, Sliced(Reversed(points), range(1, len(points))))
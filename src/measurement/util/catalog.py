@@ -0,0 +1,337 @@
+"""Keep a searchable catalog of saved measurements in a SQLite database.
+
+Every saved DataSet gets one row in the runs table. What was swept (and over
+which range), what was recorded and the value of each Param of the Setup
+when the run started go in indexed side tables, so questions like "all runs
+recording lockin_x with fridge.temperature between 1.4 and 1.6" are answered
+from the indexes without opening any data file.
+
+The catalog only holds what is also in the files, so it can be rebuilt from
+a data folder:
+
+    python -m measurement.util.catalog rebuild DATA_DIR [--catalog FILE]
+"""
+import argparse
+import json
+import os
+import sqlite3
+from datetime import datetime
+import numpy as np
+
+import logging
+log = logging.getLogger(__name__)
+
+# Default catalog file, in the folder measurements are saved to
+FILENAME = "catalog.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    filename TEXT UNIQUE,
+    timestamp TEXT,
+    measurement TEXT,
+    git_hash TEXT,
+    shape TEXT
+);
+CREATE TABLE IF NOT EXISTS sweeps (
+    run INTEGER REFERENCES runs(id) ON DELETE CASCADE,
+    name TEXT,
+    start REAL,
+    stop REAL,
+    minimum REAL,
+    maximum REAL,
+    num INTEGER
+);
+CREATE TABLE IF NOT EXISTS getters (
+    run INTEGER REFERENCES runs(id) ON DELETE CASCADE,
+    name TEXT,
+    units TEXT
+);
+CREATE TABLE IF NOT EXISTS setup (
+    run INTEGER REFERENCES runs(id) ON DELETE CASCADE,
+    name TEXT,
+    value
+);
+CREATE INDEX IF NOT EXISTS runs_timestamp ON runs (timestamp);
+CREATE INDEX IF NOT EXISTS runs_measurement ON runs (measurement);
+CREATE INDEX IF NOT EXISTS sweeps_name ON sweeps (name, minimum, maximum);
+CREATE INDEX IF NOT EXISTS sweeps_run ON sweeps (run, name, minimum, maximum);
+CREATE INDEX IF NOT EXISTS getters_name ON getters (name, run);
+CREATE INDEX IF NOT EXISTS getters_run ON getters (run, name);
+CREATE INDEX IF NOT EXISTS setup_name ON setup (name, value, run);
+CREATE INDEX IF NOT EXISTS setup_run ON setup (run, name, value);
+"""
+
+
+def entry(data_set):
+    """Describe a DataSet for the catalog.
+
+    Returns:
+        dict: with the keys filename, timestamp, measurement, git_hash,
+            shape, sweeps ({name: values}), getters ({name: units}) and
+            setup ({"instrument.param": value}).
+    """
+    metadata = data_set.metadata or {}
+    return {
+        "filename": os.path.abspath(data_set.filename),
+        "timestamp": metadata.get("timestamp",
+                                  data_set.timestamp.isoformat()),
+        "measurement": metadata.get("measurement"),
+        "git_hash": metadata.get("git_hash"),
+        "shape": list(data_set.shape),
+        "sweeps": dict(data_set.coords),
+        "getters": {
+            key: array.units
+            for key, array in data_set.arrays().items()
+        },
+        "setup": _setup_values(metadata.get("setup"))
+    }
+
+
+def read_entry(filename):
+    """Describe a .h5 file written by an Hdf5DataSet without reading data."""
+    import h5py
+    with h5py.File(filename, "r") as f:
+        attrs = dict(f.attrs)
+        sweeps = {}
+        if "_coords" in f:
+            for key in f["_coords"].attrs["names"]:
+                sweeps[key] = f["_coords"][key][...]
+        getters = {
+            key: val.attrs.get("units")
+            for key, val in f.items()
+            if isinstance(val, h5py.Dataset) and not key.startswith("_")
+        }
+    timestamp = attrs.get("timestamp")
+    if timestamp is None:
+        timestamp = datetime.fromtimestamp(
+            os.path.getmtime(filename)).isoformat()
+    return {
+        "filename": os.path.abspath(filename),
+        "timestamp": timestamp,
+        "measurement": attrs.get("measurement"),
+        "git_hash": attrs.get("git_hash"),
+        "shape": [int(n) for n in attrs.get("shape", ())],
+        "sweeps": sweeps,
+        "getters": getters,
+        "setup": _setup_values(attrs.get("setup"))
+    }
+
+
+def _setup_values(setup):
+    """Return the scalar Setup values from the JSON stored in metadata."""
+    if not isinstance(setup, str):
+        return {}
+    try:
+        values = json.loads(setup)
+    except ValueError:
+        return {}
+    return {
+        key: val
+        for key, val in values.items()
+        if isinstance(val, (int, float, str)) and not isinstance(val, bool)
+    }
+
+
+class Catalog(object):
+    """A SQLite index of saved measurements."""
+
+    def __init__(self, filename=FILENAME, keys=None):
+        """
+        Args:
+            filename (str): SQLite database file, created if needed
+            keys (list): "instrument.param" names of the Setup values to
+                index. All scalar values if None.
+        """
+        self.filename = filename
+        self.keys = None if keys is None else set(keys)
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute("PRAGMA foreign_keys = ON")
+        self.connection.executescript(SCHEMA)
+
+    def __str__(self):
+        return "<{}: {} ({} runs)>".format(self.__class__.__name__,
+                                           self.filename, len(self))
+
+    def __repr__(self):
+        return str(self)
+
+    def __len__(self):
+        return self.connection.execute(
+            "SELECT COUNT(*) FROM runs").fetchone()[0]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, data_set):
+        """Add a saved DataSet, replacing an earlier entry for its file."""
+        self.add_entry(entry(data_set))
+
+    def add_entry(self, info):
+        """Add a run described as returned by entry/read_entry."""
+        with self.connection:
+            return self._insert(info)
+
+    def _insert(self, info):
+        """Insert a run without committing."""
+        self.connection.execute("DELETE FROM runs WHERE filename = ?",
+                                (info["filename"], ))
+        run = self.connection.execute(
+            "INSERT INTO runs (filename, timestamp, measurement, "
+            "git_hash, shape) VALUES (?, ?, ?, ?, ?)",
+            (info["filename"], info["timestamp"], info["measurement"],
+             info["git_hash"], json.dumps(info["shape"]))).lastrowid
+        sweeps = []
+        for key, values in info["sweeps"].items():
+            values = np.asarray(values, dtype=float)
+            if values.ndim != 1 or values.size == 0:
+                # Vector setpoints of a ParamArray have no single range
+                sweeps.append((run, key, None, None, None, None,
+                               len(values)))
+                continue
+            sweeps.append((run, key, float(values[0]), float(values[-1]),
+                           float(np.nanmin(values)),
+                           float(np.nanmax(values)), len(values)))
+        self.connection.executemany(
+            "INSERT INTO sweeps VALUES (?, ?, ?, ?, ?, ?, ?)", sweeps)
+        self.connection.executemany(
+            "INSERT INTO getters VALUES (?, ?, ?)",
+            [(run, key, units) for key, units in info["getters"].items()])
+        self.connection.executemany(
+            "INSERT INTO setup VALUES (?, ?, ?)",
+            [(run, key, val) for key, val in info["setup"].items()
+             if self.keys is None or key in self.keys])
+        return run
+
+    def find(self,
+             measurement=None,
+             sweeps=None,
+             getters=None,
+             setup=None,
+             after=None,
+             before=None):
+        """Return the files of the runs matching every condition given.
+
+        Args:
+            measurement (str): name of the Measurement class
+            sweeps (list or dict): names of swept Params, or a dict of
+                name -> (low, high) to also require the sweep to cover
+                values in that range
+            getters (list): names of recorded DataArrays
+            setup (dict): "instrument.param" -> value, or (low, high) for
+                a range of values, at the start of the run
+            after (str or datetime): earliest timestamp
+            before (str or datetime): latest timestamp
+
+        Returns:
+            list: filenames, oldest first
+        """
+        # (table, condition, args) on the side tables, most selective first
+        conditions = []
+        for key, value in (setup or {}).items():
+            if isinstance(value, (tuple, list)):
+                conditions.append(
+                    ("setup", "name = ? AND value BETWEEN ? AND ?",
+                     [key, value[0], value[1]]))
+            else:
+                conditions.append(("setup", "name = ? AND value = ?",
+                                   [key, value]))
+        if sweeps is not None:
+            if not isinstance(sweeps, dict):
+                sweeps = dict.fromkeys(sweeps)
+            for key, limits in sweeps.items():
+                if limits is None:
+                    conditions.append(("sweeps", "name = ?", [key]))
+                else:
+                    conditions.append(
+                        ("sweeps", "name = ? AND maximum >= ? AND minimum <= ?",
+                         [key, limits[0], limits[1]]))
+        for key in getters or []:
+            conditions.append(("getters", "name = ?", [key]))
+        where = []
+        args = []
+        if conditions:
+            # Walk the index of one condition and probe the others per run
+            table, condition, args = conditions.pop(0)
+            query = ("SELECT filename FROM {} JOIN runs ON runs.id = run"
+                     .format(table))
+            where.append(condition)
+        else:
+            query = "SELECT filename FROM runs"
+        for table, condition, values in conditions:
+            where.append("EXISTS (SELECT 1 FROM {} AS e WHERE e.run = runs.id "
+                         "AND {})".format(table, condition))
+            args.extend(values)
+        if measurement is not None:
+            where.append("measurement = ?")
+            args.append(measurement)
+        if after is not None:
+            where.append("timestamp >= ?")
+            args.append(_timestamp(after))
+        if before is not None:
+            where.append("timestamp <= ?")
+            args.append(_timestamp(before))
+        if where:
+            query += " WHERE " + " AND ".join(where)
+        query += " ORDER BY timestamp"
+        return [row[0] for row in self.connection.execute(query, args)]
+
+    def rebuild(self, directory):
+        """Replace the catalog with the .h5 files found under directory.
+
+        Returns:
+            int: number of runs added
+        """
+        count = 0
+        with self.connection:
+            self.connection.execute("DELETE FROM runs")
+            for root, _, files in os.walk(directory):
+                for name in sorted(files):
+                    if not name.endswith(".h5"):
+                        continue
+                    filename = os.path.join(root, name)
+                    try:
+                        info = read_entry(filename)
+                    except (OSError, KeyError, ValueError):
+                        log.warning("skipping unreadable file %s", filename)
+                        continue
+                    self._insert(info)
+                    count += 1
+        # Let the query planner pick the most selective index
+        self.connection.execute("ANALYZE")
+        return count
+
+    def close(self):
+        self.connection.close()
+
+
+def _timestamp(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description="Manage the catalog of saved measurements.")
+    commands = parser.add_subparsers(dest="command")
+    # Not a keyword of add_subparsers before python 3.7
+    commands.required = True
+    rebuild = commands.add_parser(
+        "rebuild", help="rebuild the catalog from the files in a folder")
+    rebuild.add_argument("directory", help="folder with the data files")
+    rebuild.add_argument("--catalog", help="catalog file. Defaults to {} "
+                         "in the folder".format(FILENAME))
+    args = parser.parse_args(args)
+    if args.command == "rebuild":
+        filename = args.catalog or os.path.join(args.directory, FILENAME)
+        with Catalog(filename) as catalog:
+            count = catalog.rebuild(args.directory)
+        print("Added {} runs to {}".format(count, filename))
+
+
+if __name__ == "__main__":
+    main()
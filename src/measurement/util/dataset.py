@@ -5,13 +5,240 @@ subclass np.array with DataSet that contains info about units. Data can
 can be collected in np.arrays in cast to DataSet with the np.array view
 feature. DataSets can also be directly instantiated during collection.
 """
+from collections import OrderedDict
+import copy
 from datetime import datetime
 import os
-from git import Repo
+import threading
 import numpy as np
 import measurement
-from measurement.measurements.callables import Getter
-from measurement.measurements.measurement import Measurement
+
+import logging
+log = logging.getLogger(__name__)
+
+# GitPython takes longer to import than the rest of the package. It is
+# imported the first time metadata is recorded.
+_repo = None
+
+# Default filenames handed out in this process. DataSets created in the same
+# second, e.g. by Measurements started together, must not share a file.
+_filenames = set()
+_filenames_lock = threading.Lock()
+
+
+def default_filename(timestamp, extension=""):
+    """Return YYYY-mm-dd_HHMMSS_measurement + extension, made unique.
+
+    A counter is appended if the name was already given out or the file
+    exists, e.g. YYYY-mm-dd_HHMMSS_measurement_2.h5.
+    """
+    base = timestamp.strftime("%Y-%m-%d_%H%M%S") + "_measurement"
+    with _filenames_lock:
+        filename = base + extension
+        count = 1
+        while filename in _filenames or os.path.exists(filename):
+            count += 1
+            filename = "{}_{}{}".format(base, count, extension)
+        _filenames.add(filename)
+    return filename
+
+
+def fill_value(dtype):
+    """Return the value marking points that were not measured.
+
+    Floats use nan. Integers and bools have no such value and use 0/False,
+    so DataSet.index must be used to tell which points were measured.
+    Structured dtypes (e.g. the mean/std/count of an AverageGetter) use the
+    fill value of each field.
+    """
+    dtype = np.dtype(dtype)
+    if dtype.names is not None:
+        value = np.zeros((), dtype)
+        for name in dtype.names:
+            value[name] = fill_value(dtype[name])
+        return value[()]
+    if dtype.kind in "fc":
+        return np.nan
+    return dtype.type(0)
+
+
+def is_fill(values):
+    """Return a mask of the values equal to the fill value of their dtype.
+
+    A structured value is a fill value if all of its fields are. Integers
+    and bools that are 0/False count as fill values even if measured.
+    """
+    values = np.asarray(values)
+    if values.dtype.names is not None:
+        mask = np.ones(values.shape, dtype=bool)
+        for name in values.dtype.names:
+            field = is_fill(values[name])
+            mask &= field.reshape(values.shape + (-1, )).all(axis=-1)
+        return mask
+    if values.dtype.kind in "fc":
+        return np.isnan(values)
+    return values == fill_value(values.dtype)
+
+
+def chunk_shape(shape, itemsize, size=2**16):
+    """Choose a chunk shape for storing an array measured point by point.
+
+    Points are measured along the last (innermost) axis first, so a chunk
+    holds whole lines of the inner sweep and then as many lines of the
+    outer sweeps as fit in about `size` bytes. A line cut along the inner
+    sweep then reads a single chunk.
+
+    Args:
+        shape (tuple): shape of the array
+        itemsize (int): bytes per value
+        size (int): target size of a chunk in bytes
+    """
+    chunk = [1] * len(shape)
+    total = itemsize
+    for axis in reversed(range(len(shape))):
+        chunk[axis] = max(1, min(shape[axis], size // total))
+        total *= chunk[axis]
+        if chunk[axis] < shape[axis]:
+            break
+    return tuple(chunk)
+
+
+def get_repo():
+    """Return the git Repo of the measurement package, opening it once."""
+    global _repo
+    if _repo is None:
+        from git import Repo
+        _repo = Repo(os.path.dirname(measurement.__file__),
+                     search_parent_directories=True)
+    return _repo
+
+
+class CoordIndex(object):
+    """Find positions along an axis from values of its coordinate.
+
+    The values are sorted the first time they are searched, so a lookup
+    is a binary search whether or not the sweep was monotonic.
+    """
+    __slots__ = ["name", "values", "order", "sorted"]
+
+    def __init__(self, name, values):
+        """
+        Args:
+            name (str): name of the coordinate
+            values (array): 1D array with the coordinate of each position
+        """
+        self.name = name
+        self.values = values
+        self.order = None
+        self.sorted = None
+
+    def __str__(self):
+        return "<{}: {} ({})>".format(self.__class__.__name__, self.name,
+                                      len(self.values))
+
+    def __repr__(self):
+        return str(self)
+
+    def _sort(self):
+        if self.values.ndim != 1:
+            raise ValueError("Can't select by {}: its values are not 1D."
+                             .format(self.name))
+        self.order = np.argsort(self.values, kind="mergesort")
+        self.sorted = self.values[self.order]
+
+    def position(self, value, method=None):
+        """Return the position of value.
+
+        Args:
+            value: coordinate to look up
+            method (str): None for an exact match or "nearest"
+
+        Raises:
+            KeyError: if there is no exact match.
+        """
+        if self.order is None:
+            self._sort()
+        i = int(np.searchsorted(self.sorted, value))
+        if method == "nearest":
+            if i == len(self.sorted) or (
+                    i > 0 and value - self.sorted[i - 1] <=
+                    self.sorted[i] - value):
+                i -= 1
+        elif method is not None:
+            raise ValueError("Unknown method {}.".format(method))
+        elif i == len(self.sorted) or self.sorted[i] != value:
+            raise KeyError("{} = {} not found.".format(self.name, value))
+        return int(self.order[i])
+
+    def positions(self, start=None, stop=None):
+        """Return the positions with start <= value <= stop.
+
+        Returns:
+            slice or array: a slice if the positions are contiguous, which
+                selects a view rather than a copy.
+        """
+        if self.order is None:
+            self._sort()
+        i = 0 if start is None else np.searchsorted(self.sorted, start)
+        j = (len(self.sorted) if stop is None else np.searchsorted(
+            self.sorted, stop, "right"))
+        found = np.sort(self.order[i:j])
+        if len(found) == 0:
+            return slice(0, 0)
+        if found[-1] - found[0] + 1 == len(found):
+            return slice(int(found[0]), int(found[-1]) + 1)
+        return found
+
+
+def select(coords, method, indexers):
+    """Turn coordinate values into an index along each axis.
+
+    Args:
+        coords (tuple): CoordIndex of each axis
+        method (str): None for exact matches or "nearest"
+        indexers (dict): coordinate name -> value or slice of values. Names
+            can be given in full (inst_attr) or as the Param name (attr).
+
+    Returns:
+        tuple: (index of each axis, CoordIndex of each axis left)
+    """
+    index = [slice(None)] * len(coords)
+    for key, value in indexers.items():
+        axes = [i for i, coord in enumerate(coords) if coord.name == key]
+        if not axes:
+            axes = [
+                i for i, coord in enumerate(coords)
+                if coord.name.endswith("_" + key)
+            ]
+        if len(axes) != 1:
+            raise KeyError("No single coordinate {} in {}.".format(
+                key, [coord.name for coord in coords]))
+        axis = axes[0]
+        if isinstance(value, slice):
+            index[axis] = coords[axis].positions(value.start, value.stop)
+        else:
+            index[axis] = coords[axis].position(value, method)
+    left = []
+    for coord, i in zip(coords, index):
+        if isinstance(i, slice) and i == slice(None):
+            left.append(coord)
+        elif not isinstance(i, int):
+            left.append(CoordIndex(coord.name, coord.values[i]))
+    return index, tuple(left)
+
+
+def take(array, index):
+    """Index array along each axis in turn.
+
+    Slices and positions give views. Arrays of positions are applied one
+    axis at a time so they select the outer product rather than pairs.
+    """
+    axis = 0
+    for i in index:
+        array = array[(slice(None), ) * axis + (i, )]
+        if not isinstance(i, int):
+            axis += 1
+    return array
 
 
 class DataSet(object):
@@ -22,13 +249,42 @@ class DataSet(object):
     Should DataSet be a namedtuple or ordered dict?
     """
 
-    def __init__(self, measure, shape):
+    # Extension of files written by the DataSet
+    extension = ""
+
+    def __init__(self, measure, shape, filename=None, metadata=None):
         """
+        Args:
+            measure (Measure): callables executed at each point
+            shape (tuple): shape of the parameter space of the Measurement
+            filename (str): file written by the DataSet. Defaults to
+                a unique YYYY-mm-dd_HHMMSS_measurement + extension, see
+                default_filename.
+            metadata (dict): metadata of the DataSet. Recorded from the git
+                repo if not given.
         """
         self.measure = measure
         self.shape = shape
+        # Flat index of the next point to append
+        self.index = 0
+        # Measure key -> array mapping each point to a child DataSet number
+        self.lookup = {}
+        # True at the points that were measured. Sweeps can stop or skip
+        # ahead, so this is not always the points before index.
+        self.sampled = None if shape is None else np.zeros(shape, dtype=bool)
+        # Name -> setpoints of the sweep along each axis, see set_coords
+        self.coords = OrderedDict()
+        # Name -> number of sweep axes of the DataArrays computed from the
+        # measured ones, which may span only the outer sweeps
+        self.derived = OrderedDict()
+        self._indexes = ()
         self._timestamp = datetime.now()
-        self.metadata = self.get_metadata()
+        if filename is None:
+            filename = default_filename(self._timestamp, self.extension)
+        self._filename = filename
+        if metadata is None:
+            metadata = self.get_metadata()
+        self.metadata = metadata
 
     def __str__(self):
         return "<{} {}>".format(self.__class__.__name__, self.filename)
@@ -48,10 +304,206 @@ class DataSet(object):
         else:
             setattr(self, data_array.name, data_array)
 
+    def add_derived(self, key, shape, units=None, dtype=None, trailing=()):
+        """Add an empty DataArray for values computed from measured ones.
+
+        Derived DataArrays are filled in as their inputs are measured, e.g.
+        by the Reducers of a Measurement, rather than by append.
+
+        Args:
+            key (str): name of the DataArray
+            shape (tuple): shape of the sweep axes spanned, the outer ones
+                of self.shape
+            units (str): units of the values
+            dtype (numpy.dtype): type of the values. Defaults to float.
+            trailing (tuple): shape of each value, e.g. (n, ) for a
+                spectrum
+        """
+        dtype = np.dtype(dtype or float)
+        self.add(
+            DataArray(
+                np.full(tuple(shape) + tuple(trailing), fill_value(dtype),
+                        dtype=dtype), key, units,
+                coords=self._indexes[:len(shape)] or None))
+        self.derived[key] = len(shape)
+
+    def arrays(self):
+        """Return a dict of the DataArrays in the DataSet."""
+        return {
+            key: val
+            for key, val in self.__dict__.items()
+            if isinstance(val, DataArray)
+        }
+
+    def set_coords(self, coords):
+        """Set the coordinates of each axis, e.g. the setpoints of sweeps.
+
+        Args:
+            coords (OrderedDict): name -> 1D array of values for each axis,
+                in the order of the axes.
+
+        Raises:
+            ValueError: if there is not one coordinate per axis.
+        """
+        if len(coords) != len(self.shape):
+            raise ValueError("{} needs {} coordinates, got {}.".format(
+                self, len(self.shape), list(coords)))
+        self.coords = OrderedDict(
+            (key, np.asarray(val)) for key, val in coords.items())
+        self._indexes = tuple(
+            CoordIndex(key, val) for key, val in self.coords.items())
+        for key, array in self.arrays().items():
+            # Derived DataArrays may only span the outer axes
+            array.coords = self._indexes[:self.derived.get(
+                key, len(self._indexes))]
+
+    def sel(self, method=None, **indexers):
+        """Select points of every DataArray by coordinate value.
+
+        See DataArray.sel. Nested DataSets are not selected, but the lookup
+        tables of nested Measurements are.
+
+        Returns:
+            DataSet: a shallow copy holding views of the selected points.
+        """
+        index, coords = select(self._indexes, method, indexers)
+        data_set = copy.copy(self)
+        data_set.coords = OrderedDict(
+            (coord.name, coord.values) for coord in coords)
+        data_set._indexes = coords
+        for key, array in self.arrays().items():
+            axes = self.derived.get(key, len(index))
+            if axes < len(index):
+                # A derived DataArray over the outer axes only
+                setattr(data_set, key, take(array, index[:axes]))
+                continue
+            selected = take(array, index)
+            if isinstance(selected, DataArray):
+                selected.coords = coords
+            setattr(data_set, key, selected)
+        data_set.lookup = {
+            key: take(lookup, index)
+            for key, lookup in self.lookup.items()
+        }
+        data_set.shape = tuple(len(coord.values) for coord in coords)
+        return data_set
+
     def append(self, data):
-        """Append a new data."""
-        for value in data:
-            pass
+        """Append a new data.
+
+        The point is stored at self.index, which a Measurement moves ahead
+        when a Sweep skips points.
+
+        Args:
+            data (list): one value for each callable in the Measure, in
+                order. Values from Measurements are not stored.
+
+        Returns:
+            int: flat index of the point
+        """
+        point = np.unravel_index(self.index, self.shape)
+        for key, value in zip(self.measure.keys(), data):
+            array = getattr(self, key)
+            if isinstance(array, DataArray):
+                array[point] = value
+        self.sampled[point] = True
+        self.index += 1
+        return self.index - 1
+
+    def child(self, key, measure, shape):
+        """Create the DataSet of a nested Measurement at the current point.
+
+        Children are numbered in the order they are created and the number
+        is recorded in self.lookup[key] at the current grid point.
+
+        Args:
+            key (str): key of the nested Measurement in the Measure
+            measure (Measure): Measure of the nested Measurement
+            shape (tuple): shape of the nested Measurement
+        """
+        children = getattr(self, key)
+        number = len(children)
+        data_set = self._new_child(key, number, measure, shape)
+        children.append(data_set)
+        self.lookup[key][np.unravel_index(self.index, self.shape)] = number
+        return data_set
+
+    def get_child(self, key, point):
+        """Return the DataSet of a nested Measurement at a grid point.
+
+        Args:
+            key (str): key of the nested Measurement in the Measure
+            point (tuple): index of the point in the parameter space
+
+        Returns:
+            DataSet: or None if the nested Measurement did not run there.
+        """
+        number = self.lookup[key][point]
+        if number < 0:
+            return None
+        return getattr(self, key)[number]
+
+    def _new_child(self, key, number, measure, shape):
+        """Return a new DataSet for a nested Measurement."""
+        return DataSet.from_measure(
+            measure, shape, self.filename, metadata=self.metadata)
+
+    def restore(self, arrays, index, lookup, sampled=None):
+        """Fill the DataSet with data saved by an interrupted run.
+
+        Args:
+            arrays (dict): contents of each DataArray
+            index (int): flat index after the last measured point
+            lookup (dict): lookup tables of nested Measurements
+            sampled (array): points that were measured. All points before
+                index if not given.
+        """
+        if sampled is None:
+            self.sampled.flat[:index] = True
+        else:
+            self.sampled[...] = sampled
+        for key, array in arrays.items():
+            getattr(self, key)[...] = array
+        for key, table in lookup.items():
+            self.lookup[key][...] = table
+            # Keep numbering new children after the existing ones
+            setattr(self, key, [None] * int(table.max() + 1))
+        self.index = index
+
+    def reload(self, index):
+        """Fill the DataSet from its file to continue an interrupted run.
+
+        Checkpoints of DataSets written to file hold only the index, and
+        the data is read back from the file with this.
+
+        Args:
+            index (int): flat index after the last measured point
+        """
+        raise NotImplementedError("{} keeps no file to reload.".format(
+            self.__class__.__name__))
+
+    def open(self):
+        """Prepare the file for writing points as they are measured."""
+        pass
+
+    def write(self, index, data):
+        """Write a single point to file.
+
+        Called from a Writer thread, so it must not touch the DataArrays.
+
+        Args:
+            index (int): flat index of the point
+            data (list): values as passed to append
+        """
+        pass
+
+    def flush(self):
+        """Make sure all written points are on disk."""
+        pass
+
+    def close(self):
+        """Flush and close the file."""
+        self.flush()
 
     def save(self):
         """Use the formatter to write a file."""
@@ -62,9 +514,9 @@ class DataSet(object):
 
     def get_metadata(self):
         """Record information about setup and git repo."""
-        repo = Repo(os.path.dirname(measurement.__file__))
+        repo = get_repo()
         return {
-            "git_hash": repo.get.log("-1", "--format=%H"),
+            "git_hash": repo.git.log("-1", "--format=%H"),
             "git_diff": repo.git.diff(),
             "setup": "fix"
         }
@@ -82,16 +534,32 @@ class DataSet(object):
         return self._filename
 
     @classmethod
-    def from_measure(cls, measure):
-        """Create a dataset designed to store parameters in a Getter."""
-        data_set = cls(measure)
-        for call in measure:
+    def from_measure(cls, measure, shape, filename=None, **options):
+        """Create a dataset designed to store parameters in a Getter.
+
+        Args:
+            measure (Measure): callables executed at each point
+            shape (tuple): shape of the parameter space of the Measurement
+            filename (str): file written by the DataSet
+            options: passed on to the DataSet, e.g. compression settings
+                of an Hdf5DataSet.
+        """
+        # Imported here since measurement.py imports DataSet
+        from measurement.measurements.callables import Getter
+        from measurement.measurements.measurement import Measurement
+        data_set = cls(measure, shape, filename, **options)
+        for key, call in measure.items():
             if isinstance(call, Getter):
+                # Vector readings (traces, waveforms) add trailing axes
+                dtype = np.dtype(call.dtype or float)
                 data_set.add(
                     DataArray(
-                        np.full(measure.shape, np.nan), call.name, call.units))
+                        np.full(tuple(shape) + call.shape,
+                                fill_value(dtype),
+                                dtype=dtype), key, call.units))
             if isinstance(call, Measurement):
-                setattr(data_set, call.__class__.__name__, [])
+                setattr(data_set, key, [])
+                data_set.lookup[key] = np.full(shape, -1, dtype=np.int32)
         return data_set
 
 
@@ -106,13 +574,562 @@ class TextDataSet(DataSet):
 
 
 class Hdf5DataSet(DataSet):
-    """Write data to a .h5 file."""
+    """Write data to a .h5 file.
+
+    Each DataArray is stored as an HDF5 dataset of the same name, chunked
+    along the sweeps (see chunk_shape) and optionally compressed. Points
+    can be written one at a time as they are measured (open/write/close) or
+    all at once with save.
+
+    Nested Measurements are stored in the same file. The DataSet of the
+    n-th run of the nested Measurement `key` is the group "key/n" and the
+    dataset "key/lookup" maps each grid point to n (-1 if it did not run),
+    so a child is found without listing the file.
+    """
+    extension = ".h5"
+
+    def __init__(self,
+                 measure,
+                 shape,
+                 filename=None,
+                 compression=None,
+                 compression_opts=None,
+                 shuffle=False,
+                 filters=None,
+                 metadata=None,
+                 group="/",
+                 parent=None):
+        """
+        Args:
+            compression (str): HDF5 compression filter, "gzip" or "lzf"
+            compression_opts (int): compression level for gzip (0-9)
+            shuffle (bool): apply the byte shuffle filter before compressing
+            filters (dict): settings for individual DataArrays, keyed by
+                name, overriding compression/compression_opts/shuffle.
+            group (str): path of the group holding the DataSet in the file
+            parent (Hdf5DataSet): DataSet whose open file a nested DataSet
+                is written to.
+        """
+        super(Hdf5DataSet, self).__init__(measure, shape, filename, metadata)
+        self.compression = compression
+        self.compression_opts = compression_opts
+        self.shuffle = shuffle
+        self.filters = filters or {}
+        self.group = group
+        self.parent = parent
+        # Mode the file is opened with by open; "a" to continue a file
+        self.mode = "w"
+        self.file = None
+
+    def restore(self, arrays, index, lookup, sampled=None):
+        """Fill the DataSet from a checkpoint and continue its file."""
+        super(Hdf5DataSet, self).restore(arrays, index, lookup, sampled)
+        self.mode = "a"
+
+    def reload(self, index):
+        """Fill the DataSet from its file to continue an interrupted run.
+
+        Nested DataSets are left in the file, see get_child.
+        """
+        import h5py
+        with h5py.File(self.filename, "r") as f:
+            group = f[self.group]
+            arrays = {
+                key: group[key][...]
+                for key in self.arrays() if key in group
+            }
+            lookup = {
+                key: group[key + "/lookup"][...]
+                for key in self.lookup if key in group
+            }
+            sampled = group["_sampled"][...] if "_sampled" in group else None
+        self.restore(arrays, index, lookup, sampled)
+
+    def get_filters(self, key):
+        """Return the HDF5 filter settings used to store a DataArray."""
+        filters = {
+            "compression": self.compression,
+            "compression_opts": self.compression_opts,
+            "shuffle": self.shuffle
+        }
+        filters.update(self.filters.get(key, {}))
+        return filters
+
+    def open(self):
+        """Create the file with an empty dataset for each DataArray.
+
+        Nested DataSets create their group in the file of their parent.
+        """
+        if self.parent is None:
+            import h5py
+            self.file = h5py.File(self.filename, self.mode)
+            for key, val in self.metadata.items():
+                self.file.attrs[key] = val
+        else:
+            self.file = self.parent.file.require_group(self.group)
+        self.file.attrs["shape"] = self.shape
+        if self.coords and "_coords" not in self.file:
+            coords = self.file.create_group("_coords")
+            # Groups list their members by name, so keep the axis order
+            coords.attrs["names"] = list(self.coords)
+            for key, values in self.coords.items():
+                coords.create_dataset(key, data=values)
+        if "_sampled" not in self.file:
+            # Written on close, see close
+            self.file.create_dataset("_sampled", data=self.sampled)
+        for key, lookup in self.lookup.items():
+            if key in self.file:
+                self.file[key + "/lookup"][...] = lookup
+            else:
+                self.file.create_dataset(key + "/lookup", data=lookup)
+        for key, array in self.arrays().items():
+            if key in self.file:
+                # Continuing a file: make it match the restored data
+                self.file[key][...] = array
+                continue
+            dset = self.file.create_dataset(
+                key,
+                shape=array.shape,
+                dtype=array.dtype,
+                chunks=chunk_shape(array.shape, array.dtype.itemsize)
+                if array.ndim else None,
+                fillvalue=fill_value(array.dtype),
+                **self.get_filters(key))
+            if array.units is not None:
+                dset.attrs["units"] = array.units
+            if key in self.derived:
+                dset.attrs["axes"] = self.derived[key]
+        # Keep the order of the Measure so points can be written by position
+        arrays = self.arrays()
+        self.columns = [
+            self.file[key] if key in arrays else None
+            for key in self.measure.keys()
+        ]
+
+    def write(self, index, data):
+        """Write a single point to the open file."""
+        point = np.unravel_index(index, self.shape)
+        for dset, value in zip(self.columns, data):
+            if dset is not None:
+                dset[point] = value
+
+    def _new_child(self, key, number, measure, shape):
+        """Return a DataSet writing to a group of this DataSet's file."""
+        data_set = Hdf5DataSet.from_measure(
+            measure,
+            shape,
+            self.filename,
+            compression=self.compression,
+            compression_opts=self.compression_opts,
+            shuffle=self.shuffle,
+            filters=self.filters,
+            metadata=self.metadata,
+            group="{}/{}".format(key, number),
+            parent=self)
+        if self.file is not None:
+            point = np.unravel_index(self.index, self.shape)
+            self.file[key + "/lookup"][point] = number
+        return data_set
+
+    def get_child(self, key, point):
+        """Return the DataSet of a nested Measurement at a grid point.
+
+        DataSets loaded from file, or children measured before a resume,
+        are read from their group on demand.
+        """
+        number = self.lookup[key][point]
+        if number < 0:
+            return None
+        children = getattr(self, key, None)
+        if children is not None and children[number] is not None:
+            return children[number]
+        group = "{}/{}/{}".format(self.group.rstrip("/"), key, number)
+        return Hdf5DataSet(
+            None, None, self.filename, metadata=self.metadata,
+            group=group).load()
+
+    def flush(self):
+        """Write the points measured so far and the derived DataArrays.
+
+        These are written here rather than point by point to keep writes per
+        point to one per DataArray.
+        """
+        if self.file is not None:
+            self.file["_sampled"][...] = self.sampled
+            for key in self.derived:
+                self.file[key][...] = getattr(self, key)
+            self.file.file.flush()
+
+    def close(self):
+        """Close the file, or only flush it for a nested DataSet."""
+        if self.file is not None:
+            self.flush()
+            if self.parent is None:
+                self.file.close()
+            self.file = None
 
     def save(self):
-        pass
+        """Write the whole DataSet to file at once."""
+        self.open()
+        for key, array in self.arrays().items():
+            self.file[key][...] = array
+        self.close()
 
     def load(self):
-        pass
+        """Read the DataArrays and metadata from file.
+
+        Nested DataSets are not read; use get_child to read one.
+        """
+        import h5py
+        with h5py.File(self.filename, "r") as f:
+            self.metadata = dict(f.attrs)
+            group = f[self.group]
+            self.shape = tuple(group.attrs["shape"])
+            self.metadata.pop("shape", None)
+            for key, val in group.items():
+                if key.startswith("_"):
+                    continue
+                if isinstance(val, h5py.Dataset):
+                    self.__dict__[key] = DataArray(val[...], key,
+                                                   val.attrs.get("units"))
+                    if "axes" in val.attrs:
+                        self.derived[key] = int(val.attrs["axes"])
+                else:
+                    self.lookup[key] = val["lookup"][...]
+            if "_sampled" in group:
+                self.sampled = group["_sampled"][...]
+            if "_coords" in group:
+                coords = group["_coords"]
+                self.set_coords(
+                    OrderedDict((key, coords[key][...])
+                                for key in coords.attrs["names"]))
+        return self
+
+
+class RingDataSet(DataSet):
+    """Stream an open-ended series of points through a fixed amount of memory.
+
+    The DataArrays are circular buffers holding the most recent shape[0]
+    points; point n is stored at n % shape[0]. Every point is also written
+    to a .h5 file in chunks of `chunk` points by the Writer thread, so the
+    whole series is on disk while memory use stays constant however long
+    the Measurement runs.
+
+    Numeric DataArrays also get a Pyramid in the file, so any window of the
+    series can be read at a given resolution with window, without reading
+    every point.
+    """
+    extension = ".h5"
+
+    def __init__(self,
+                 measure,
+                 shape,
+                 filename=None,
+                 chunk=1024,
+                 compression=None,
+                 compression_opts=None,
+                 shuffle=False,
+                 metadata=None,
+                 pyramid=True):
+        """
+        Args:
+            shape (tuple): (size, ), number of points kept in memory
+            chunk (int): number of points written to file at once
+            compression (str): HDF5 compression filter, "gzip" or "lzf"
+            compression_opts (int): compression level for gzip (0-9)
+            shuffle (bool): apply the byte shuffle filter before compressing
+            pyramid (bool): keep a Pyramid of each numeric DataArray
+        """
+        super(RingDataSet, self).__init__(measure, shape, filename, metadata)
+        self.size = None if shape is None else shape[0]
+        self.chunk = chunk
+        self.compression = compression
+        self.compression_opts = compression_opts
+        self.shuffle = shuffle
+        self.pyramid = pyramid
+        self.mode = "w"
+        self.file = None
+        # Points written by the Writer thread but not yet on disk
+        self.pending = []
+        self.start = 0
+
+    def append(self, data):
+        """Append a new point, overwriting the oldest one when full."""
+        point = self.index % self.size
+        for key, value in zip(self.measure.keys(), data):
+            array = getattr(self, key)
+            if isinstance(array, DataArray):
+                array[point] = value
+        self.index += 1
+        return self.index - 1
+
+    def child(self, key, measure, shape):
+        raise TypeError("{} can't store nested Measurements.".format(
+            self.__class__.__name__))
+
+    def recent(self, key):
+        """Return the points of a DataArray in memory, oldest first."""
+        array = getattr(self, key)
+        if self.index <= self.size:
+            return array[:self.index]
+        start = self.index % self.size
+        return np.concatenate((array[start:], array[:start]))
+
+    def restore(self, arrays, index, lookup, sampled=None):
+        """Fill the DataSet from a checkpoint and continue its file."""
+        super(RingDataSet, self).restore(arrays, index, lookup, sampled)
+        self.mode = "a"
+
+    def reload(self, index):
+        """Fill the ring with the last points in the file before index."""
+        import h5py
+        arrays = {}
+        first = max(index - self.size, 0)
+        with h5py.File(self.filename, "r") as f:
+            for key, array in self.arrays().items():
+                if key not in f:
+                    continue
+                rows = f[key][first:index]
+                ring = np.array(array)
+                ring[np.arange(first, first + len(rows)) % self.size] = rows
+                arrays[key] = ring
+        self.restore(arrays, index, {})
+
+    def open(self):
+        """Create the file with an empty, growing dataset per DataArray."""
+        import h5py
+        self.file = h5py.File(self.filename, self.mode)
+        for key, val in self.metadata.items():
+            self.file.attrs[key] = val
+        arrays = self.arrays()
+        for key, array in arrays.items():
+            # Vector readings are stored as rows of a 2D (or more) dataset
+            trailing = array.shape[1:]
+            if key in self.file:
+                continue
+            dset = self.file.create_dataset(
+                key,
+                shape=(0, ) + trailing,
+                maxshape=(None, ) + trailing,
+                dtype=array.dtype,
+                chunks=(self.chunk, ) + trailing,
+                fillvalue=fill_value(array.dtype),
+                compression=self.compression,
+                compression_opts=self.compression_opts,
+                shuffle=self.shuffle)
+            if array.units is not None:
+                dset.attrs["units"] = array.units
+        # Continuing a file: drop the points written after the checkpoint,
+        # and write the ones that were still queued from the ring
+        start = min([self.index] + [len(self.file[key]) for key in arrays])
+        if self.index - start > self.size:
+            log.warning("points %s to %s of %s were lost before being "
+                        "written", start, self.index - self.size, self)
+            start = self.index - self.size
+        for key in arrays:
+            dset = self.file[key]
+            dset.resize((start, ) + dset.shape[1:])
+        self.columns = [
+            self.file[key] if key in arrays else None
+            for key in self.measure.keys()
+        ]
+        self.pyramids = [
+            Pyramid(self.file.require_group("pyramid/" + dset.name[1:]), dset,
+                    start, self.chunk)
+            if self.pyramid and dset is not None and dset.ndim == 1
+            and dset.dtype.kind in "biuf" else None
+            for dset in self.columns
+        ]
+        self.start = start
+        self.pending = [self._point(i) for i in range(start, self.index)]
+        if self.pending:
+            self.flush()
+
+    def _point(self, index):
+        """Return the values of a point still in memory, as passed to write."""
+        values = []
+        for key in self.measure.keys():
+            array = getattr(self, key, None)
+            values.append(array[index % self.size]
+                          if isinstance(array, DataArray) else None)
+        return values
+
+    def write(self, index, data):
+        """Queue a point and write a chunk to file once it is full."""
+        self.pending.append(data)
+        if len(self.pending) >= self.chunk:
+            self.flush()
+
+    def flush(self):
+        """Write the queued points to file."""
+        if self.file is None:
+            return
+        if self.pending:
+            end = self.start + len(self.pending)
+            for i, dset in enumerate(self.columns):
+                if dset is not None:
+                    dset.resize((end, ) + dset.shape[1:])
+                    dset[self.start:end] = [data[i] for data in self.pending]
+                    if self.pyramids[i] is not None:
+                        self.pyramids[i].extend(dset[self.start:end])
+            self.start = end
+            self.pending = []
+        self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.flush()
+            self.file.close()
+            self.file = None
+
+    def load(self):
+        """Read the whole series from file into memory."""
+        import h5py
+        with h5py.File(self.filename, "r") as f:
+            self.metadata = dict(f.attrs)
+            for key, val in f.items():
+                if isinstance(val, h5py.Dataset):
+                    self.__dict__[key] = DataArray(val[...], key,
+                                                   val.attrs.get("units"))
+                    self.shape = val.shape[:1]
+        self.size = self.index = self.shape[0]
+        return self
+
+    def window(self, key, start=0, stop=None, num=1000):
+        """Return a window of a DataArray at about num points of resolution.
+
+        The window is read from the coarsest level of the Pyramid that still
+        has at least num blocks in the window, so between num and 2 * num
+        rows are read however long the window is. Only points already
+        written to file are included, up to the last complete block.
+
+        Args:
+            key (str): name of the DataArray
+            start (int): index of the first point of the window
+            stop (int): index after the last point. Defaults to the end.
+            num (int): minimum number of points returned
+
+        Returns:
+            tuple: (index, minimum, maximum, mean) arrays. index is the
+                index of the first point of each block.
+        """
+        if self.file is not None:
+            return Pyramid.window(self.file, key, start, stop, num)
+        import h5py
+        with h5py.File(self.filename, "r") as f:
+            return Pyramid.window(f, key, start, stop, num)
+
+
+class Pyramid(object):
+    """Min, max and mean of a series over blocks of 2, 4, 8, ... points.
+
+    Level k holds one (min, max, mean) row per block of 2**k points, stored
+    as the dataset "k" of an HDF5 group. Rows are built from pairs of rows
+    of the level below as points are added, so adding n points costs O(n)
+    and the series is never read again. An unpaired row of each level is
+    carried until its partner arrives.
+    """
+
+    def __init__(self, group, raw, count=0, chunk=1024):
+        """
+        Args:
+            group (h5py.Group): group holding the levels
+            raw (h5py.Dataset): the series itself (level 0)
+            count (int): number of points already in the series. Levels
+                written beyond this point are discarded.
+            chunk (int): chunk size of the level datasets
+        """
+        self.group = group
+        self.chunk = chunk
+        self.carry = {}
+        count = int(count)
+        if any(str(level) not in group or len(group[str(level)]) <
+               count >> level for level in range(1, count.bit_length())):
+            # A crash between writing the series and its levels: rebuild
+            # the levels rather than leave rows unfilled
+            for name in list(group):
+                del group[name]
+            step = 64 * chunk
+            for start in range(0, count, step):
+                self.extend(raw[start:min(start + step, count)])
+            return
+        if count % 2:
+            value = float(raw[count - 1])
+            self.carry[0] = np.array([[value, value, value]])
+        # Cut every level back to the rows of the first count points, and
+        # drop the levels that have none so window does not pick them
+        for name in list(group):
+            rows = count >> int(name)
+            if rows:
+                group[name].resize((rows, 3))
+            else:
+                del group[name]
+        level = 1
+        while count >> level:
+            rows = count >> level
+            dset = self.level(level)
+            if rows % 2:
+                self.carry[level] = dset[rows - 1:rows]
+            level += 1
+
+    def __str__(self):
+        return "<{}: {}>".format(self.__class__.__name__, self.group.name)
+
+    def __repr__(self):
+        return str(self)
+
+    def level(self, level):
+        """Return the dataset of a level, creating it if needed."""
+        name = str(level)
+        if name not in self.group:
+            self.group.create_dataset(
+                name,
+                shape=(0, 3),
+                maxshape=(None, 3),
+                dtype=float,
+                chunks=(self.chunk, 3))
+        return self.group[name]
+
+    def extend(self, values):
+        """Add points to the series."""
+        values = np.asarray(values, dtype=float)
+        rows = np.repeat(values[:, None], 3, axis=1)
+        level = 0
+        while len(rows):
+            if level in self.carry:
+                rows = np.concatenate((self.carry.pop(level), rows))
+            if len(rows) % 2:
+                self.carry[level] = rows[-1:]
+                rows = rows[:-1]
+            pairs = rows.reshape(-1, 2, 3)
+            rows = np.column_stack(
+                (np.fmin(pairs[:, 0, 0], pairs[:, 1, 0]),
+                 np.fmax(pairs[:, 0, 1], pairs[:, 1, 1]),
+                 pairs[:, :, 2].mean(axis=1)))
+            level += 1
+            if len(rows):
+                dset = self.level(level)
+                end = len(dset)
+                dset.resize((end + len(rows), 3))
+                dset[end:] = rows
+
+    @staticmethod
+    def window(f, key, start=0, stop=None, num=1000):
+        """Read a window of a series from a file. See RingDataSet.window."""
+        raw = f[key]
+        if stop is None:
+            stop = len(raw)
+        level = max(0, int(np.log2(max(stop - start, 1) / num)))
+        group = f.get("pyramid/" + key)
+        while level and (group is None or str(level) not in group):
+            level -= 1
+        first, last = start >> level, -(-stop >> level)
+        index = np.arange(first, last) << level
+        if level == 0:
+            values = raw[first:last].astype(float)
+            return index, values, values, values
+        rows = group[str(level)][first:last]
+        return index[:len(rows)], rows[:, 0], rows[:, 1], rows[:, 2]
 
 
 class DataArray(np.ndarray):
@@ -121,7 +1138,12 @@ class DataArray(np.ndarray):
     Behaves like an ndarray with a name and units parameter.
     """
 
-    def __new__(cls, input_array, name=None, units=None, dataset=None):
+    # CoordIndex of each axis, set by DataSet.set_coords. Not passed on by
+    # numpy operations since they may reorder or drop axes.
+    coords = None
+
+    def __new__(cls, input_array, name=None, units=None, dataset=None,
+                coords=None):
         """
         Args:
             input_array (array): Array to be cast to DataSet type
@@ -129,11 +1151,13 @@ class DataArray(np.ndarray):
             units (str): Units of the data stored in the DataSet
             dataset (DataSet): Collection of data that the DataArray is a
                 member of.
+            coords (tuple): CoordIndex of each axis
         """
         obj = np.asarray(input_array).view(cls)
         obj.name = name
         obj.units = units
         obj.dataset = dataset
+        obj.coords = coords
         return obj
 
     def __array_finalize__(self, obj):
@@ -142,6 +1166,31 @@ class DataArray(np.ndarray):
         self.name = getattr(obj, "name", None)
         self.units = getattr(obj, "units", None)
 
+    def sel(self, method=None, **indexers):
+        """Select points by coordinate value rather than position.
+
+        e.g. data.inst_y.sel(gate=1.25, method="nearest") is the line at the
+        gate voltage closest to 1.25 and sel(gate=slice(0, 1)) the points
+        with 0 <= gate <= 1. Ranges of sorted sweeps select views.
+
+        Args:
+            method (str): None for exact matches or "nearest"
+            indexers: coordinate name -> value or slice of values
+
+        Returns:
+            DataArray: selected points with the coordinates that are left
+
+        Raises:
+            ValueError: if the DataArray has no coordinates.
+        """
+        if self.coords is None:
+            raise ValueError("{} has no coordinates.".format(self.name))
+        index, coords = select(self.coords, method, indexers)
+        selected = take(self, index)
+        if isinstance(selected, DataArray):
+            selected.coords = coords
+        return selected
+
     def __str__(self):
         return "<{}: {} ({}) from {}\n{}>".format(
             self.__class__.__name__, self.name, self.units, self.filename,
@@ -1,41 +1,173 @@
+"""Set up logging that stays out of the measurement loop.
+
+Records are put on a queue by a LazyQueueHandler and formatted and written
+to the console/file by a QueueListener thread, so logging a point costs a
+level check and a queue put. Per-point messages can be thinned out with a
+RateLimitFilter before they reach the queue.
+"""
+import atexit
 import logging
 import logging.handlers
+import queue
+import time
 from datetime import datetime
 import os
 
 log = logging.getLogger(__name__)
 
+# Logger name -> QueueListener started by setup
+_listeners = {}
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """Put records on a queue without formatting them.
+
+    The stdlib QueueHandler formats each message before queueing it so the
+    record can be sent to another process. The listener here is a thread of
+    the same process, so formatting is left to it. Arguments are formatted
+    after the call returns: don't log objects that are modified later.
+    """
+
+    def prepare(self, record):
+        return record
+
+
+class RateLimitFilter(logging.Filter):
+    """Pass at most `rate` records per second for each message.
+
+    Records are grouped by logger and message template, so a burst of one
+    per-point message does not hide other messages. The number of records
+    dropped since the last one passed is stored as record.suppressed and
+    shown by SuppressedFormatter. Warnings and errors are never dropped.
+    """
+
+    def __init__(self, rate, burst=1, clock=time.monotonic,
+                 level=logging.WARNING):
+        """
+        Args:
+            rate (float): records per second passed for each message
+            burst (int): records passed at once after a quiet period
+            clock (callable): returns the time in seconds
+            level (int): records of this level and above all pass
+        """
+        super(RateLimitFilter, self).__init__()
+        self.rate = rate
+        self.burst = burst
+        self.clock = clock
+        self.level = level
+        # (logger, msg) -> [tokens, time of last update, suppressed]
+        self.buckets = {}
+
+    def filter(self, record):
+        if record.levelno >= self.level:
+            return True
+        now = self.clock()
+        key = (record.name, record.msg)
+        try:
+            bucket = self.buckets[key]
+        except KeyError:
+            bucket = self.buckets[key] = [self.burst, now, 0]
+        bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if bucket[0] < 1:
+            bucket[2] += 1
+            return False
+        bucket[0] -= 1
+        record.suppressed = bucket[2]
+        bucket[2] = 0
+        return True
+
+
+class SuppressedFormatter(logging.Formatter):
+    """Note how many similar records a RateLimitFilter dropped."""
+
+    def format(self, record):
+        text = super(SuppressedFormatter, self).format(record)
+        suppressed = getattr(record, "suppressed", 0)
+        if suppressed:
+            text += " ({} similar suppressed)".format(suppressed)
+        return text
+
+
 def console_log(level=logging.WARNING):
     ch = logging.StreamHandler()
     ch.setLevel(level)
-    formatter = logging.Formatter(
+    formatter = SuppressedFormatter(
         '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     ch.setFormatter(formatter)
     return ch
 
+
 def file_log(filename, level=logging.INFO):
     ch = logging.FileHandler(filename)
     ch.setLevel(level)
-    formatter = logging.Formatter(
+    formatter = SuppressedFormatter(
         '%(asctime)s - %(name)s - %(levelname)s - %(message)s')
     ch.setFormatter(formatter)
     return ch
-    
-def setup(name = __name__, logger = None, console = True,
-          console_level = "DEBUG", file_level = "INFO", filename = None):
+
+
+def queue_log(*handlers):
+    """Return a handler passing records to handlers in a background thread.
+
+    Returns:
+        tuple: (LazyQueueHandler, started QueueListener). Stop the listener
+            to write the queued records and end the thread.
+    """
+    records = queue.Queue()
+    listener = logging.handlers.QueueListener(
+        records, *handlers, respect_handler_level=True)
+    listener.start()
+    return LazyQueueHandler(records), listener
+
+
+def setup(name=__name__, logger=None, console=True, console_level="DEBUG",
+          file_level="INFO", filename=None, rate=None):
+    """Log to the console and a file without blocking the caller.
+
+    Args:
+        name (str): name of the logger to set up
+        logger (logging.Logger): logger to set up instead of name
+        console (bool): also log to the console
+        console_level (str): lowest level shown on the console
+        file_level (str): lowest level written to the file
+        filename (str): log file. Defaults to one file per day.
+        rate (float): if given, pass at most rate records per second for
+            each message below WARNING (see RateLimitFilter)
+    """
     if logger is None:
         logger = logging.getLogger(name)
     if filename is None:
         filename = gen_filename()
+    stop(logger.name)
     logger.handlers = []
+    handlers = [file_log(filename, file_level)]
     if console:
-        logger.addHandler(console_log())
-        logger.info("setting up console logging")
-    logger.addHandler(file_log(filename))
-    logger.info("set up file logging")
+        handlers.append(console_log(console_level))
+    handler, _listeners[logger.name] = queue_log(*handlers)
+    if rate is not None:
+        handler.addFilter(RateLimitFilter(rate))
+    logger.addHandler(handler)
+    logger.info("set up logging to %s", filename)
     return logger
 
+
+def stop(name=None):
+    """Write the queued records and stop the listener thread(s).
+
+    Args:
+        name (str): name of a logger set up with setup. All if None.
+    """
+    names = list(_listeners) if name is None else [name]
+    for key in names:
+        listener = _listeners.pop(key, None)
+        if listener is not None:
+            listener.stop()
+
+
+atexit.register(stop)
+
+
 def gen_filename(directory="/Users/Matt/emacs/testing/measurement/logs"):
     stamp = datetime.now().strftime("%Y-%m-%d") + ".log"
     return os.path.join(directory, stamp)
-                         
@@ -0,0 +1,279 @@
+"""Share the data of a running Measurement with other local processes.
+
+A Publisher moves the DataArrays of a DataSet into shared memory, so the
+acquisition loop writes each point straight into memory that live plotters
+and dashboards can map. Readers attach with a Subscriber and see new points
+without any copying or pickling.
+
+Each published DataSet uses these shared memory blocks:
+    <name>_meta: JSON description of the arrays (length-prefixed)
+    <name>_index: number of points measured so far (int64), the
+        notification channel readers poll
+    <name>_<array>: the data of each DataArray
+
+A process that is killed while publishing leaves its blocks behind in
+/dev/shm, and publishing under the same name fails until they are removed
+with remove(name).
+
+Shared memory needs python 3.8. It is imported on first use so the rest of
+the package keeps working on older versions.
+"""
+import json
+import time
+import numpy as np
+from numpy.lib.format import dtype_to_descr
+from measurement.util.dataset import DataArray
+
+import logging
+log = logging.getLogger(__name__)
+
+# Bytes used to store the length of the JSON description
+_HEADER = 8
+
+
+def _shared_memory():
+    """Import multiprocessing.shared_memory.
+
+    Raises:
+        ImportError: before python 3.8.
+    """
+    try:
+        from multiprocessing import shared_memory
+    except ImportError:
+        raise ImportError(
+            "Publishing data needs python 3.8 or later.") from None
+    return shared_memory
+
+
+def _attach(name):
+    """Attach to an existing shared memory block without owning it.
+
+    Before python 3.13 every process attaching to a block registers it with
+    its resource tracker, which unlinks the block when the process exits.
+    Readers must not do that, so the block is unregistered again.
+    """
+    shared_memory = _shared_memory()
+    try:
+        return shared_memory.SharedMemory(name, track=False)
+    except TypeError:
+        from multiprocessing import resource_tracker
+        shm = shared_memory.SharedMemory(name)
+        resource_tracker.unregister(shm._name, "shared_memory")
+        return shm
+
+
+def _release(shm):
+    """Close a shared memory block unless arrays still use it.
+
+    Arrays handed out to other code may outlive the Publisher/Subscriber.
+    The mapping is then released when the last of them is deleted.
+    """
+    try:
+        shm.close()
+    except BufferError:
+        pass
+
+
+def remove(name):
+    """Remove the shared memory left behind by a Publisher that crashed.
+
+    Readers still attached keep their mapping.
+
+    Args:
+        name (str): name the data was published with
+    """
+    blocks = [name + "_index", name + "_meta"]
+    try:
+        shm = _attach(name + "_meta")
+    except FileNotFoundError:
+        pass
+    else:
+        length = int(np.ndarray(1, np.int64, buffer=shm.buf)[0])
+        meta = json.loads(bytes(shm.buf[_HEADER:_HEADER + length]).decode())
+        blocks.extend(info["block"] for info in meta["arrays"].values())
+        _release(shm)
+    for block in blocks:
+        try:
+            shm = _attach(block)
+        except FileNotFoundError:
+            continue
+        _release(shm)
+        shm.unlink()
+        log.info("removed stale shared memory %s", block)
+
+
+class Publisher(object):
+    """Publish the DataArrays of a DataSet in shared memory."""
+
+    def __init__(self, dataset, name):
+        """
+        Args:
+            dataset (DataSet): DataSet to publish. Its DataArrays are
+                replaced by DataArrays backed by shared memory.
+            name (str): name readers use to find the data
+
+        Raises:
+            FileExistsError: if data is already published under name, e.g.
+                by a process that crashed. See remove.
+        """
+        self.dataset = dataset
+        self.name = name
+        self.blocks = []
+        self.index = None
+        try:
+            self._publish()
+        except BaseException:
+            # Do not leave the blocks created so far behind
+            self.close()
+            raise
+
+    def _publish(self):
+        arrays = {}
+        for key, array in self.dataset.arrays().items():
+            shm = self._create("{}_{}".format(self.name, key), array.nbytes)
+            shared = DataArray(
+                np.ndarray(array.shape, array.dtype, buffer=shm.buf),
+                array.name, array.units, coords=array.coords)
+            shared[...] = array
+            setattr(self.dataset, key, shared)
+            arrays[key] = {
+                "block": shm.name,
+                "shape": array.shape,
+                "dtype": dtype_to_descr(array.dtype),
+                "units": array.units
+            }
+        meta = json.dumps({
+            "shape": self.dataset.shape,
+            "arrays": arrays
+        }).encode()
+        shm = self._create(self.name + "_meta", _HEADER + len(meta))
+        shm.buf[_HEADER:_HEADER + len(meta)] = meta
+        np.ndarray(1, np.int64, buffer=shm.buf)[0] = len(meta)
+        shm = self._create(self.name + "_index", 8)
+        self.index = np.ndarray(1, np.int64, buffer=shm.buf)
+        self.index[0] = self.dataset.index
+
+    def __str__(self):
+        return "<{}: {}>".format(self.__class__.__name__, self.name)
+
+    def __repr__(self):
+        return str(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _create(self, name, size):
+        try:
+            shm = _shared_memory().SharedMemory(
+                name, create=True, size=max(size, 1))
+        except FileExistsError:
+            raise FileExistsError(
+                "{} is already published. If it was left by a crashed run, "
+                "remove it with publish.remove({!r}).".format(
+                    name, self.name)) from None
+        self.blocks.append(shm)
+        return shm
+
+    def update(self):
+        """Tell readers how many points have been measured."""
+        self.index[0] = self.dataset.index
+
+    def close(self):
+        """Stop publishing.
+
+        The DataArrays are copied back to private memory and the shared
+        blocks are removed. Readers that are attached keep their mapping.
+        """
+        for key, array in self.dataset.arrays().items():
+            setattr(self.dataset, key,
+                    DataArray(np.array(array), array.name, array.units,
+                              coords=array.coords))
+        self.index = None
+        for shm in self.blocks:
+            _release(shm)
+            shm.unlink()
+        self.blocks = []
+
+
+class Subscriber(object):
+    """Map the data published by a running Measurement."""
+
+    def __init__(self, name):
+        """
+        Args:
+            name (str): name the data was published with
+
+        Raises:
+            FileNotFoundError: if nothing is published under name.
+        """
+        from numpy.lib.format import descr_to_dtype
+        self.name = name
+        self.blocks = []
+        shm = self._attach(name + "_meta")
+        length = int(np.ndarray(1, np.int64, buffer=shm.buf)[0])
+        meta = json.loads(bytes(shm.buf[_HEADER:_HEADER + length]).decode())
+        self.shape = tuple(meta["shape"])
+        self.arrays = {}
+        for key, info in meta["arrays"].items():
+            shm = self._attach(info["block"])
+            array = np.ndarray(
+                tuple(info["shape"]),
+                descr_to_dtype(info["dtype"]),
+                buffer=shm.buf)
+            array.flags.writeable = False
+            self.arrays[key] = DataArray(array, key, info["units"])
+        shm = self._attach(name + "_index")
+        self._index = np.ndarray(1, np.int64, buffer=shm.buf)
+        self.seen = 0
+
+    def __str__(self):
+        return "<{}: {} ({} points)>".format(self.__class__.__name__,
+                                             self.name, self.index)
+
+    def __repr__(self):
+        return str(self)
+
+    def __getattr__(self, key):
+        try:
+            return self.__dict__["arrays"][key]
+        except KeyError:
+            raise AttributeError(key)
+
+    def _attach(self, name):
+        shm = _attach(name)
+        self.blocks.append(shm)
+        return shm
+
+    @property
+    def index(self):
+        """Number of points measured so far."""
+        return int(self._index[0])
+
+    def wait(self, timeout=None, poll=0.01):
+        """Wait until new points have been measured.
+
+        Args:
+            timeout (float): seconds to wait before giving up
+            poll (float): seconds between checks
+
+        Returns:
+            bool: True if there are new points.
+        """
+        start = time.time()
+        while self.index == self.seen:
+            if timeout is not None and time.time() - start >= timeout:
+                return False
+            time.sleep(poll)
+        self.seen = self.index
+        return True
+
+    def close(self):
+        """Release the mapping of the data."""
+        self.arrays = {}
+        self._index = None
+        for shm in self.blocks:
+            _release(shm)
+        self.blocks = []
@@ -0,0 +1,64 @@
+"""Statistics computed point by point, without storing the samples."""
+import math
+import numpy as np
+
+
+class RunningStats(object):
+    """Running count, mean and variance of a stream of samples.
+
+    Samples are added one at a time with Welford's update or a batch at a
+    time with the pairwise combination of Chan et al., which are both
+    numerically stable for long streams of nearly equal values.
+    """
+    __slots__ = ["count", "mean", "m2"]
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        # Sum of squared differences from the mean
+        self.m2 = 0.0
+
+    def __str__(self):
+        return "<{}: {:.6g} +- {:.3g} ({} samples)>".format(
+            self.__class__.__name__, self.mean, self.sem, self.count)
+
+    def __repr__(self):
+        return str(self)
+
+    def add(self, value):
+        """Add a single sample."""
+        self.count += 1
+        delta = value - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (value - self.mean)
+
+    def extend(self, values):
+        """Add a batch of samples."""
+        values = np.asarray(values, dtype=float).ravel()
+        count = len(values)
+        if count == 0:
+            return
+        mean = values.mean()
+        m2 = ((values - mean)**2).sum()
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta**2 * self.count * count / total
+        self.count = total
+
+    @property
+    def variance(self):
+        """Sample variance, nan with fewer than two samples."""
+        if self.count < 2:
+            return math.nan
+        return self.m2 / (self.count - 1)
+
+    @property
+    def std(self):
+        """Sample standard deviation."""
+        return math.sqrt(self.variance)
+
+    @property
+    def sem(self):
+        """Standard error of the mean."""
+        return self.std / math.sqrt(self.count) if self.count else math.nan
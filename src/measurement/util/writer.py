@@ -0,0 +1,125 @@
+"""Write data to disk in a background thread.
+
+Measurement.run hands each finished point to a Writer, which queues it and
+returns immediately. A thread takes points off the queue and writes them with
+the DataSet, so disk latency does not show up in the timing of the
+acquisition loop. The queue is bounded: if the disk falls behind by more than
+`maxsize` points, the acquisition loop waits for it instead of using
+unbounded memory.
+"""
+import queue
+import threading
+
+import logging
+log = logging.getLogger(__name__)
+
+# Put on the queue to tell the thread to flush and stop
+_STOP = object()
+# Put on the queue with an Event to tell the thread to flush the DataSet
+_FLUSH = object()
+
+
+class Writer(object):
+    """Write points to a DataSet from a background thread."""
+
+    def __init__(self, dataset, maxsize=1000):
+        """
+        Args:
+            dataset (DataSet): DataSet whose write method is called for each
+                point. It must already be open.
+            maxsize (int): number of points that can wait to be written
+                before put blocks.
+        """
+        self.dataset = dataset
+        self.queue = queue.Queue(maxsize)
+        self.error = None
+        self.thread = threading.Thread(
+            target=self._run, name="{} writer".format(dataset), daemon=True)
+        self.thread.start()
+
+    def __str__(self):
+        return "<{}: {} ({} queued)>".format(self.__class__.__name__,
+                                             self.dataset, self.queue.qsize())
+
+    def __repr__(self):
+        return str(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def put(self, index, data):
+        """Queue a point for writing, waiting if the queue is full.
+
+        Args:
+            index (int): flat index of the point
+            data (list): values of the point
+
+        Raises:
+            RuntimeError: if the writer thread has stopped on an error.
+        """
+        while True:
+            self._check()
+            try:
+                self.queue.put((index, data), timeout=0.1)
+                return
+            except queue.Full:
+                pass
+
+    def flush(self):
+        """Wait until every queued point is written and flushed to disk.
+
+        Does nothing once the thread has stopped.
+
+        Raises:
+            RuntimeError: if the writer thread has stopped on an error.
+        """
+        done = threading.Event()
+        while self.thread.is_alive():
+            try:
+                self.queue.put((_FLUSH, done), timeout=0.1)
+                break
+            except queue.Full:
+                pass
+        while self.thread.is_alive() and not done.wait(0.1):
+            pass
+        self._check()
+
+    def close(self):
+        """Write everything still queued, flush, and stop the thread.
+
+        Safe to call more than once; call it from a finally block so data is
+        flushed on errors and KeyboardInterrupt.
+        """
+        while self.thread.is_alive():
+            try:
+                self.queue.put(_STOP, timeout=0.1)
+                break
+            except queue.Full:
+                pass
+        self.thread.join()
+        self._check()
+
+    def _check(self):
+        if self.error is not None:
+            raise RuntimeError("{} failed.".format(self)) from self.error
+
+    def _run(self):
+        """Write points until told to stop, then flush."""
+        try:
+            while True:
+                item = self.queue.get()
+                if item is _STOP:
+                    break
+                if item[0] is _FLUSH:
+                    self.dataset.flush()
+                    item[1].set()
+                    continue
+                self.dataset.write(*item)
+        except Exception as err:
+            log.exception("Writing %s failed", self.dataset)
+            self.error = err
+        finally:
+            self.dataset.close()
@@ -0,0 +1,106 @@
+import os
+import numpy as np
+import pytest
+from measurement.instruments.instrument import Instrument
+from measurement.instruments.param import ContinuousParam
+from measurement.instruments.setup import Setup
+from measurement.measurements.callables import Sweep, Getter, Measure
+from measurement.measurements.measurement import Measurement
+from measurement.util import catalog as catalog_module
+from measurement.util.catalog import Catalog
+from measurement.util.dataset import Hdf5DataSet
+
+
+class FakeInstrument(Instrument):
+    """A skeleton instrument so tests don't depend on drivers."""
+    x = ContinuousParam("V")
+    y = ContinuousParam("A")
+    temperature = ContinuousParam("K")
+
+
+class IVCurve(Measurement):
+    data_class = Hdf5DataSet
+
+
+class TestCatalog(object):
+    @pytest.fixture
+    def setup(self, tmpdir):
+        setup = Setup("test")
+        setup.add(FakeInstrument("sample"))
+        setup.add(FakeInstrument("fridge"))
+        filename = str(tmpdir.join("catalog.sqlite"))
+
+        def run(temperature, stop, name):
+            setup.fridge.temperature = temperature
+            meas = IVCurve([Sweep(setup.sample, "x", np.linspace(0, stop, 5))],
+                           Measure.gen_measure([Getter(setup.sample, "y")]),
+                           setup)
+            meas.catalog = filename
+            meas.data_options = {"filename": name + ".h5"}
+            meas.run()
+            return os.path.abspath(meas.data.filename)
+
+        with tmpdir.as_cwd():
+            files = [
+                run(1.5, 1, "a"),
+                run(4.2, 1, "b"),
+                run(1.45, 2, "c"),
+            ]
+            yield Catalog(filename), files, str(tmpdir)
+
+    def test_find(self, setup):
+        """Verify queries on each kind of condition."""
+        catalog, files, _ = setup
+        assert len(catalog) == 3
+        assert catalog.find() == files
+        assert catalog.find(measurement="IVCurve") == files
+        assert catalog.find(measurement="Measurement") == []
+        assert catalog.find(getters=["sample_y"]) == files
+        assert catalog.find(getters=["sample_x"]) == []
+        assert catalog.find(setup={"fridge.temperature": (1.4, 1.6)}) == [
+            files[0], files[2]
+        ]
+        assert catalog.find(setup={"fridge.temperature": 4.2}) == [files[1]]
+        assert catalog.find(sweeps=["sample_x"]) == files
+        assert catalog.find(sweeps={"sample_x": (1.5, 3)}) == [files[2]]
+        assert catalog.find(
+            sweeps=["sample_x"], setup={"fridge.temperature": (1, 2)},
+            before="2000-01-01") == []
+
+    def test_replace(self, setup):
+        """Verify that saving a file again replaces its entry."""
+        catalog, files, _ = setup
+
+        def count():
+            return catalog.connection.execute(
+                "SELECT COUNT(*) FROM setup").fetchone()[0]
+
+        # Params never set (None) are not indexed
+        before = count()
+        assert before == 5
+        catalog.add_entry(catalog_module.read_entry(files[0]))
+        assert len(catalog) == 3
+        assert count() == before
+
+    def test_rebuild(self, setup):
+        """Verify that the catalog can be rebuilt from the files."""
+        catalog, files, directory = setup
+        expected = catalog.find(setup={"fridge.temperature": (1.4, 1.6)})
+        catalog.close()
+        os.remove(catalog.filename)
+        catalog_module.main(["rebuild", directory])
+        rebuilt = Catalog(os.path.join(directory, catalog_module.FILENAME))
+        assert len(rebuilt) == 3
+        assert rebuilt.find(
+            setup={"fridge.temperature": (1.4, 1.6)}) == expected
+        assert rebuilt.find(sweeps={"sample_x": (1.5, 3)}) == [files[2]]
+
+    def test_keys(self, tmpdir, setup):
+        """Verify that only the chosen Setup values are indexed."""
+        _, files, _ = setup
+        catalog = Catalog(str(tmpdir.join("keys.sqlite")),
+                          keys=["fridge.temperature"])
+        for filename in files:
+            catalog.add_entry(catalog_module.read_entry(filename))
+        assert catalog.connection.execute(
+            "SELECT COUNT(*) FROM setup").fetchone()[0] == 3
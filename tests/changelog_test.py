@@ -0,0 +1,131 @@
+import numpy as np
+import pytest
+from measurement.instruments.changelog import ChangeLog
+from measurement.instruments.instrument import Instrument
+from measurement.instruments.param import (ContinuousParam, DiscreteParam,
+                                           ParamArray)
+from measurement.instruments.setup import Setup
+
+
+class FakeInstrument(Instrument):
+    """An Instrument with each type of Param."""
+    V = ContinuousParam("V")
+    gain = DiscreteParam([1, 10, 100])
+    dac = ParamArray(2, "V")
+
+
+class TestChangeLog(object):
+    @pytest.fixture
+    def setup(self):
+        setup = Setup("test")
+        for name in ["inst1", "inst2"]:
+            setup.add(FakeInstrument(name))
+        setup.inst1.V = -1
+        return setup
+
+    def run(self, setup, changelog, num=25):
+        """Step a Param through num points, changing others now and then."""
+        for i in range(num):
+            setup.inst1.V = i
+            if i % 10 == 0:
+                setup.inst2.gain = 10**(i // 10 % 3)
+            if i == 7:
+                setup.inst2.dac = [1, 2]
+            changelog.record()
+
+    def test_record(self, setup):
+        """Verify that only changed Params are recorded."""
+        changelog = ChangeLog(setup, keyframe=4)
+        self.run(setup, changelog)
+        assert len(changelog) == 25
+        assert changelog.records[1] == {changelog.names.index("inst1.V"): 1}
+        changelog.close()
+        assert setup.inst1._tracker is None
+
+    def test_state(self, setup):
+        """Verify that the full state can be rebuilt at any point."""
+        changelog = ChangeLog(setup, keyframe=4)
+        self.run(setup, changelog)
+        assert changelog.state(0)["inst1.V"] == 0
+        assert changelog.state(0)["inst2.gain"] == 1
+        assert changelog.state(0)["inst2.dac"] is None
+        assert changelog.state(6)["inst2.dac"] is None
+        assert (changelog.state(7)["inst2.dac"] == [1, 2]).all()
+        state = changelog.state(15)
+        assert state["inst1.V"] == 15
+        assert state["inst2.gain"] == 10
+        assert state["inst1.gain"] is None
+        assert changelog.state(-1)["inst1.V"] == 24
+        with pytest.raises(IndexError):
+            changelog.state(25)
+
+    def test_file(self, setup, tmpdir):
+        """Verify that a ChangeLog can be recovered from its file."""
+        filename = str(tmpdir.join("changes.log"))
+        changelog = ChangeLog(setup, filename=filename, keyframe=4)
+        self.run(setup, changelog)
+        changelog.close()
+        copy = ChangeLog.load(filename, keyframe=3)
+        assert len(copy) == len(changelog)
+        for i in range(len(changelog)):
+            state, other = changelog.state(i), copy.state(i)
+            assert state.keys() == other.keys()
+            for key in state:
+                assert np.all(state[key] == other[key])
+
+    def test_points(self, setup):
+        """Verify that records are keyed by the flat index of their point."""
+        changelog = ChangeLog(setup)
+        for point in [0, 1, 4, 5, 4]:
+            setup.inst1.V = point * 10 + len(changelog)
+            changelog.record(point)
+        assert changelog.state(4)["inst1.V"] == 44
+        assert changelog.state(5)["inst1.V"] == 53
+        with pytest.raises(IndexError):
+            changelog.state(2)
+
+    def test_append(self, setup, tmpdir):
+        """Verify that a resumed run continues the file of the first one."""
+        filename = str(tmpdir.join("changes.log"))
+        changelog = ChangeLog(setup, filename=filename)
+        for point in range(3):
+            setup.inst1.V = point
+            changelog.record(point)
+        changelog.close()
+        setup.inst2.gain = 100
+        changelog = ChangeLog(setup, filename=filename, append=True)
+        for point in range(2, 5):
+            setup.inst1.V = point
+            changelog.record(point)
+        changelog.close()
+        copy = ChangeLog.load(filename)
+        assert len(copy) == 6
+        assert copy.state(1)["inst2.gain"] is None
+        assert copy.state(2)["inst2.gain"] == 100
+        assert copy.state(4)["inst1.V"] == 4
+
+    def test_transient(self, setup):
+        """Verify that an attached ChangeLog is not written to snapshots."""
+        changelog = ChangeLog(setup)
+        assert "_tracker" not in setup.inst1.to_json()["properties"]
+        setup.to_bytes()
+        changelog.close()
+
+    def test_nested(self, setup):
+        """Verify that a nested ChangeLog hands the Setup back on close."""
+        outer = ChangeLog(setup)
+        outer.record()
+        inner = ChangeLog(setup)
+        setup.inst1.V = 3
+        inner.record()
+        setup.inst2.gain = 10
+        inner.close()
+        assert setup.inst1._tracker is outer.changed
+        outer.record()
+        assert outer.state(-1)["inst1.V"] == 3
+        assert outer.state(-1)["inst2.gain"] == 10
+        setup.inst1.V = 4
+        outer.record()
+        assert outer.state(-1)["inst1.V"] == 4
+        outer.close()
+        assert setup.inst1._tracker is None
@@ -0,0 +1,128 @@
+import pickle
+import numpy as np
+import pytest
+from measurement.instruments.instrument import Instrument
+from measurement.instruments.param import ContinuousParam
+from measurement.measurements.callables import Sweep, Getter, Measure
+from measurement.measurements.measurement import Measurement
+from measurement.util.dataset import Hdf5DataSet
+
+
+class FakeInstrument(Instrument):
+    """A skeleton instrument so tests don't depend on drivers."""
+    x = ContinuousParam("V")
+    y = ContinuousParam("V")
+
+
+class FlakyGetter(Getter):
+    """A Getter that fails at a given point to simulate a crash."""
+    __slots__ = ["fail_at", "calls"]
+
+    def __init__(self, inst, attr, fail_at=None):
+        super(FlakyGetter, self).__init__(inst, attr)
+        self.fail_at = fail_at
+        self.calls = 0
+
+    def __call__(self):
+        if self.calls == self.fail_at:
+            raise RuntimeError("helium transfer")
+        self.calls += 1
+        return 10 * self.inst.x + self.inst.y
+
+
+class TestCheckpoint(object):
+    @pytest.fixture
+    def setup(self, tmpdir):
+        inst = FakeInstrument("inst")
+
+        def measurement(fail_at=None):
+            meas = Measurement([
+                Sweep(inst, "x", np.arange(3)),
+                Sweep(inst, "y", np.arange(4))
+            ], Measure([("xy", FlakyGetter(inst, "x", fail_at))]))
+            meas.checkpoint_path = str(tmpdir.join("run.ckpt"))
+            return meas
+
+        with tmpdir.as_cwd():
+            yield inst, measurement
+
+    @pytest.mark.parametrize("data_class", [Measurement.data_class,
+                                            Hdf5DataSet])
+    def test_resume(self, setup, data_class):
+        """Verify that a crashed run continues where it stopped."""
+        inst, measurement = setup
+        expected = 10 * np.arange(3)[:, None] + np.arange(4)
+        crashed = measurement(fail_at=6)
+        crashed.data_class = data_class
+        with pytest.raises(RuntimeError):
+            crashed.run()
+        assert crashed.data.index == 6
+        # Move the instrument away, as after a power cycle
+        inst.x, inst.y = 0, 0
+        resumed = measurement()
+        resumed.data_class = data_class
+        resumed.resume(crashed.checkpoint_path)
+        # Only the points after the crash are measured again
+        assert resumed.measure["xy"].calls == 6
+        np.testing.assert_array_equal(resumed.data.xy, expected)
+        assert resumed.data.filename == crashed.data.filename
+        if data_class is Hdf5DataSet:
+            data = Hdf5DataSet(None, None, crashed.data.filename).load()
+            np.testing.assert_array_equal(data.xy, expected)
+
+    def test_file_checkpoint(self, setup):
+        """Verify that a DataSet on disk is flushed, not copied, by a
+        checkpoint."""
+        _, measurement = setup
+        meas = measurement()
+        meas.data_class = Hdf5DataSet
+        meas.checkpoint_interval = 0
+        meas.run()
+        with open(meas.checkpoint_path, "rb") as f:
+            state = pickle.load(f)
+        assert "data" not in state
+        assert state["index"] == 12
+
+    @pytest.mark.parametrize("data_class", [Measurement.data_class,
+                                            Hdf5DataSet])
+    def test_nested(self, setup, tmpdir, data_class):
+        """Verify that the DataSets of nested Measurements are restored."""
+        inst, _ = setup
+
+        def measurement(fail_at=None):
+            line = Measurement([Sweep(inst, "y", np.arange(4))],
+                               Measure([("xy", FlakyGetter(inst, "x",
+                                                           fail_at))]))
+            meas = Measurement([Sweep(inst, "x", np.arange(3))],
+                               Measure([("x", Getter(inst, "x")),
+                                        ("line", line)]))
+            meas.data_class = data_class
+            return meas
+
+        crashed = measurement(fail_at=6)
+        crashed.checkpoint_path = str(tmpdir.join("run.ckpt"))
+        with pytest.raises(RuntimeError):
+            crashed.run()
+        resumed = measurement()
+        resumed.resume(crashed.checkpoint_path)
+        # The line the crash interrupted is measured again
+        assert resumed.measure["line"].measure["xy"].calls == 8
+        np.testing.assert_array_equal(resumed.data.x, np.arange(3))
+        for x in range(3):
+            child = resumed.data.get_child("line", (x, ))
+            np.testing.assert_array_equal(child.xy, 10 * x + np.arange(4))
+
+    def test_setpoints(self, setup, monkeypatch):
+        """Verify that swept Params are set back before continuing."""
+        inst, measurement = setup
+        crashed = measurement(fail_at=5)
+        with pytest.raises(RuntimeError):
+            crashed.run()
+        inst.x, inst.y = 0, 0
+        ramps = []
+        monkeypatch.setattr(
+            Measurement, "run", lambda self, state: ramps.append(
+                (inst.x, inst.y)))
+        measurement().resume(crashed.checkpoint_path)
+        # The crash happened while measuring point (1, 1)
+        assert ramps == [(1, 1)]
@@ -0,0 +1,396 @@
+from datetime import datetime
+import numpy as np
+import pytest
+from measurement.instruments.instrument import Instrument
+from measurement.instruments.param import ContinuousParam
+from measurement.measurements.callables import Sweep, Getter, Measure
+from measurement.measurements.measurement import Measurement, MeasureTime
+from measurement.util.dataset import (Hdf5DataSet, RingDataSet, chunk_shape,
+                                      default_filename)
+
+
+class FakeInstrument(Instrument):
+    """A skeleton instrument so tests don't depend on drivers."""
+    x = ContinuousParam("V")
+    y = ContinuousParam("V")
+    counts = ContinuousParam()
+    flag = ContinuousParam()
+
+
+class TestHdf5DataSet(object):
+    @pytest.fixture
+    def setup(self, tmpdir):
+        inst = FakeInstrument("inst")
+        meas = Measurement([
+            Sweep(inst, "x", np.arange(3)),
+            Sweep(inst, "y", np.arange(4))
+        ], Measure.gen_measure([Getter(inst, "x"), Getter(inst, "y")]))
+        meas.data_class = Hdf5DataSet
+        with tmpdir.as_cwd():
+            yield meas
+
+    def test_run(self, setup):
+        """Verify that points written during a run can be loaded."""
+        setup.run()
+        data = Hdf5DataSet(None, None, setup.data.filename).load()
+        assert data.shape == (3, 4)
+        assert data.inst_x.units == "V"
+        np.testing.assert_array_equal(data.inst_x, setup.data.inst_x)
+        np.testing.assert_array_equal(data.inst_y, setup.data.inst_y)
+        assert data.metadata["git_hash"] == setup.data.metadata["git_hash"]
+
+    def test_filename(self, setup, tmpdir):
+        """Verify that runs started in the same second get their own file."""
+        first = Hdf5DataSet.from_measure(setup.measure, setup.shape)
+        second = Hdf5DataSet.from_measure(setup.measure, setup.shape)
+        assert first.filename != second.filename
+        stamp = datetime(2020, 1, 2, 3, 4, 5)
+        tmpdir.join("2020-01-02_030405_measurement.h5").write("")
+        assert (default_filename(stamp, ".h5") ==
+                "2020-01-02_030405_measurement_2.h5")
+        assert (default_filename(stamp, ".h5") ==
+                "2020-01-02_030405_measurement_3.h5")
+
+    def test_save(self, setup):
+        """Verify that a DataSet can be written all at once."""
+        data = Hdf5DataSet.from_measure(setup.measure, setup.shape)
+        data.append([1, 2])
+        data.save()
+        copy = Hdf5DataSet(None, None, data.filename).load()
+        assert copy.inst_x[0, 0] == 1
+        assert np.isnan(copy.inst_x[0, 1])
+
+    def test_dtype(self, setup):
+        """Verify that Getters choose the dtype of their DataArray."""
+        inst = setup.sweeps[0].inst
+        inst.counts = 7
+        inst.flag = True
+        setup.measure = Measure.gen_measure([
+            Getter(inst, "x", "float32"),
+            Getter(inst, "counts", np.int16),
+            Getter(inst, "flag", bool)
+        ])
+        setup.run()
+        data = Hdf5DataSet(None, None, setup.data.filename).load()
+        assert data.inst_x.dtype == np.float32
+        assert data.inst_counts.dtype == np.int16
+        assert data.inst_flag.dtype == bool
+        assert (data.inst_counts == 7).all()
+        assert data.inst_flag.all()
+
+    def test_compression(self, setup):
+        """Verify that compression filters are applied to each DataArray."""
+        h5py = pytest.importorskip("h5py")
+        setup.data_options = {
+            "compression": "gzip",
+            "shuffle": True,
+            "filters": {
+                "inst_y": {
+                    "compression": "lzf"
+                }
+            }
+        }
+        setup.run()
+        with h5py.File(setup.data.filename, "r") as f:
+            assert f["inst_x"].compression == "gzip"
+            assert f["inst_x"].shuffle
+            assert f["inst_y"].compression == "lzf"
+            assert f["inst_x"].chunks == (3, 4)
+        data = Hdf5DataSet(None, None, setup.data.filename).load()
+        np.testing.assert_array_equal(data.inst_y, setup.data.inst_y)
+
+
+def test_chunk_shape():
+    """Verify that chunks hold whole lines of the inner sweep."""
+    assert chunk_shape((10, 20), 8) == (10, 20)
+    assert chunk_shape((1000, 1000), 8, size=8000) == (1, 1000)
+    assert chunk_shape((1000, 100), 8, size=8000) == (10, 100)
+    assert chunk_shape((10, 10**6), 8, size=8000) == (1, 1000)
+
+
+class TestNested(object):
+    @pytest.fixture
+    def setup(self, tmpdir):
+        inst = FakeInstrument("inst")
+        touchdown = Measurement([Sweep(inst, "y", np.arange(5))],
+                                Measure.gen_measure([Getter(inst, "x")]))
+        grid = Measurement([
+            Sweep(inst, "x", np.arange(2)),
+            Sweep(inst, "counts", np.arange(3))
+        ], Measure([("counts", Getter(inst, "counts")),
+                    ("touchdown", touchdown)]))
+        with tmpdir.as_cwd():
+            yield grid
+
+    def test_memory(self, setup):
+        """Verify that nested DataSets can be found by grid point."""
+        setup.run()
+        assert len(setup.data.touchdown) == 6
+        child = setup.data.get_child("touchdown", (1, 2))
+        assert child.shape == (5, )
+        assert (child.inst_x == 1).all()
+        assert setup.data.lookup["touchdown"][1, 2] == 5
+
+    def test_file(self, setup, tmpdir):
+        """Verify that nested DataSets are stored in a single file."""
+        setup.data_class = Hdf5DataSet
+        setup.run()
+        assert tmpdir.listdir() == [tmpdir.join(setup.data.filename)]
+        data = Hdf5DataSet(None, None, setup.data.filename).load()
+        np.testing.assert_array_equal(data.lookup["touchdown"],
+                                      [[0, 1, 2], [3, 4, 5]])
+        child = data.get_child("touchdown", (1, 0))
+        assert child.shape == (5, )
+        assert (child.inst_x == 1).all()
+        np.testing.assert_array_equal(data.counts, [[0, 1, 2]] * 2)
+
+
+class CountingGetter(Getter):
+    """A Getter returning 0, 1, 2, ... that stops the run after num calls."""
+    __slots__ = ["num", "calls"]
+
+    def __init__(self, inst, attr, num):
+        super(CountingGetter, self).__init__(inst, attr)
+        self.num = num
+        self.calls = 0
+
+    def __call__(self):
+        if self.calls == self.num:
+            raise KeyboardInterrupt
+        self.calls += 1
+        return self.calls - 1
+
+
+class TestRingDataSet(object):
+    @pytest.fixture
+    def setup(self, tmpdir):
+        inst = FakeInstrument("inst")
+        with tmpdir.as_cwd():
+            yield inst
+
+    def test_append(self, setup):
+        """Verify that old points are overwritten once the buffer is full."""
+        data = RingDataSet.from_measure(
+            Measure.gen_measure([Getter(setup, "x")]), (4, ), metadata={})
+        for i in range(3):
+            data.append([i])
+        np.testing.assert_array_equal(data.recent("inst_x"), [0, 1, 2])
+        for i in range(3, 10):
+            data.append([i])
+        assert data.inst_x.shape == (4, )
+        np.testing.assert_array_equal(data.recent("inst_x"), [6, 7, 8, 9])
+
+    def test_open_ended(self, setup):
+        """Verify that an open-ended series is streamed to file."""
+        meas = MeasureTime(0, None,
+                           Measure([("n", CountingGetter(setup, "x", 25))]),
+                           buffer=8, chunk=4)
+        with pytest.raises(KeyboardInterrupt):
+            meas.run()
+        assert meas.data.index == 25
+        assert meas.data.n.shape == (8, )
+        np.testing.assert_array_equal(meas.data.recent("n"),
+                                      np.arange(17, 25))
+        data = RingDataSet(None, None, meas.data.filename).load()
+        assert data.n.units == "V"
+        np.testing.assert_array_equal(data.n, np.arange(25))
+
+    def test_buffer_required(self, setup):
+        """Verify that an open-ended MeasureTime needs a buffer."""
+        with pytest.raises(ValueError):
+            MeasureTime(1, None, Measure.gen_measure([Getter(setup, "x")]))
+
+    def test_pyramid(self, setup):
+        """Verify that windows are read at the requested resolution."""
+        values = np.random.RandomState(0).normal(size=1000)
+        measure = Measure.gen_measure([Getter(setup, "x")])
+        data = RingDataSet.from_measure(measure, (10, ), chunk=64,
+                                        metadata={})
+        data.open()
+        for value in values:
+            data.write(data.append([value]), [value])
+        data.close()
+        index, low, high, mean = data.window("inst_x", 100, 900, num=100)
+        # 800 points at >= 100 points of resolution: the blocks of 8
+        # overlapping the window
+        np.testing.assert_array_equal(index, np.arange(96, 904, 8))
+        blocks = values[96:904].reshape(-1, 8)
+        np.testing.assert_allclose(low, blocks.min(axis=1))
+        np.testing.assert_allclose(high, blocks.max(axis=1))
+        np.testing.assert_allclose(mean, blocks.mean(axis=1))
+        index, low, high, mean = data.window("inst_x", 10, 20)
+        np.testing.assert_array_equal(index, np.arange(10, 20))
+        np.testing.assert_array_equal(mean, values[10:20])
+
+    def test_pyramid_resume(self, setup):
+        """Verify that a continued file extends the Pyramid correctly."""
+        values = np.arange(300, dtype=float)
+        measure = Measure.gen_measure([Getter(setup, "x")])
+        data = RingDataSet.from_measure(measure, (10, ), chunk=16,
+                                        metadata={})
+        data.open()
+        for value in values:
+            data.write(data.append([value]), [value])
+        data.close()
+        # Continue from a checkpoint taken at point 203
+        copy = RingDataSet.from_measure(measure, (10, ), data.filename,
+                                        chunk=16, metadata={})
+        copy.restore({}, 203, {})
+        copy.open()
+        for value in values[203:]:
+            copy.write(copy.append([value]), [value])
+        copy.close()
+        _, low, high, mean = copy.window("inst_x", num=4)
+        blocks = values[:256].reshape(-1, 64)
+        np.testing.assert_array_equal(low, blocks.min(axis=1))
+        np.testing.assert_array_equal(high, blocks.max(axis=1))
+        np.testing.assert_array_equal(mean, blocks.mean(axis=1))
+
+    @pytest.mark.parametrize("count", [100, 203])
+    def test_pyramid_resume_levels(self, setup, count):
+        """Verify that levels beyond the checkpoint are dropped on resume."""
+        values = np.arange(300, dtype=float)
+        measure = Measure.gen_measure([Getter(setup, "x")])
+        data = RingDataSet.from_measure(measure, (10, ), chunk=16,
+                                        metadata={})
+        data.open()
+        for value in values:
+            data.write(data.append([value]), [value])
+        data.close()
+        copy = RingDataSet.from_measure(measure, (10, ), data.filename,
+                                        chunk=16, metadata={})
+        copy.restore({}, count, {})
+        copy.open()
+        for value in values[count:]:
+            copy.write(copy.append([value]), [value])
+        copy.close()
+        index, low, high, mean = copy.window("inst_x", num=1)
+        np.testing.assert_array_equal(index, [0])
+        np.testing.assert_array_equal(low, [0])
+        np.testing.assert_array_equal(high, [255])
+        np.testing.assert_array_equal(mean, [127.5])
+
+    def test_resume_queued(self, setup):
+        """Verify that points queued at a crash are written from the ring."""
+        measure = Measure.gen_measure([Getter(setup, "x")])
+        data = RingDataSet.from_measure(measure, (8, ), chunk=4, metadata={})
+        data.open()
+        for value in range(14):
+            index = data.append([value])
+            if value < 8:
+                data.write(index, [value])
+        # Hard crash: 8 and up were still waiting in the Writer
+        data.pending = []
+        data.close()
+        copy = RingDataSet.from_measure(measure, (8, ), data.filename,
+                                        chunk=4, metadata={})
+        copy.restore({"inst_x": np.array(data.inst_x)}, 14, {})
+        copy.open()
+        copy.close()
+        np.testing.assert_array_equal(
+            RingDataSet(None, None, data.filename).load().inst_x,
+            np.arange(14))
+        index, low, high, mean = copy.window("inst_x", 0, 12, num=6)
+        np.testing.assert_array_equal(index, np.arange(0, 12, 2))
+        np.testing.assert_array_equal(low, np.arange(0, 12, 2))
+        np.testing.assert_array_equal(high, np.arange(1, 12, 2))
+
+    def test_reload(self, setup):
+        """Verify that the ring is refilled from the file on resume."""
+        measure = Measure.gen_measure([Getter(setup, "x")])
+        data = RingDataSet.from_measure(measure, (8, ), chunk=4, metadata={})
+        data.open()
+        for value in range(14):
+            data.write(data.append([value]), [value])
+        data.close()
+        copy = RingDataSet.from_measure(measure, (8, ), data.filename,
+                                        chunk=4, metadata={})
+        copy.reload(14)
+        np.testing.assert_array_equal(copy.recent("inst_x"), np.arange(6, 14))
+
+    def test_pyramid_rebuild(self, setup):
+        """Verify that levels cut short by a crash are rebuilt."""
+        measure = Measure.gen_measure([Getter(setup, "x")])
+        data = RingDataSet.from_measure(measure, (8, ), chunk=4, metadata={})
+        data.open()
+        for value in range(16):
+            data.write(data.append([value]), [value])
+        data.close()
+        import h5py
+        with h5py.File(data.filename, "a") as f:
+            f["pyramid/inst_x/2"].resize((1, 3))
+        copy = RingDataSet.from_measure(measure, (8, ), data.filename,
+                                        chunk=4, metadata={})
+        copy.restore({"inst_x": np.array(data.inst_x)}, 16, {})
+        copy.open()
+        copy.close()
+        _, low, high, mean = copy.window("inst_x", num=4)
+        np.testing.assert_array_equal(low, [0, 4, 8, 12])
+        np.testing.assert_array_equal(high, [3, 7, 11, 15])
+
+
+class TestSel(object):
+    @pytest.fixture
+    def setup(self, tmpdir):
+        inst = FakeInstrument("inst")
+        meas = Measurement([
+            Sweep(inst, "x", np.array([2., 1., 0.])),
+            Sweep(inst, "y", np.linspace(0, 1.5, 4))
+        ], Measure.gen_measure([Getter(inst, "x"), Getter(inst, "y")]))
+        with tmpdir.as_cwd():
+            yield meas
+
+    def test_coords(self, setup):
+        """Verify that the setpoints of each sweep are stored."""
+        setup.run()
+        assert list(setup.data.coords) == ["inst_x", "inst_y"]
+        np.testing.assert_array_equal(setup.data.coords["inst_x"], [2, 1, 0])
+
+    def test_value(self, setup):
+        """Verify selecting lines by exact and nearest values."""
+        setup.run()
+        line = setup.data.inst_y.sel(inst_x=1)
+        np.testing.assert_array_equal(line, [0, 0.5, 1, 1.5])
+        assert np.shares_memory(line, setup.data.inst_y)
+        # Param names work when they are not ambiguous
+        line = setup.data.inst_x.sel(y=0.6, method="nearest")
+        np.testing.assert_array_equal(line, [2, 1, 0])
+        assert line.coords[0].name == "inst_x"
+        assert setup.data.inst_x.sel(x=0, y=1.5) == 0
+        with pytest.raises(KeyError):
+            setup.data.inst_y.sel(x=0.5)
+        with pytest.raises(KeyError):
+            setup.data.inst_y.sel(z=0.5)
+
+    def test_range(self, setup):
+        """Verify that ranges of sorted sweeps select views."""
+        setup.run()
+        block = setup.data.inst_y.sel(x=slice(0.5, 2), y=slice(0.4, None))
+        np.testing.assert_array_equal(block, [[0.5, 1, 1.5]] * 2)
+        assert np.shares_memory(block, setup.data.inst_y)
+        np.testing.assert_array_equal(block.coords[0].values, [2, 1])
+        # Selections can be refined further
+        np.testing.assert_array_equal(block.sel(y=1), [1, 1])
+
+    def test_unsorted(self, setup):
+        """Verify ranges of sweeps that go back and forth."""
+        setup.sweeps[0] = Sweep(setup.sweeps[0].inst, "x",
+                                np.array([0., 2., 1.]))
+        setup.run()
+        x = setup.data.inst_x.sel(x=slice(None, 1), y=0)
+        np.testing.assert_array_equal(x, [0, 1])
+
+    def test_dataset(self, setup):
+        """Verify selecting from a whole DataSet, also after loading."""
+        setup.data_class = Hdf5DataSet
+        setup.run()
+        data = Hdf5DataSet(None, None, setup.data.filename).load()
+        np.testing.assert_array_equal(data.coords["inst_y"],
+                                      setup.data.coords["inst_y"])
+        line = data.sel(method="nearest", x=0.9)
+        assert line.shape == (4, )
+        np.testing.assert_array_equal(line.inst_x, [1] * 4)
+        np.testing.assert_array_equal(line.inst_y, [0, 0.5, 1, 1.5])
+        assert list(line.coords) == ["inst_y"]
+        # The original is untouched
+        assert data.inst_x.shape == (3, 4)
@@ -0,0 +1,34 @@
+import os
+import subprocess
+import sys
+import pytest
+from measurement.instruments.base import Loadable, find_class
+from measurement.instruments.drivers.test_instrument import FakeInstrument
+
+
+def imported_modules(module):
+    """Return the names of all modules loaded by importing module."""
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(sys.path)
+    code = "import sys, {}; print(' '.join(sys.modules))".format(module)
+    out = subprocess.check_output([sys.executable, "-c", code], env=env)
+    return out.decode().split()
+
+
+class TestImport(object):
+    @pytest.mark.parametrize("module", [
+        "measurement.util.dataset", "measurement.measurements.measurement"
+    ])
+    def test_lazy_git(self, module):
+        """Verify that GitPython is not imported with the package."""
+        assert "git" not in imported_modules(module)
+
+    def test_registry(self):
+        """Verify that Loadables register themselves when defined."""
+        assert find_class(FakeInstrument.__module__,
+                          "FakeInstrument") is FakeInstrument
+
+        class Local(Loadable):
+            pass
+
+        assert find_class(__name__, "Local") is Local
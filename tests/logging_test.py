@@ -0,0 +1,146 @@
+import logging
+import threading
+import pytest
+from measurement.instruments.instrument import Instrument
+from measurement.instruments.param import ContinuousParam
+from measurement.measurements.callables import Setter
+from measurement.util import logging as mlogging
+
+
+class FakeInstrument(Instrument):
+    """A skeleton instrument so tests don't depend on drivers."""
+    x = ContinuousParam("V")
+
+
+class Recorder(object):
+    """Remember the thread each message was formatted in."""
+
+    def __init__(self):
+        self.threads = []
+
+    def __str__(self):
+        self.threads.append(threading.current_thread())
+        return "recorder"
+
+
+class CountingSetter(Setter):
+    """A Setter counting how often it is formatted."""
+    __slots__ = ["formatted"]
+
+    def __init__(self, inst, attr, val):
+        super(CountingSetter, self).__init__(inst, attr, val)
+        self.formatted = 0
+
+    def __str__(self):
+        self.formatted += 1
+        return super(CountingSetter, self).__str__()
+
+
+class FakeClock(object):
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
+
+
+class TestQueueLogging(object):
+    @pytest.fixture
+    def setup(self, tmpdir):
+        filename = str(tmpdir.join("test.log"))
+        handler, listener = mlogging.queue_log(mlogging.file_log(filename))
+        # Not registered with logging, so pytest's handlers don't see it
+        logger = logging.Logger("test", logging.DEBUG)
+        logger.addHandler(handler)
+        return logger, listener, filename
+
+    def test_lazy(self, setup):
+        """Verify that messages are formatted by the listener thread."""
+        logger, listener, filename = setup
+        recorder = Recorder()
+        logger.info("point %s", recorder)
+        listener.stop()
+        assert len(recorder.threads) == 1
+        assert recorder.threads[0] is not threading.current_thread()
+        with open(filename) as f:
+            assert "point recorder" in f.read()
+
+    def test_setup(self, tmpdir):
+        """Verify that setup writes to file once stopped."""
+        filename = str(tmpdir.join("setup.log"))
+        logger = mlogging.setup("measurement.test", console=False,
+                                filename=filename, rate=10)
+        logger.setLevel(logging.INFO)
+        try:
+            logger.info("point %d", 1)
+            logger.info("point %d", 2)
+            logger.warning("point %d", 3)
+        finally:
+            mlogging.stop()
+            logger.handlers = []
+            logger.setLevel(logging.NOTSET)
+        with open(filename) as f:
+            text = f.read()
+        assert "point 1" in text
+        # Dropped by the rate limit
+        assert "point 2" not in text
+        # Warnings are not limited
+        assert "point 3" in text
+
+    def test_setter(self):
+        """Verify that Setters don't format messages nobody reads."""
+        inst = FakeInstrument("inst")
+        setter = CountingSetter(inst, "x", 1)
+        logger = logging.getLogger("measurement.measurements.callables")
+        logger.setLevel(logging.INFO)
+        setter()
+        assert inst.x == 1
+        assert setter.formatted == 0
+        logger.setLevel(logging.DEBUG)
+        setter()
+        assert setter.formatted >= 1
+        logger.setLevel(logging.NOTSET)
+
+
+def test_rate_limit():
+    """Verify that repeated messages are thinned to the rate."""
+    clock = FakeClock()
+    limit = mlogging.RateLimitFilter(rate=2, clock=clock)
+
+    def record(msg):
+        return logging.LogRecord("test", logging.INFO, __file__, 0, msg,
+                                 (), None)
+
+    passed = []
+    for i in range(100):
+        clock.now = i * 0.01
+        passed.append(limit.filter(record("point %s")))
+    # One record at once and then two per second over 0.99 s
+    assert sum(passed) == 2
+    # Other messages are not limited by the burst of "point %s"
+    assert limit.filter(record("other"))
+    clock.now = 1.5
+    rec = record("point %s")
+    assert limit.filter(rec)
+    # Dropped since the record passed at 0.5 s
+    assert rec.suppressed == 49
+
+
+def test_rate_limit_warnings():
+    """Verify that warnings are never dropped and drops are reported."""
+    clock = FakeClock()
+    limit = mlogging.RateLimitFilter(rate=1, clock=clock)
+
+    def record(level):
+        return logging.LogRecord("test", level, __file__, 0, "point %s",
+                                 (3, ), None)
+
+    assert all(limit.filter(record(logging.WARNING)) for _ in range(10))
+    assert limit.filter(record(logging.INFO))
+    assert not limit.filter(record(logging.INFO))
+    clock.now = 1
+    rec = record(logging.INFO)
+    assert limit.filter(rec)
+    formatter = mlogging.SuppressedFormatter("%(message)s")
+    assert formatter.format(rec) == "point 3 (1 similar suppressed)"
+    assert formatter.format(record(logging.INFO)) == "point 3"
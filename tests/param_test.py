@@ -1,6 +1,9 @@
+import numpy as np
 import pytest
-from measurement.instruments.param import Param, DiscreteParam, ContinuousParam
+from measurement.instruments.param import (Param, DiscreteParam,
+                                           ContinuousParam, ParamArray)
 from measurement.instruments.instrument import Instrument
+from measurement.measurements.callables import Sweep
 from datetime import datetime
 
 
@@ -22,7 +25,7 @@ class FakeInstrument(Instrument):
         self.update_validator("single_limit", {"minimum": 1})
         # Manually set starting values for testing
         for attr in ["val_limit", "sweep_limit", "single_limit"]:
-            self.__dict__[attr] = 0
+            self.update_validator(attr, {"value": 0})
 
 
 class TestContinuousParam(object):
@@ -84,6 +87,34 @@ class TestContinuousParam(object):
         with pytest.raises(ValueError):
             setup.sweep_limit = 0.5
 
+    def test_validator(self, setup):
+        """Verify that instance-level data is kept in slotted Validators."""
+        validator = setup.get_validator("val_limit")
+        assert not hasattr(validator, "__dict__")
+        assert validator.minimum == -1
+        setup.val_limit = 0.5
+        assert validator.value == 0.5
+
+    def test_snapshot(self, setup):
+        """Verify that a snapshot records the value and limits of each Param.
+        """
+        setup.val_limit = 0.5
+        snap = setup.snapshot()
+        assert list(snap["name"]) == [
+            "no_limit", "val_limit", "sweep_limit", "single_limit"
+        ]
+        assert snap[1]["value"] == 0.5
+        assert snap[1]["maximum"] == 1
+        assert np.isnan(snap[0]["minimum"])
+
+    def test_snapshot_long_name(self):
+        """Verify that long Param names are not truncated in a snapshot."""
+        name = "gate_voltage_of_the_left_plunger_of_dot_2"
+        long_names = type("LongNames", (Instrument, ),
+                          {name: ContinuousParam("V")})
+        snap = long_names("long").snapshot()
+        assert snap["name"][0] == name
+
 
 class DiscreteInstrument(Instrument):
     """An container for various Parameters.
@@ -132,3 +163,57 @@ class TestDiscreteParam(object):
             setup.string = 5
         with pytest.raises(ValueError):
             setup.string = "d"
+
+
+class ArrayInstrument(Instrument):
+    """An Instrument with a multi-channel ParamArray."""
+    dac = ParamArray(4, "V", minimum=-1, maximum=[1, 1, 2, 2])
+    ramped = ParamArray(3, "V", rate=[10, 20, 40], step=[0.1, 0.1, 0.5])
+
+    def __init__(self, name="test"):
+        super(ArrayInstrument, self).__init__(name)
+
+
+class TestParamArray(object):
+    @pytest.fixture
+    def setup(self):
+        return ArrayInstrument()
+
+    def test_setting(self, setup):
+        """Test that all channels are set at once."""
+        setup.dac = np.array([0, 0.5, 1.5, -1])
+        assert (setup.dac == [0, 0.5, 1.5, -1]).all()
+        setup.dac = 0.25
+        assert (setup.dac == 0.25).all()
+
+    def test_limits(self, setup):
+        """Test that each channel is checked against its own limits."""
+        with pytest.raises(ValueError):
+            setup.dac = [0, 0, 0, 2.5]
+        with pytest.raises(ValueError):
+            setup.dac = [1.5, 0, 0, 0]
+        setup.update_validator("dac", {"maximum": 0.5})
+        with pytest.raises(ValueError):
+            setup.dac = [0, 0, 1, 0]
+
+    def test_ramp(self, setup, monkeypatch):
+        """Verify that channels ramp together within their own limits."""
+        writes = []
+        monkeypatch.setattr(ParamArray, "_set",
+                            lambda self, inst, val: writes.append(val))
+        monkeypatch.setattr("time.sleep", lambda delay: None)
+        setup.update_validator("ramped", {"value": np.zeros(3)})
+        setup.ramped = [1, 1, 1]
+        steps = np.diff(np.vstack([np.zeros(3)] + writes), axis=0)
+        # Channels 0 and 1 need 10 steps, channel 2 only 2
+        assert len(writes) == 10
+        assert (np.abs(steps) <= [0.1 + 1e-12, 0.1 + 1e-12, 0.5]).all()
+        assert (writes[-1] == 1).all()
+
+    def test_sweep(self, setup):
+        """Verify that a Sweep can step through vector-valued setpoints."""
+        vals = np.linspace([0, 0, 0, 0], [1, -1, 2, 2], 5)
+        sweep = Sweep(setup, "dac", vals)
+        for setter, val in zip(sweep, vals):
+            setter()
+            assert (setup.dac == val).all()
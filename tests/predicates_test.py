@@ -0,0 +1,117 @@
+import numpy as np
+import pytest
+from measurement.instruments.instrument import Instrument
+from measurement.instruments.param import ContinuousParam
+from measurement.measurements.callables import Sweep, Setter, Getter, Measure
+from measurement.measurements.measurement import Measurement
+from measurement.util.dataset import Hdf5DataSet
+
+
+class Scanner(Instrument):
+    """A scanner over a tilted sample: contact once z reaches x."""
+    x = ContinuousParam("V")
+    y = ContinuousParam("V")
+    z = ContinuousParam("V")
+
+
+class Capacitance(Getter):
+    """Read 1 in contact with the sample and 0 otherwise."""
+    __slots__ = []
+
+    def __init__(self, inst):
+        super(Capacitance, self).__init__(inst, "z")
+
+    def __call__(self):
+        return float(self.inst.z >= self.inst.x)
+
+
+def touched(point):
+    return point["cap"] > 0
+
+
+class TestPredicates(object):
+    @pytest.fixture
+    def setup(self, tmpdir):
+        inst = Scanner("scanner")
+        retract = Setter(inst, "z", -1)
+
+        def measurement(**rules):
+            return Measurement([
+                Sweep(inst, "x", np.arange(4), **rules.get("x", {})),
+                Sweep(inst, "z", np.arange(6), after=retract,
+                      **rules.get("z", {}))
+            ], Measure([("cap", Capacitance(inst)), ("z", Getter(inst,
+                                                                 "z"))]))
+
+        with tmpdir.as_cwd():
+            yield inst, measurement
+
+    def test_stop_inner(self, setup):
+        """Verify that a touchdown ends the line and retracts."""
+        inst, measurement = setup
+        meas = measurement(z={"stop": touched})
+        meas.run()
+        sampled = np.arange(6) <= np.arange(4)[:, None]
+        np.testing.assert_array_equal(meas.data.sampled, sampled)
+        np.testing.assert_array_equal(np.isnan(meas.data.z), ~sampled)
+        np.testing.assert_array_equal(meas.data.z[sampled],
+                                      [0, 0, 1, 0, 1, 2, 0, 1, 2, 3])
+        assert inst.z == -1
+
+    def test_skip_outer(self, setup):
+        """Verify that skip moves on to the next outer setpoint."""
+        _, measurement = setup
+        meas = measurement(x={"skip": touched})
+        meas.run()
+        np.testing.assert_array_equal(
+            meas.data.sampled,
+            np.arange(6) <= np.arange(4)[:, None])
+
+    def test_stop_outer(self, setup):
+        """Verify that stop on the outer Sweep ends the Measurement."""
+        inst, measurement = setup
+        meas = measurement(x={"stop": lambda point: point["z"] == 2})
+        meas.run()
+        assert meas.data.sampled.sum() == 3
+        np.testing.assert_array_equal(np.flatnonzero(meas.data.sampled),
+                                      [0, 1, 2])
+        # The inner Sweep still retracted
+        assert inst.z == -1
+
+    def test_file(self, setup):
+        """Verify that the sampled region is written to file."""
+        _, measurement = setup
+        meas = measurement(z={"stop": touched})
+        meas.data_class = Hdf5DataSet
+        meas.run()
+        data = Hdf5DataSet(None, None, meas.data.filename).load()
+        np.testing.assert_array_equal(data.sampled, meas.data.sampled)
+        assert "_sampled" not in data.arrays()
+
+    def test_resume_after_stop(self, setup, tmpdir):
+        """Verify that a run interrupted while retracting stays stopped."""
+        inst, measurement = setup
+
+        def power_cut():
+            raise KeyboardInterrupt
+
+        crashed = measurement(z={"stop": touched})
+        crashed.checkpoint_path = str(tmpdir.join("run.ckpt"))
+        crashed.sweeps[1].after = power_cut
+        with pytest.raises(KeyboardInterrupt):
+            crashed.run()
+        assert crashed.data.index == 1
+        resumed = measurement(z={"stop": touched})
+        resumed.resume(crashed.checkpoint_path)
+        sampled = np.arange(6) <= np.arange(4)[:, None]
+        np.testing.assert_array_equal(resumed.data.sampled, sampled)
+        np.testing.assert_array_equal(resumed.data.z[sampled],
+                                      [0, 0, 1, 0, 1, 2, 0, 1, 2, 3])
+        assert inst.z == -1
+
+    def test_compose(self, setup):
+        """Verify that predicates survive composing Sweeps."""
+        inst, _ = setup
+        sweep = Sweep(inst, "z", np.arange(3), stop=touched)
+        assert sweep.reverse().stop is touched
+        assert (sweep + sweep).stop is touched
@@ -0,0 +1,130 @@
+import os
+import subprocess
+import sys
+import numpy as np
+import pytest
+from measurement.instruments.instrument import Instrument
+from measurement.instruments.param import ContinuousParam
+from measurement.instruments.setup import Setup
+from measurement.measurements.callables import Sweep, Getter, Measure
+from measurement.measurements.measurement import Measurement
+from measurement.util.dataset import DataSet
+from measurement.util.publish import (Publisher, Subscriber, remove,
+                                     _attach)
+
+
+class FakeInstrument(Instrument):
+    """A skeleton instrument so tests don't depend on drivers."""
+    x = ContinuousParam("V")
+
+
+class FullDiskDataSet(DataSet):
+    """A DataSet whose writes fail."""
+
+    def write(self, index, data):
+        raise IOError("disk full")
+
+
+class TestPublish(object):
+    @pytest.fixture
+    def setup(self):
+        inst = FakeInstrument("inst")
+        measure = Measure.gen_measure([Getter(inst, "x")])
+        data = DataSet.from_measure(measure, (3, 2), metadata={})
+        publisher = Publisher(data, "test_publish_{}".format(os.getpid()))
+        yield data, publisher
+        publisher.close()
+
+    def test_zero_copy(self, setup):
+        """Verify that readers see new points without copying."""
+        data, publisher = setup
+        sub = Subscriber(publisher.name)
+        assert sub.shape == (3, 2)
+        assert sub.inst_x.units == "V"
+        assert np.isnan(sub.inst_x).all()
+        data.append([1.5])
+        publisher.update()
+        assert sub.wait(timeout=1)
+        assert sub.index == 1
+        assert sub.inst_x[0, 0] == 1.5
+        assert not sub.wait(timeout=0.01)
+        with pytest.raises(ValueError):
+            sub.inst_x[0, 1] = 0
+        sub.close()
+
+    def test_process(self, setup):
+        """Verify that another process can map the data."""
+        data, publisher = setup
+        data.append([2.0])
+        data.append([3.0])
+        publisher.update()
+        code = ("from measurement.util.publish import Subscriber\n"
+                "sub = Subscriber({!r})\n"
+                "print(sub.index, float(sub.inst_x[0].sum()))\n"
+                "sub.close()".format(publisher.name))
+        env = dict(os.environ)
+        env["PYTHONPATH"] = os.pathsep.join(sys.path)
+        out = subprocess.check_output([sys.executable, "-c", code], env=env)
+        assert out.decode().split() == ["2", "5.0"]
+        # The reader exiting must not remove the published data
+        Subscriber(publisher.name).close()
+
+    def test_run(self):
+        """Verify that run publishes and then releases the data."""
+        inst = FakeInstrument("inst")
+        inst.x = 1
+        meas = Measurement([Sweep(inst, "x", np.arange(3))],
+                           Measure.gen_measure([Getter(inst, "x")]))
+        meas.publish = "test_run_{}".format(os.getpid())
+        meas.run()
+        np.testing.assert_array_equal(meas.data.inst_x, [0, 1, 2])
+        with pytest.raises(FileNotFoundError):
+            Subscriber(meas.publish)
+
+    def test_write_error(self, tmpdir):
+        """Verify that a failed write still releases everything run opened."""
+        setup = Setup("test")
+        setup.add(FakeInstrument("inst"))
+        meas = Measurement([Sweep(setup.inst, "x", np.arange(3))],
+                           Measure.gen_measure([Getter(setup.inst, "x")]),
+                           setup)
+        meas.data_class = FullDiskDataSet
+        meas.publish = "test_write_error_{}".format(os.getpid())
+        meas.checkpoint_path = str(tmpdir.join("run.ckpt"))
+        with pytest.raises(RuntimeError):
+            meas.run()
+        assert setup.inst._tracker is None
+        assert tmpdir.join("run.ckpt").check()
+        with pytest.raises(FileNotFoundError):
+            Subscriber(meas.publish)
+
+    def test_stale(self, setup):
+        """Verify that blocks left by a crashed Publisher can be removed."""
+        data, publisher = setup
+        name = publisher.name + "_stale"
+        with Publisher(data, name) as crashed:
+            # Forget the index block like a killed process would
+            crashed.blocks.pop()
+        with pytest.raises(FileExistsError):
+            Publisher(data, name)
+        # The blocks created before the failure are removed again
+        with pytest.raises(FileNotFoundError):
+            Subscriber(name)
+        with pytest.raises(FileNotFoundError):
+            _attach(name + "_inst_x")
+        remove(name)
+        Publisher(data, name).close()
+
+    def test_publish_error(self, setup):
+        """Verify that run releases the writer and ChangeLog if publishing
+        fails."""
+        _, publisher = setup
+        setup = Setup("test")
+        setup.add(FakeInstrument("inst"))
+        meas = Measurement([Sweep(setup.inst, "x", np.arange(3))],
+                           Measure.gen_measure([Getter(setup.inst, "x")]),
+                           setup)
+        meas.publish = publisher.name
+        with pytest.raises(FileExistsError):
+            meas.run()
+        assert setup.inst._tracker is None
@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+from measurement.instruments.instrument import Instrument
+from measurement.instruments.param import ContinuousParam
+from measurement.measurements.callables import Sweep, Getter, Measure
+from measurement.measurements.measurement import Measurement
+from measurement.measurements.reduce import Reducer
+from measurement.util.dataset import Hdf5DataSet
+
+
+class FakeInstrument(Instrument):
+    """A skeleton instrument so tests don't depend on drivers."""
+    B = ContinuousParam("T")
+    V = ContinuousParam("V")
+
+
+class Current(Getter):
+    """The current through a resistor of 1 / (1 + B) Ohm."""
+    __slots__ = ["fail_at", "calls"]
+
+    def __init__(self, inst, fail_at=None):
+        super(Current, self).__init__(inst, "V")
+        self.fail_at = fail_at
+        self.calls = 0
+
+    def __call__(self):
+        if self.calls == self.fail_at:
+            raise RuntimeError("Compliance reached.")
+        self.calls += 1
+        return self.inst.V * (1 + self.inst.B)
+
+
+def slope(current):
+    """Conductance of a line of the IV curve."""
+    return np.polyfit(np.linspace(-1, 1, len(current)), current, 1)[0]
+
+
+def square(current):
+    return current**2
+
+
+def positive(current):
+    return int((current > 0).sum())
+
+
+def fail(current):
+    raise RuntimeError("Fit did not converge.")
+
+
+class TestReduce(object):
+    @pytest.fixture
+    def setup(self, tmpdir):
+        inst = FakeInstrument("sample")
+
+        def measurement(fail_at=None, **reducers):
+            meas = Measurement([
+                Sweep(inst, "B", np.arange(4)),
+                Sweep(inst, "V", np.linspace(-1, 1, 5))
+            ], Measure([("current", Current(inst, fail_at))]))
+            meas.reducers.update(reducers)
+            meas.checkpoint_path = str(tmpdir.join("run.ckpt"))
+            return meas
+
+        with tmpdir.as_cwd():
+            yield measurement
+
+    @pytest.mark.parametrize("processes", [0, 2])
+    def test_lines(self, setup, processes):
+        """Verify that each line is reduced into a derived DataArray."""
+        meas = setup(conductance=Reducer(slope, ["current"], axes=1,
+                                         units="S"))
+        meas.processes = processes
+        meas.run()
+        assert meas.data.conductance.shape == (4, )
+        assert meas.data.conductance.units == "S"
+        np.testing.assert_allclose(meas.data.conductance, np.arange(4) + 1)
+
+    def test_points(self, setup):
+        """Verify that a Reducer over no axes is applied to every point."""
+        meas = setup(power=Reducer(square, ["current"]))
+        meas.processes = 1
+        meas.run()
+        np.testing.assert_allclose(meas.data.power, meas.data.current**2)
+
+    def test_failure(self, setup):
+        """Verify that a failing Reducer leaves nan without stopping the run."""
+        meas = setup(bad=Reducer(fail, ["current"], axes=1))
+        meas.processes = 0
+        meas.run()
+        assert np.isnan(meas.data.bad).all()
+        assert meas.data.sampled.all()
+
+    def test_file(self, setup):
+        """Verify that derived DataArrays are written to file."""
+        meas = setup(conductance=Reducer(slope, ["current"], axes=1))
+        meas.data_class = Hdf5DataSet
+        meas.processes = 0
+        meas.run()
+        data = Hdf5DataSet(None, None, meas.data.filename).load()
+        np.testing.assert_allclose(data.conductance, np.arange(4) + 1)
+        np.testing.assert_allclose(
+            data.sel(sample_B=2).conductance, 3)
+
+    def test_resume(self, setup):
+        """Verify that lines left unreduced by a crash are reduced later."""
+        reducer = Reducer(slope, ["current"], axes=1)
+        crashed = setup(fail_at=12, conductance=reducer)
+        with pytest.raises(RuntimeError):
+            crashed.run()
+        resumed = setup(conductance=reducer)
+        resumed.resume(crashed.checkpoint_path)
+        np.testing.assert_allclose(resumed.data.conductance, np.arange(4) + 1)
+
+    def test_resume_int(self, setup):
+        """Verify that unreduced blocks of an int Reducer are found too."""
+        reducer = Reducer(positive, ["current"], axes=1, dtype=int)
+        crashed = setup(fail_at=12, conductance=reducer)
+        with pytest.raises(RuntimeError):
+            crashed.run()
+        resumed = setup(conductance=reducer)
+        resumed.resume(crashed.checkpoint_path)
+        np.testing.assert_array_equal(resumed.data.conductance, 2)
@@ -0,0 +1,93 @@
+import socketserver
+import numpy as np
+import pytest
+from measurement.instruments.instrument import Instrument
+from measurement.instruments.param import ContinuousParam, DiscreteParam
+from measurement.instruments.setup import Setup
+from measurement.instruments.remote import InstrumentServer, Client
+from measurement.measurements.callables import Sweep, Getter, Measure
+from measurement.measurements.measurement import Measurement
+
+
+class FakeInstrument(Instrument):
+    """A skeleton instrument so tests don't depend on drivers."""
+    voltage = ContinuousParam("V", minimum=-1, maximum=1)
+    current = ContinuousParam("A")
+    range = DiscreteParam([1, 10, 100])
+
+
+class TestRemote(object):
+    @pytest.fixture(params=["tcp", "unix"])
+    def setup(self, request, tmpdir):
+        setup = Setup("remote")
+        for name in ("source", "meter"):
+            setup.add(FakeInstrument(name))
+        if request.param == "tcp":
+            address = ("127.0.0.1", 0)
+        else:
+            address = str(tmpdir.join("instruments.sock"))
+        with tmpdir.as_cwd():
+            with InstrumentServer(setup, address) as server:
+                with Client(server.address) as client:
+                    yield setup, server, client
+
+    def test_params(self, setup):
+        """Verify that remote Params read and write the served ones."""
+        local, server, client = setup
+        source = client.instruments()["source"]
+        source.voltage = 0.5
+        assert local.source.voltage == 0.5
+        local.source.current = 2
+        assert source.current == 2
+        assert source.get_validator("voltage").units == "V"
+        assert source.get_validator("voltage").maximum == 1
+
+    def test_server_options(self, setup):
+        """Verify that the server leaves the stdlib classes unchanged."""
+        _, server, _ = setup
+        assert server.server.daemon_threads
+        for cls in (socketserver.ThreadingTCPServer,
+                    socketserver.ThreadingUnixStreamServer):
+            assert not cls.allow_reuse_address
+            assert not cls.daemon_threads
+
+    def test_errors(self, setup):
+        """Verify that errors on the server are raised by the client."""
+        _, server, client = setup
+        source = client.instruments()["source"]
+        with pytest.raises(ValueError):
+            source.voltage = 2
+        with pytest.raises(AttributeError):
+            client.call("get", "source", "missing")
+
+    def test_discrete(self, setup):
+        """Verify that the value the server picked is mirrored locally."""
+        _, server, client = setup
+        source = client.instruments()["source"]
+        source.range = 12
+        assert source.get_validator("range").value == 10
+
+    def test_pipelined(self, setup):
+        """Verify that queued requests go out in a single message."""
+        local, server, client = setup
+        local.source.current = 1
+        local.meter.current = 2
+        before = server.batches
+        replies = [client.submit("get", name, "current")
+                   for name in ("source", "meter")]
+        assert [reply.result() for reply in replies] == [1, 2]
+        assert server.batches == before + 1
+
+    def test_measurement(self, setup):
+        """Verify that a Measure reads its remote Getters in one round trip."""
+        local, server, client = setup
+        insts = client.instruments()
+        sweep = Sweep(insts["source"], "voltage", np.linspace(-1, 1, 5))
+        measure = Measure([("source", Getter(insts["source"], "voltage")),
+                           ("meter", Getter(insts["meter"], "current"))])
+        meas = Measurement([sweep], measure)
+        before = server.batches
+        meas.run()
+        np.testing.assert_allclose(meas.data.source, np.linspace(-1, 1, 5))
+        # One set and one batched read per point
+        assert server.batches == before + 10
@@ -0,0 +1,103 @@
+import time
+import numpy as np
+import pytest
+from measurement.instruments.instrument import Instrument
+from measurement.instruments.param import (ContinuousParam, DiscreteParam,
+                                           ParamArray)
+from measurement.instruments.setup import Setup
+from measurement.instruments.replay import Recorder, Replay
+from measurement.measurements.callables import Sweep, Getter, Measure, Wait
+from measurement.measurements.measurement import Measurement
+
+
+class NoisyParam(ContinuousParam):
+    """A reading that changes every time, like a real meter."""
+
+    def __get__(self, instance, owner):
+        if instance is not None:
+            self.validator(instance).value = np.random.normal()
+        return super(NoisyParam, self).__get__(instance, owner)
+
+
+class FakeInstrument(Instrument):
+    """A skeleton instrument so tests don't depend on drivers."""
+    V = ContinuousParam("V", -10, 10, 100, 0.1)
+    x = NoisyParam("V")
+    gain = DiscreteParam([1, 10, 100])
+    dac = ParamArray(2, "V")
+
+
+def measurement(setup, during=None):
+    inst = setup.lockin
+    return Measurement([Sweep(inst, "V", np.linspace(0, 1, 5),
+                              during=during)],
+                       Measure([("x", Getter(inst, "x"))]), setup)
+
+
+class TestReplay(object):
+    @pytest.fixture
+    def setup(self, tmpdir):
+        setup = Setup("test")
+        setup.add(FakeInstrument("lockin"))
+        setup.lockin.V = 0
+        with tmpdir.as_cwd():
+            yield setup, str(tmpdir.join("run.rec"))
+
+    def test_measurement(self, setup):
+        """Verify that a replayed run reproduces the recorded data."""
+        setup, filename = setup
+        meas = measurement(setup)
+        meas.record = filename
+        meas.run()
+        assert setup.lockin._recorder is None
+        replayed = measurement(Replay(filename).setup())
+        replayed.run()
+        np.testing.assert_array_equal(replayed.data.x, meas.data.x)
+
+    def test_ramp(self, setup):
+        """Verify that the steps of a recorded ramp are passed over."""
+        setup, filename = setup
+        with Recorder(setup, filename):
+            setup.lockin.V = 1
+            setup.lockin.gain = 12
+            setup.lockin.dac = 0.5
+        replayed = Replay(filename).setup()
+        replayed.lockin.V = 1
+        replayed.lockin.gain = 12
+        replayed.lockin.dac = 0.5
+        assert replayed.lockin.get_validator("gain").value == 10
+
+    def test_mismatch(self, setup):
+        """Verify that reads and writes that were not recorded fail."""
+        setup, filename = setup
+        with Recorder(setup, filename):
+            setup.lockin.x
+        replayed = Replay(filename).setup()
+        with pytest.raises(LookupError):
+            replayed.lockin.V = 2
+        replayed.lockin.x
+        with pytest.raises(LookupError):
+            replayed.lockin.x
+
+    def test_timing(self, setup):
+        """Verify that realtime replay keeps the recorded timing."""
+        setup, filename = setup
+        meas = measurement(setup, during=Wait(0.02))
+        meas.record = filename
+        meas.run()
+        start = time.perf_counter()
+        measurement(Replay(filename).setup()).run()
+        fast = time.perf_counter() - start
+        start = time.perf_counter()
+        measurement(Replay(filename, realtime=True).setup()).run()
+        assert fast < 0.05
+        assert time.perf_counter() - start >= 0.08
+
+    def test_chunks(self, setup):
+        """Verify that events written in several chunks are all read."""
+        setup, filename = setup
+        with Recorder(setup, filename, chunk=3) as recorder:
+            values = [setup.lockin.x for _ in range(10)]
+        assert recorder.count == 10
+        replayed = Replay(filename).setup()
+        assert [replayed.lockin.x for _ in range(10)] == values
@@ -0,0 +1,91 @@
+import time
+import numpy as np
+import pytest
+from measurement.instruments.instrument import Instrument
+from measurement.instruments.param import ContinuousParam
+from measurement.measurements.callables import Sweep, Getter, Measure, Wait
+from measurement.measurements.measurement import Measurement, MeasureTime
+from measurement.measurements.scheduler import Scheduler
+
+
+class FakeInstrument(Instrument):
+    """A skeleton instrument so tests don't depend on drivers."""
+    V = ContinuousParam("V")
+    I = ContinuousParam("A")
+    T = ContinuousParam("K")
+
+
+class TestScheduler(object):
+    @pytest.fixture
+    def setup(self):
+        insts = [FakeInstrument(name) for name in ["dac", "dmm", "fridge"]]
+        for inst in insts:
+            for attr in ["V", "I", "T"]:
+                setattr(inst, attr, 0)
+        return insts
+
+    def transport(self, dac, dmm, wait=0):
+        return Measurement([
+            Sweep(dac, "V", np.linspace(0, 1, 4), during=Wait(wait))
+        ], Measure.gen_measure([Getter(dmm, "I")]))
+
+    def log(self, fridge, period=0.05, attr="T"):
+        return MeasureTime(period, 4 * period,
+                           Measure.gen_measure([Getter(fridge, attr)]))
+
+    def test_resources(self, setup):
+        """Verify that the Params used by a Measurement are found."""
+        dac, dmm, _ = setup
+        sets, gets = Scheduler.get_resources(self.transport(dac, dmm))
+        assert sets == {(dac, "V")}
+        assert gets == {(dmm, "I")}
+
+    def test_conflicts(self, setup):
+        """Verify that Measurements changing the same Params are refused."""
+        dac, dmm, fridge = setup
+        with pytest.raises(ValueError):
+            Scheduler([self.transport(dac, dmm), self.transport(dac, fridge)])
+        with pytest.raises(ValueError):
+            Scheduler([self.transport(dac, dmm), self.log(dac, attr="V")])
+        # Reading the same Param is fine
+        Scheduler([self.log(fridge), self.log(fridge)])
+
+    def test_shared_bus(self, setup):
+        """Verify that only instruments shared between Measurements lock."""
+        dac, dmm, fridge = setup
+        scheduler = Scheduler([self.transport(dac, dmm), self.log(fridge)])
+        assert scheduler.shared_buses() == []
+        dmm.bus = fridge.bus = "GPIB0"
+        assert scheduler.shared_buses() == [{dmm, fridge}]
+
+    def test_run(self, setup):
+        """Verify that Measurements run at the same time."""
+        dac, dmm, fridge = setup
+        dmm.bus = fridge.bus = "GPIB0"
+        transport = self.transport(dac, dmm, wait=0.05)
+        log = self.log(fridge, period=0.05)
+        start = time.time()
+        Scheduler([transport, log]).run()
+        assert time.time() - start < 0.35
+        assert (transport.data.dmm_I == 0).all()
+        assert (log.data.fridge_T == 0).all()
+        assert dmm._lock is None
+
+    def test_error(self, setup):
+        """Verify that errors in a Measurement are raised by run."""
+        dac, dmm, fridge = setup
+        dac.update_validator("V", {"maximum": 0.5})
+        with pytest.raises(ValueError):
+            Scheduler([self.transport(dac, dmm), self.log(fridge)]).run()
+
+    def test_same_file(self, setup, tmpdir):
+        """Verify that Measurements writing to the same file are refused."""
+        dac, dmm, fridge = setup
+        transport = self.transport(dac, dmm)
+        log = self.log(fridge)
+        for meas in (transport, log):
+            meas.data_options = {"filename": str(tmpdir.join("run.h5"))}
+        with pytest.raises(ValueError):
+            Scheduler([transport, log])
+        log.data_options = {}
+        Scheduler([transport, log])
@@ -0,0 +1,119 @@
+import tracemalloc
+import numpy as np
+import pytest
+from measurement.instruments.instrument import Instrument
+from measurement.instruments.param import ContinuousParam, ParamArray
+from measurement.measurements.callables import Sweep, Setter, Getter, Measure
+from measurement.measurements.measurement import Measurement
+from measurement.measurements.setpoints import (Linspace, Logspace, Function,
+                                                Generated, Concat, Reversed,
+                                                loop)
+
+
+class FakeInstrument(Instrument):
+    """A skeleton instrument so tests don't depend on drivers."""
+    x = ContinuousParam("V")
+    y = ContinuousParam("V")
+    dac = ParamArray(2, "V")
+
+
+class TestSetpoints(object):
+    def test_linspace(self):
+        points = Linspace(0, 1, 11)
+        assert len(points) == 11
+        assert points[0] == 0
+        assert points[-1] == 1
+        assert points[3] == pytest.approx(0.3)
+        np.testing.assert_allclose(list(points), np.linspace(0, 1, 11))
+        np.testing.assert_array_equal(np.asarray(points),
+                                      np.linspace(0, 1, 11))
+        with pytest.raises(IndexError):
+            points[11]
+
+    def test_logspace(self):
+        points = Logspace(1e-3, 1, 4)
+        np.testing.assert_allclose(list(points), [1e-3, 1e-2, 1e-1, 1])
+        assert points[-1] == 1
+
+    def test_single_and_empty(self):
+        """Verify that one point is start and no parts give no points."""
+        for points in [Linspace(2, 5, 1), Logspace(2, 5, 1)]:
+            assert list(points) == [2]
+            np.testing.assert_array_equal(np.asarray(points), [2])
+        empty = Concat()
+        assert list(empty) == []
+        assert np.asarray(empty).shape == (0, )
+
+    def test_function(self):
+        points = Function(lambda i: i**2, 5)
+        assert list(points) == [0, 1, 4, 9, 16]
+        assert points[-2] == 9
+        points = Generated(lambda: iter(range(100, 200)), 5)
+        assert list(points) == [100, 101, 102, 103, 104]
+        assert points[2] == 102
+
+    def test_views(self):
+        """Verify that joined, reversed and sliced points are views."""
+        up = Linspace(0, 2, 3)
+        both = Concat(up, np.array([5, 6]), Reversed(up))
+        assert list(both) == [0, 1, 2, 5, 6, 2, 1, 0]
+        assert [both[i] for i in range(8)] == list(both)
+        assert list(both[2:5]) == [2, 5, 6]
+        assert list(reversed(both)) == list(both)[::-1]
+        assert reversed(Reversed(up)) is up
+        assert list(loop(up)) == [0, 1, 2, 1, 0]
+        np.testing.assert_array_equal(np.asarray(loop(up)), [0, 1, 2, 1, 0])
+        # Nested joins are flattened
+        assert len(Concat(both, up).parts) == 4
+
+    def test_vectors(self):
+        """Verify vector setpoints for a ParamArray."""
+        points = Linspace(np.zeros(2), np.array([1., 2.]), 3)
+        np.testing.assert_array_equal(points[1], [0.5, 1])
+        assert np.asarray(points).shape == (3, 2)
+
+
+class TestLazySweep(object):
+    @pytest.fixture
+    def setup(self):
+        return FakeInstrument("inst")
+
+    def test_memory(self, setup):
+        """Verify that a long Sweep is not built up front."""
+        tracemalloc.start()
+        sweep = Sweep.linspace(setup, "x", 0, 1, 10**7)
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert size < 10**5
+        assert len(sweep) == 10**7
+        assert str(sweep).endswith("0 -> 1>")
+        setter = next(iter(sweep))
+        assert isinstance(setter, Setter)
+        assert setter.val == 0
+
+    def test_compose(self, setup):
+        """Verify joining, reversing and looping Sweeps."""
+        up = Sweep.linspace(setup, "x", 0, 1, 3, before="b")
+        down = up.reverse()
+        assert [call.val for call in down] == [1, 0.5, 0]
+        assert down.before == "b"
+        joined = up + down
+        assert [call.val for call in joined] == [0, 0.5, 1, 1, 0.5, 0]
+        assert isinstance(joined.vals, Concat)
+        assert [call.val for call in up.loop()] == [0, 0.5, 1, 0.5, 0]
+        with pytest.raises(ValueError):
+            up + Sweep(setup, "y", [0])
+
+    def test_run(self, setup):
+        """Verify that Measurements run lazy Sweeps."""
+        meas = Measurement([
+            Sweep.linspace(setup, "x", 0, 1, 3).loop(),
+            Sweep(setup, "dac", Linspace(np.zeros(2), np.ones(2), 2))
+        ], Measure.gen_measure([Getter(setup, "x")]))
+        meas.run()
+        assert meas.shape == (5, 2)
+        np.testing.assert_array_equal(meas.data.inst_x[:, 0],
+                                      [0, 0.5, 1, 0.5, 0])
+        np.testing.assert_array_equal(meas.data.coords["inst_x"],
+                                      [0, 0.5, 1, 0.5, 0])
+        np.testing.assert_array_equal(setup.dac, [1, 1])
@@ -0,0 +1,200 @@
+import pickle
+import time
+import numpy as np
+import pytest
+from measurement.instruments.base import MAGIC, VERSION, Loadable
+from measurement.instruments.instrument import Instrument
+from measurement.instruments.param import (ContinuousParam, DiscreteParam,
+                                           ParamArray, ContinuousValidator)
+from measurement.instruments.setup import Setup
+
+
+class FakeInstrument(Instrument):
+    """An Instrument with each type of Param."""
+    V = ContinuousParam("V", -10, 10, 1, 0.1)
+    gain = DiscreteParam([1, 10, 100])
+    dac = ParamArray(3, "V", minimum=-1, maximum=1)
+
+
+class LimitedValidator(ContinuousValidator):
+    """A Validator that adds a slot to those of its base."""
+    __slots__ = ["limit"]
+
+
+class Exploit(object):
+    """Run a shell command when unpickled."""
+
+    def __reduce__(self):
+        import os
+        return os.system, ("true",)
+
+
+class TestSnapshot(object):
+    @pytest.fixture
+    def setup(self):
+        setup = Setup("test")
+        for name in ["inst1", "inst2"]:
+            setup.add(FakeInstrument(name))
+        setup.inst1.V = 1
+        setup.inst1.gain = 10
+        setup.inst2.dac = [0.1, 0.2, 0.3]
+        setup.inst2.update_validator("V", {"maximum": 2})
+        return setup
+
+    def check(self, setup, copy):
+        """Check that copy has the same state as setup."""
+        assert isinstance(copy, Setup)
+        assert copy.name == setup.name
+        for name in ["inst1", "inst2"]:
+            inst, other = getattr(setup, name), getattr(copy, name)
+            assert isinstance(other, FakeInstrument)
+            assert other.name == inst.name
+            assert other.V == inst.V
+            assert other.gain == inst.gain
+            snap, other_snap = inst.snapshot(), other.snapshot()
+            for field in snap.dtype.names:
+                np.testing.assert_array_equal(snap[field], other_snap[field])
+        assert copy.inst2.get_validator("V").maximum == 2
+        assert (copy.inst2.dac == [0.1, 0.2, 0.3]).all()
+
+    def test_bytes(self, setup):
+        """Verify that a Setup survives a binary round trip."""
+        data = setup.to_bytes()
+        self.check(setup, Loadable.from_bytes(data))
+
+    def test_file(self, setup, tmpdir):
+        """Verify that a Setup can be saved to and loaded from file."""
+        filename = str(tmpdir.join("setup.snap"))
+        setup.save(filename)
+        self.check(setup, Loadable.load(filename))
+
+    def test_json(self, setup):
+        """Verify that JSON export still round trips."""
+        self.check(setup, Loadable.from_json(setup.to_json()))
+
+    def test_bad_header(self):
+        """Verify that data that is not a snapshot is rejected."""
+        with pytest.raises(ValueError):
+            Loadable.from_bytes(b"not a snapshot")
+
+    def test_inherited_slots(self, setup):
+        """Verify that slots declared on base classes are saved too."""
+        validator = LimitedValidator()
+        validator.update(setup.inst1.get_validator("V").to_json())
+        validator.limit = 5
+        setup.inst1.__dict__["_V"] = validator
+        copy = Loadable.from_bytes(setup.to_bytes())
+        other = copy.inst1.get_validator("V")
+        assert isinstance(other, LimitedValidator)
+        assert other.limit == 5
+        assert other.value == 1
+        assert other.maximum == 10
+
+    def test_untrusted(self):
+        """Verify that a snapshot can't call arbitrary functions."""
+        payload = pickle.dumps(([], Exploit()))
+        with pytest.raises(pickle.UnpicklingError):
+            Loadable.from_bytes(MAGIC + bytes([VERSION]) + payload)
+        payload = pickle.dumps(([("os", "system")], (0, (), {})))
+        with pytest.raises(ValueError):
+            Loadable.from_bytes(MAGIC + bytes([VERSION]) + payload)
+
+
+class Source(Instrument):
+    """An instrument that ramps 1 V in 0.1 s and records its ramps."""
+    V = ContinuousParam("V", -10, 10, 10, 0.1)
+    dac = ParamArray(2, "V", rate=10, step=0.1)
+    gain = DiscreteParam([1, 10])
+    freq = ContinuousParam("Hz", 1, 100, 1000, 1)
+
+    def __init__(self, name, ramps):
+        super(Source, self).__init__(name)
+        self.ramps = ramps
+
+    def zero(self, attr):
+        start = time.perf_counter()
+        super(Source, self).zero(attr)
+        self.ramps["{}.{}".format(self.name, attr)] = (start,
+                                                       time.perf_counter())
+
+
+class TestZero(object):
+    @pytest.fixture
+    def setup(self):
+        ramps = {}
+        setup = Setup("test")
+        for name in ["magnet", "gates"]:
+            inst = Source(name, ramps)
+            inst.V = 1
+            inst.dac = [1, -0.5]
+            inst.gain = 10
+            setup.add(inst)
+        return setup, ramps
+
+    def test_zero(self, setup):
+        """Verify that every continuous Param ends at zero."""
+        setup, ramps = setup
+        setup.zero_all()
+        for inst in setup.instruments():
+            assert inst.V == 0
+            np.testing.assert_array_equal(inst.dac, [0, 0])
+            assert inst.gain == 10
+        assert len(ramps) == 4
+
+    def test_parallel(self, setup):
+        """Verify that the time is set by the slowest ramp, not the sum."""
+        setup, ramps = setup
+        start = time.perf_counter()
+        setup.zero_all()
+        assert time.perf_counter() - start < 0.3
+
+    def test_order(self, setup):
+        """Verify that the gates wait for the field to reach zero."""
+        setup, ramps = setup
+        setup.zero_all(order=[("magnet.V", "gates")])
+        for attr in ["V", "dac"]:
+            assert ramps["gates." + attr][0] >= ramps["magnet.V"][1]
+
+    def test_names(self, setup):
+        """Verify that only the named Params are zeroed."""
+        setup, ramps = setup
+        setup.zero_all(names=["magnet", "gates.V"])
+        assert sorted(ramps) == ["gates.V", "magnet.V", "magnet.dac"]
+        np.testing.assert_array_equal(setup.gates.dac, [1, -0.5])
+
+    def test_cycle(self, setup):
+        """Verify that a cycle in the order is rejected before ramping."""
+        setup, ramps = setup
+        with pytest.raises(ValueError):
+            setup.zero_all(order=[("magnet", "gates"), ("gates", "magnet")])
+        assert ramps == {}
+
+    def test_limits(self, setup):
+        """Verify that a Param whose limits exclude zero ramps to the
+        nearest allowed value without holding up the others."""
+        setup, ramps = setup
+        setup.magnet.freq = 50
+        setup.zero_all(order=[("magnet.freq", "gates")])
+        assert setup.magnet.freq == 1
+        assert setup.gates.V == 0
+
+    def test_workers(self, setup):
+        """Verify that ordered ramps finish with fewer threads than Params."""
+        setup, ramps = setup
+        setup.zero_all(order=[("magnet", "gates")], workers=1)
+        assert len(ramps) == 4
+        starts = sorted(start for start, _ in ramps.values())
+        ends = sorted(end for _, end in ramps.values())
+        assert all(start >= end for start, end in zip(starts[1:], ends))
+
+    def test_close(self, setup):
+        """Verify that closing a Setup brings it to a safe state."""
+        setup, _ = setup
+        setup.close()
+        assert setup.magnet.V == 0
+
+    def test_ramp_time(self, setup):
+        """Verify that ramp times follow the rate limits."""
+        setup, _ = setup
+        assert setup.magnet.ramp_time("V", 0) == pytest.approx(0.1)
+        assert setup.magnet.ramp_time("dac", 0) == pytest.approx(0.1)
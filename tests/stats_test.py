@@ -0,0 +1,99 @@
+import numpy as np
+import pytest
+from measurement.instruments.instrument import Instrument
+from measurement.instruments.param import ContinuousParam
+from measurement.measurements.callables import Sweep, AverageGetter, Measure
+from measurement.measurements.measurement import Measurement
+from measurement.util.dataset import Hdf5DataSet
+from measurement.util.stats import RunningStats
+
+
+class FakeInstrument(Instrument):
+    """A skeleton instrument so tests don't depend on drivers."""
+    x = ContinuousParam("V")
+
+
+class NoisyInstrument(Instrument):
+    """An instrument whose readout is x plus gaussian noise."""
+    x = ContinuousParam("V")
+
+    def __init__(self, name, noise):
+        super(NoisyInstrument, self).__init__(name)
+        self.random = np.random.RandomState(0)
+        self.noise = noise
+        self.queries = 0
+
+    def read_batch(self, attr, num):
+        self.queries += 1
+        return self.x + self.noise * self.random.normal(size=num)
+
+
+def test_running_stats():
+    """Verify single and batched updates against numpy."""
+    values = np.random.RandomState(1).normal(1e6, 1e-3, size=1001)
+    stats = RunningStats()
+    for value in values[:500]:
+        stats.add(value)
+    stats.extend(values[500:900])
+    stats.extend(values[900:])
+    assert stats.count == 1001
+    assert stats.mean == pytest.approx(values.mean(), abs=1e-9)
+    assert stats.std == pytest.approx(values.std(ddof=1), rel=1e-6)
+    assert np.isnan(RunningStats().std)
+
+
+class TestAverageGetter(object):
+    @pytest.fixture
+    def setup(self):
+        inst = NoisyInstrument("inst", 0.1)
+        inst.x = 1
+        return inst
+
+    def test_num(self, setup):
+        """Verify that a fixed number of reads is made in batches."""
+        value = AverageGetter(setup, "x", num=100, batch=30)()
+        assert value["count"] == 100
+        assert setup.queries == 4
+        assert value["mean"] == pytest.approx(1, abs=0.05)
+        assert value["std"] == pytest.approx(0.1, rel=0.3)
+
+    def test_error(self, setup):
+        """Verify that reads stop once the target error is reached."""
+        value = AverageGetter(setup, "x", error=0.01, batch=10)()
+        # sem = 0.1 / sqrt(n) reaches 0.01 at about 100 reads
+        assert 50 <= value["count"] <= 200
+        assert value["count"] % 10 == 0
+        value = AverageGetter(setup, "x", error=1e-6, max_num=50)()
+        assert value["count"] == 50
+
+    def test_arguments(self, setup):
+        with pytest.raises(ValueError):
+            AverageGetter(setup, "x")
+        with pytest.raises(ValueError):
+            AverageGetter(setup, "x", num=10, error=0.1)
+
+    def test_default_batch(self):
+        """Verify that instruments without batching are read one by one."""
+        inst = FakeInstrument("inst")
+        inst.x = 2
+        value = AverageGetter(inst, "x", num=5)()
+        assert value["mean"] == 2
+        assert value["std"] == 0
+        assert value["count"] == 5
+
+    @pytest.mark.parametrize("data_class", [Measurement.data_class,
+                                            Hdf5DataSet])
+    def test_dataset(self, setup, data_class, tmpdir):
+        """Verify that mean, std and count are stored for each point."""
+        meas = Measurement([Sweep(setup, "x", np.arange(3))],
+                           Measure([("avg", AverageGetter(setup, "x",
+                                                          num=20))]))
+        meas.data_class = data_class
+        with tmpdir.as_cwd():
+            meas.run()
+            data = meas.data
+            if data_class is Hdf5DataSet:
+                data = Hdf5DataSet(None, None, data.filename).load()
+        assert data.avg.units == "V"
+        np.testing.assert_allclose(data.avg["mean"], np.arange(3), atol=0.1)
+        np.testing.assert_array_equal(data.avg["count"], [20, 20, 20])
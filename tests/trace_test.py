@@ -0,0 +1,100 @@
+import numpy as np
+import pytest
+from measurement.instruments.instrument import Instrument
+from measurement.instruments.param import ContinuousParam, ParamArray
+from measurement.measurements.callables import Sweep, Getter, Measure
+from measurement.measurements.measurement import Measurement
+from measurement.measurements.reduce import Reducer
+from measurement.util.dataset import Hdf5DataSet, RingDataSet
+
+
+class FakeInstrument(Instrument):
+    """A skeleton instrument so tests don't depend on drivers."""
+    x = ContinuousParam("V")
+    y = ContinuousParam("V")
+    dac = ParamArray(3, "V")
+
+
+class Waveform(Getter):
+    """A scope trace of 64 samples scaled by x and shifted by y."""
+    __slots__ = []
+
+    def __init__(self, inst):
+        super(Waveform, self).__init__(inst, "x", shape=(64, ))
+
+    def __call__(self):
+        return self.inst.x * np.sin(np.arange(64) / 4) + self.inst.y
+
+
+def spectrum(trace):
+    return np.abs(np.fft.rfft(trace))
+
+
+def expected(x, y):
+    return x * np.sin(np.arange(64) / 4) + y
+
+
+class TestTrace(object):
+    @pytest.fixture
+    def setup(self, tmpdir):
+        inst = FakeInstrument("scope")
+        meas = Measurement([
+            Sweep(inst, "x", np.arange(3)),
+            Sweep(inst, "y", np.arange(4))
+        ], Measure([("trace", Waveform(inst))]))
+        meas.data_class = Hdf5DataSet
+        with tmpdir.as_cwd():
+            yield inst, meas
+
+    def test_run(self, setup):
+        """Verify that each trace fills the trailing axis of its point."""
+        _, meas = setup
+        meas.run()
+        assert meas.data.trace.shape == (3, 4, 64)
+        np.testing.assert_allclose(meas.data.trace[2, 1], expected(2, 1))
+        data = Hdf5DataSet(None, None, meas.data.filename).load()
+        np.testing.assert_array_equal(data.trace, meas.data.trace)
+
+    def test_sel(self, setup):
+        """Verify that selecting by coordinate keeps the trailing axis."""
+        _, meas = setup
+        meas.run()
+        trace = meas.data.trace.sel(scope_x=1, scope_y=3)
+        np.testing.assert_allclose(trace, expected(1, 3))
+
+    def test_param_array(self, setup):
+        """Verify that a Getter of a ParamArray stores every channel."""
+        inst, meas = setup
+        inst.dac = [0.1, 0.2, 0.3]
+        getter = Getter(inst, "dac")
+        assert getter.shape == (3, )
+        meas.measure = Measure([("dac", getter)])
+        meas.run()
+        assert meas.data.dac.shape == (3, 4, 3)
+        np.testing.assert_allclose(meas.data.dac[1, 2], [0.1, 0.2, 0.3])
+
+    def test_reducer(self, setup):
+        """Verify that a Reducer can derive a vector from each point."""
+        _, meas = setup
+        meas.reducers["spectrum"] = Reducer(spectrum, ["trace"], shape=(33, ))
+        meas.processes = 0
+        meas.run()
+        assert meas.data.spectrum.shape == (3, 4, 33)
+        np.testing.assert_allclose(meas.data.spectrum[1, 2],
+                                   spectrum(expected(1, 2)))
+
+    def test_ring(self, setup):
+        """Verify that a RingDataSet streams traces as rows."""
+        inst, meas = setup
+        data = RingDataSet.from_measure(meas.measure, (4, ), chunk=3,
+                                        pyramid=True)
+        data.open()
+        for i in range(10):
+            inst.x, inst.y = 1, i
+            values = meas.measure()
+            data.write(data.append(values), values)
+        data.close()
+        np.testing.assert_allclose(data.recent("trace")[-1], expected(1, 9))
+        copy = RingDataSet(None, None, data.filename).load()
+        assert copy.trace.shape == (10, 64)
+        np.testing.assert_allclose(copy.trace[4], expected(1, 4))
@@ -0,0 +1,139 @@
+import time
+import numpy as np
+import pytest
+from measurement.instruments.instrument import Instrument
+from measurement.instruments.param import ContinuousParam
+from measurement.instruments.setup import Setup
+from measurement.instruments.remote import InstrumentServer, Client
+from measurement.measurements.callables import (Getter, AverageGetter,
+                                                Measure)
+
+
+class FakeInstrument(Instrument):
+    """A skeleton instrument so tests don't depend on drivers."""
+    x = ContinuousParam("V")
+
+
+class SlowMeter(Instrument):
+    """A meter that integrates for a while before a reading is ready."""
+    triggered = True
+    x = ContinuousParam("V")
+
+    def __init__(self, name, integration, calls):
+        super(SlowMeter, self).__init__(name)
+        self.integration = integration
+        self.calls = calls
+        self.ready = None
+        # Fail the next fetch, like an overloaded input
+        self.overload = False
+
+    def trigger(self, attr):
+        self.calls.append(("trigger", self.name))
+        self.ready = time.perf_counter() + self.integration
+
+    def fetch(self, attr):
+        self.calls.append(("fetch", self.name))
+        time.sleep(max(self.ready - time.perf_counter(), 0))
+        self.ready = None
+        if self.overload:
+            self.overload = False
+            raise RuntimeError("{} overloaded.".format(self.name))
+        return getattr(self, attr)
+
+
+class Doubled(Getter):
+    """A Getter computing its reading from the Param it reads."""
+    __slots__ = []
+
+    def __call__(self):
+        return 2 * self.inst.x
+
+
+class TestTrigger(object):
+    @pytest.fixture
+    def setup(self):
+        calls = []
+        meters = [SlowMeter("meter{}".format(i), 0.05, calls)
+                  for i in range(4)]
+        for i, meter in enumerate(meters):
+            meter.x = i
+        return meters, calls
+
+    def test_order(self, setup):
+        """Verify that every meter is triggered before any is fetched."""
+        meters, calls = setup
+        plain = FakeInstrument("plain")
+        plain.x = 5
+        measure = Measure([("plain", Getter(plain, "x"))] +
+                          [(meter.name, Getter(meter, "x"))
+                           for meter in meters])
+        assert measure() == [5, 0, 1, 2, 3]
+        assert [call[0] for call in calls] == ["trigger"] * 4 + ["fetch"] * 4
+
+    def test_overlap(self, setup):
+        """Verify that a point waits for the longest integration only."""
+        meters, _ = setup
+        measure = Measure([(meter.name, Getter(meter, "x"))
+                           for meter in meters])
+        start = time.perf_counter()
+        measure()
+        assert time.perf_counter() - start < 0.15
+
+    def test_plain_call(self, setup):
+        """Verify that a Getter on a triggered instrument works on its own."""
+        meters, calls = setup
+        assert Getter(meters[1], "x")() == 1
+        assert calls == []
+
+    def test_subclass(self, setup):
+        """Verify that a Getter overriding __call__ is called in a Measure."""
+        meters, calls = setup
+        measure = Measure([("doubled", Doubled(meters[3], "x"))])
+        assert measure() == [6]
+        assert calls == []
+
+    def test_average(self, setup):
+        """Verify that an AverageGetter in a Measure reads in batches."""
+        meters, _ = setup
+        measure = Measure([("avg", AverageGetter(meters[2], "x", num=5))])
+        value, = measure()
+        assert value["mean"] == 2
+        assert value["count"] == 5
+
+    def test_remote(self, setup, tmpdir):
+        """Verify that a server triggers the reads of a message together."""
+        meters, calls = setup
+        local = Setup("slow")
+        for meter in meters:
+            local.add(meter)
+        address = str(tmpdir.join("slow.sock"))
+        with InstrumentServer(local, address) as server:
+            with Client(server.address) as client:
+                insts = client.instruments()
+                measure = Measure([(meter.name,
+                                    Getter(insts[meter.name], "x"))
+                                   for meter in meters])
+                start = time.perf_counter()
+                np.testing.assert_array_equal(measure(), [0, 1, 2, 3])
+                assert time.perf_counter() - start < 0.15
+        assert [call[0] for call in calls] == ["trigger"] * 4 + ["fetch"] * 4
+
+    def test_remote_error(self, setup, tmpdir):
+        """Verify that a failed read leaves no stale readings behind."""
+        meters, _ = setup
+        local = Setup("slow")
+        for meter in meters:
+            local.add(meter)
+        address = str(tmpdir.join("slow.sock"))
+        with InstrumentServer(local, address) as server:
+            with Client(server.address) as client:
+                insts = client.instruments()
+                measure = Measure([(meter.name,
+                                    Getter(insts[meter.name], "x"))
+                                   for meter in meters])
+                meters[1].overload = True
+                with pytest.raises(RuntimeError):
+                    measure()
+                for meter in meters:
+                    meter.x += 10
+                np.testing.assert_array_equal(measure(), [10, 11, 12, 13])
@@ -0,0 +1,85 @@
+import time
+import pytest
+from measurement.util.writer import Writer
+
+
+class SlowDataSet(object):
+    """Stand-in for a DataSet on a slow disk."""
+
+    def __init__(self, delay=0.01, fail_at=None):
+        self.delay = delay
+        self.fail_at = fail_at
+        self.points = []
+        self.flushed = 0
+        self.closed = False
+
+    def write(self, index, data):
+        if index == self.fail_at:
+            raise IOError("disk full")
+        time.sleep(self.delay)
+        self.points.append((index, data))
+
+    def flush(self):
+        self.flushed = len(self.points)
+
+    def close(self):
+        self.closed = True
+
+
+class TestWriter(object):
+    def test_nonblocking(self):
+        """Verify that queuing a point does not wait for the disk."""
+        dataset = SlowDataSet(delay=0.01)
+        writer = Writer(dataset)
+        start = time.time()
+        for i in range(20):
+            writer.put(i, [i])
+        assert time.time() - start < 0.1
+        writer.close()
+        assert dataset.points == [(i, [i]) for i in range(20)]
+        assert dataset.closed
+
+    def test_backpressure(self):
+        """Verify that put waits once the queue is full."""
+        dataset = SlowDataSet(delay=0.05)
+        writer = Writer(dataset, maxsize=1)
+        start = time.time()
+        for i in range(4):
+            writer.put(i, [i])
+        assert time.time() - start >= 0.1
+        writer.close()
+        assert len(dataset.points) == 4
+
+    def test_flush_on_error(self):
+        """Verify that queued points are written when the loop fails."""
+        dataset = SlowDataSet(delay=0)
+        with pytest.raises(KeyboardInterrupt):
+            with Writer(dataset) as writer:
+                for i in range(5):
+                    writer.put(i, [i])
+                raise KeyboardInterrupt
+        assert len(dataset.points) == 5
+        assert dataset.closed
+
+    def test_write_error(self):
+        """Verify that errors in the writer thread reach the caller."""
+        dataset = SlowDataSet(delay=0, fail_at=2)
+        writer = Writer(dataset)
+        with pytest.raises(RuntimeError):
+            for i in range(100):
+                writer.put(i, [i])
+                time.sleep(0.001)
+            writer.close()
+        assert dataset.closed
+
+    def test_flush(self):
+        """Verify that flush waits for the queued points to be written."""
+        dataset = SlowDataSet(delay=0.01)
+        writer = Writer(dataset)
+        for i in range(5):
+            writer.put(i, [i])
+        writer.flush()
+        assert dataset.flushed == 5
+        writer.close()
+        # Nothing left to flush once closed
+        writer.flush()